@@ -0,0 +1,355 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import signal
+import sqlite3
+import sys
+import time
+from typing import Iterator
+
+from book import key_size
+from evaluation import ThreatEvaluator
+from game import Triangle
+from large_board import LargeTriangle, LARGE_BOARD_WIDTH
+from search import AlphaBetaSearch
+from transposition import TranspositionTable
+
+
+# board string characters -> "1" for the filled (and crossed) fields, "0" for the free ones
+_FILLED_DIGITS = str.maketrans("O0X", "011")
+
+# stored in the user_version of the cache database - caches written by other versions are cleared on opening, as
+# their results may have been searched differently (version 0 took searches cut short in symmetric positions as
+# complete)
+CACHE_VERSION = 1
+
+
+def board_class(width: int) -> type:
+    """
+    Class of the boards of the given width - like large_board.new_board, without setting up a board.
+    """
+    return LargeTriangle if width >= LARGE_BOARD_WIDTH else Triangle
+
+
+def parse_board(width: int, board: str, p1: int = 0, p2: int = 0):
+    """
+    Inverse of Triangle.board_string. The crossed fields follow from the filled ones, so they have to be exactly the
+    fields of the completed lines.
+    :param width: width of the board
+    :param board: board string as written by Triangle.board_string
+    :param p1: points of player 1
+    :param p2: points of player 2
+    :return: Triangle class obj (a LargeTriangle for very wide boards)
+    """
+    if type(width) is not int:
+        raise TypeError("The width must be an integer number. Got " + str(width) + " instead.")
+    rows = board.split("/")
+    height = (width + 1) // 2
+    if len(rows) != height:
+        raise ValueError("A board of width " + str(width) + " has " + str(height) + " rows. Got " + str(len(rows))
+                         + " instead.")
+    for row_ind, row in enumerate(rows):
+        if len(row) != 2 * row_ind + 1:
+            raise ValueError("Row " + str(row_ind + 1) + " must have " + str(2 * row_ind + 1) + " fields. Got "
+                             + str(len(row)) + " instead.")
+    fields = "".join(rows)
+    if fields.strip("O0X"):
+        raise ValueError("The board may only contain \"O\", \"0\" and \"X\" fields.")
+
+    # bit i of the snapshot mask is the i-th field row by row - the order of the board string
+    filled_mask = int(fields.translate(_FILLED_DIGITS)[::-1], 2)
+    game = board_class(width).from_snapshot((width, filled_mask, p1, p2))
+    if game.board_string() != board:
+        raise ValueError("The crossed fields of the board don't match its completed lines.")
+    return game
+
+
+class AnalysisCache:
+    """
+    Results of analysed positions in an SQLite database, keyed by the canonical key of the position
+    (Triangle.canonical_key), the width of the board and the search depth. A position and its mirror image share an
+    entry - the stored move is for the canonical orientation. The value of a position doesn't depend on the points
+    scored so far, so positions that differ only in the score share an entry too.
+
+    The database is opened in WAL mode, so several analyses can use the same file at once.
+    """
+    path: str = ""
+
+    def __init__(self, path: str = ":memory:") -> None:
+        """
+        :param path: database file, created if it doesn't exist; ":memory:" for a cache that lasts as long as the obj
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=60)
+        if path != ":memory:":
+            self.connection.execute("PRAGMA journal_mode=WAL")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != CACHE_VERSION:
+            self.connection.execute("DROP TABLE IF EXISTS analysis")
+            self.connection.execute("PRAGMA user_version = " + str(CACHE_VERSION))
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS analysis ("
+            "width INTEGER NOT NULL, key BLOB NOT NULL, depth INTEGER NOT NULL, move_row INTEGER, move_col INTEGER, "
+            "evaluation INTEGER NOT NULL, nodes INTEGER NOT NULL, leaf_evaluations INTEGER NOT NULL, "
+            "cutoffs INTEGER NOT NULL, seconds REAL NOT NULL, PRIMARY KEY (width, key, depth)) WITHOUT ROWID")
+        self.connection.commit()
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+
+    def get_many(self, positions: list[tuple[int, int, int]]) -> dict[tuple[int, int, int], dict]:
+        """
+        :param positions: (width, canonical key, depth) of the positions to look up
+        :return: (width, canonical key, depth) -> stored result of the positions found, with the move for the
+        canonical orientation
+        """
+        found = {}
+        for width, key, depth in positions:
+            row = self.connection.execute(
+                "SELECT move_row, move_col, evaluation, nodes, leaf_evaluations, cutoffs, seconds FROM analysis "
+                "WHERE width = ? AND key = ? AND depth = ?", (width, key.to_bytes(key_size(width), "big"), depth)
+            ).fetchone()
+            if row is not None:
+                move_row, move_col, evaluation, nodes, leaf_evaluations, cutoffs, seconds = row
+                found[(width, key, depth)] = {
+                    'move': [move_row, move_col] if move_row is not None else None, 'evaluation': evaluation,
+                    'nodes': nodes, 'leaf_evaluations': leaf_evaluations, 'cutoffs': cutoffs, 'seconds': seconds}
+        return found
+
+    def put_many(self, results: dict[tuple[int, int, int], dict]) -> None:
+        """
+        :param results: (width, canonical key, depth) -> result as returned by analyse_position
+        """
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO analysis VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(width, key.to_bytes(key_size(width), "big"), depth,
+              result['move'][0] if result['move'] is not None else None,
+              result['move'][1] if result['move'] is not None else None,
+              result['evaluation'], result['nodes'], result['leaf_evaluations'], result['cutoffs'], result['seconds'])
+             for (width, key, depth), result in results.items()])
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def analyse_position(task: tuple[int, int, int, float, float]) -> dict:
+    """
+    Searches a position to a fixed depth with the search of the AI's "alphabeta" mode (ThreatEvaluator at the leaves).
+    :param task: (width, canonical key, depth, time budget in seconds, transposition table memory cap in megabytes)
+    :return: result - best move for the canonical orientation (None if there are no free fields), its evaluation (the
+    points the player to move can net over the other player within the depth, None if not even depth 1 was completed in
+    time), search stats, and whether the search was completed to the depth
+    """
+    width, key, depth, time_budget, table_memory_mb = task
+    game = board_class(width).from_snapshot((width, key, 0, 0))
+    searcher = AlphaBetaSearch(time_budget=time_budget, max_depth=depth, table=TranspositionTable(table_memory_mb),
+                               evaluator=ThreatEvaluator())
+    start_time = time.perf_counter()
+    move, evaluation = searcher.search(game, 1)
+    seconds = time.perf_counter() - start_time
+    # the search doesn't go deeper than the number of free fields
+    complete = searcher.depth_reached >= min(depth, len(game.allowed_fields))
+    return {'move': move, 'evaluation': evaluation if evaluation != -math.inf else None, 'nodes': searcher.nodes,
+            'leaf_evaluations': searcher.leaf_evaluations, 'cutoffs': searcher.cutoffs,
+            'depth_reached': searcher.depth_reached, 'seconds': round(seconds, 6), 'complete': complete}
+
+
+def _init_worker() -> None:
+    # Ctrl+C is handled by the main process, which stops the workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class PositionAnalyzer:
+    """
+    Best move, evaluation and search stats for any number of positions. The positions are read in batches; in every
+    batch, positions that are the same up to the mirror image and the score are analysed once, positions in the cache
+    aren't analysed at all, and the rest are spread over the worker processes. Results completed to the full depth
+    are stored in the cache.
+
+    Positions are searched to a fixed depth (capped at the number of free fields, so all the deeper searches of a
+    position share its exact result), which makes the results repeatable and safe to cache.
+    """
+    depth: int = 4
+    workers: int = 1
+    batch_size: int = 256
+    time_budget: float = math.inf
+    table_memory_mb: float = 64
+
+    def __init__(self, depth: int = 4, cache: AnalysisCache = None, workers: int = None, batch_size: int = 256,
+                 time_budget: float = math.inf, table_memory_mb: float = 64) -> None:
+        """
+        :param depth: search depth (number of moves of both players)
+        :param cache: AnalysisCache obj, None for an in-memory one
+        :param workers: number of worker processes, all CPUs by default; 1 analyses the positions in this process
+        :param batch_size: positions read before the analysis of a batch starts - the results of a batch are written
+        out when all of them are known
+        :param time_budget: cap in seconds on the search of a single position - results cut short by it are output but
+        not cached
+        :param table_memory_mb: memory cap of the transposition table of every search
+        """
+        if depth < 1:
+            raise ValueError("The depth must be a positive number. Got " + str(depth) + " instead.")
+
+        self.depth = depth
+        self.cache = cache if cache is not None else AnalysisCache()
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self.table_memory_mb = table_memory_mb
+        self.pool = None
+
+    def __enter__(self) -> "PositionAnalyzer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def analyse(self, records) -> Iterator[dict]:
+        """
+        :param records: dicts (or error messages, see read_records) with the "width" and the "board" (see
+        Triangle.board_string) of the positions, optionally with an "id" (the index of the record by default) and the
+        points "p1" and "p2" so far
+        :return: iterator of the results in the order of the records - dicts with the "id", the "move" for the player
+        to move, the "evaluation", the "depth" searched, the search stats, and whether the result is "cached"; for
+        records that couldn't be read, the "id" and an "error" message
+        """
+        batch = []
+        for record_ind, record in enumerate(records):
+            batch.append((record_ind, record))
+            if len(batch) >= self.batch_size:
+                yield from self.__analyse_batch(batch)
+                batch = []
+        if batch:
+            yield from self.__analyse_batch(batch)
+
+    def __analyse_batch(self, batch: list[tuple[int, dict]]) -> list[dict]:
+        # (id, (width, canonical key, depth), mirrored, geometry) of every record, or (id, error message)
+        positions = []
+        for record_ind, record in batch:
+            if not isinstance(record, dict):
+                # read_records passes the lines it couldn't read on as their error message
+                positions.append((record_ind, record if isinstance(record, str) else "not a JSON object"))
+                continue
+            record_id = record.get('id', record_ind)
+            try:
+                game = parse_board(record['width'], record['board'], record.get('p1', 0), record.get('p2', 0))
+            except (KeyError, TypeError, ValueError) as error:
+                message = "missing " + str(error) if isinstance(error, KeyError) else str(error)
+                positions.append((record_id, message))
+                continue
+            key, mirrored = game.canonical_key()
+            depth = max(1, min(self.depth, len(game.allowed_fields)))
+            positions.append((record_id, (game.width, key, depth), mirrored, game.geometry))
+
+        position_keys = list(dict.fromkeys(position[1] for position in positions if len(position) > 2))
+        results = self.cache.get_many(position_keys)
+        cached = set(results)
+        tasks = [position_key + (self.time_budget, self.table_memory_mb)
+                 for position_key in position_keys if position_key not in results]
+        new_results = {}
+        for task, result in zip(tasks, self.__run(tasks)):
+            new_results[task[:3]] = result
+        self.cache.put_many({position_key: result for position_key, result in new_results.items()
+                             if result['complete']})
+        results.update(new_results)
+
+        output = []
+        for position in positions:
+            if len(position) == 2:
+                output.append({'id': position[0], 'error': position[1]})
+                continue
+            record_id, position_key, mirrored, geometry = position
+            result = results[position_key]
+            move = result['move']
+            if move is not None and mirrored:
+                move = geometry.mirror_move(move)
+            # results cut short by the time budget are only as deep as the last completed iteration
+            depth = position_key[2] if result.get('complete', True) else result['depth_reached']
+            output.append({'id': record_id, 'move': move, 'evaluation': result['evaluation'], 'depth': depth,
+                           'nodes': result['nodes'],
+                           'leaf_evaluations': result['leaf_evaluations'], 'cutoffs': result['cutoffs'],
+                           'seconds': result['seconds'], 'cached': position_key in cached})
+        return output
+
+    def __run(self, tasks: list[tuple[int, int, int, float, float]]) -> list[dict]:
+        if self.workers <= 1 or len(tasks) <= 1:
+            return [analyse_position(task) for task in tasks]
+        if self.pool is None:
+            # started on the first batch that needs it and kept for the following ones
+            self.pool = multiprocessing.Pool(self.workers, initializer=_init_worker)
+        # positions differ a lot in the time they take, so they are handed out one by one
+        return self.pool.map(analyse_position, tasks, chunksize=1)
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+
+def read_records(lines) -> Iterator[dict | str]:
+    """
+    :param lines: JSON lines (blank lines are skipped)
+    :return: iterator of the records - lines that aren't valid JSON come out as their error message, which the analyzer
+    reports for them
+    """
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as error:
+            yield "invalid JSON: " + str(error)
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Analyses positions read as JSON lines ({\"width\": 7, \"board\": \"O/OOO/0OO0O/OOOOOOO\"}, "
+                    "optionally with an \"id\" and the points \"p1\" and \"p2\") and writes the best move, the "
+                    "evaluation and the search stats of each as JSON lines, in the same order.")
+    parser.add_argument("input", nargs="?", default="-", help="file with the positions, - for the standard input")
+    parser.add_argument("--output", default="-", help="file the results are written to, - for the standard output")
+    parser.add_argument("--depth", type=int, default=4, help="search depth (moves of both players)")
+    parser.add_argument("--cache", default="analysis.sqlite",
+                        help="SQLite database the results are kept in between runs, :memory: for none")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, all CPUs by default")
+    parser.add_argument("--batch-size", type=int, default=256, help="positions analysed together")
+    parser.add_argument("--time-budget", type=float, default=math.inf,
+                        help="cap in seconds on the search of a single position (results cut short aren't cached)")
+    args = parser.parse_args(argv)
+    if args.depth < 1:
+        parser.error("the depth must be a positive number")
+
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w")
+    cache = AnalysisCache(args.cache)
+    positions = 0
+    cached = 0
+    errors = 0
+    start_time = time.perf_counter()
+    try:
+        with PositionAnalyzer(args.depth, cache, args.workers, args.batch_size, args.time_budget) as analyzer:
+            for result in analyzer.analyse(read_records(input_file)):
+                output_file.write(json.dumps(result) + "\n")
+                positions += 1
+                cached += result.get('cached', False)
+                errors += 'error' in result
+    except KeyboardInterrupt:
+        print("Interrupted - the results analysed so far are cached.", file=sys.stderr)
+        return 130
+    finally:
+        cache.close()
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+
+    print("Positions: " + str(positions) + ", from the cache: " + str(cached) + ", failed: " + str(errors) + ", "
+          + str(round(time.perf_counter() - start_time, 2)) + " s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,161 @@
+import argparse
+import time
+
+# numpy is only needed for the batch simulator, the game itself doesn't depend on it
+import numpy as np
+
+from geometry import get_geometry
+
+
+class BatchStats:
+    """
+    Statistics of a batch of random games of the same width. Player 1 makes the first move in every game.
+    """
+    width: int = 0
+    games: int = 0
+    # every game lasts until all fields are filled up, so its length is always the number of fields of the board
+    game_length: int = 0
+    p1_scores: np.ndarray
+    p2_scores: np.ndarray
+
+    def __init__(self, width: int, game_length: int, p1_scores: np.ndarray, p2_scores: np.ndarray) -> None:
+        self.width = width
+        self.games = len(p1_scores)
+        self.game_length = game_length
+        self.p1_scores = p1_scores
+        self.p2_scores = p2_scores
+
+    @property
+    def first_player_win_rate(self) -> float:
+        return float(np.mean(self.p1_scores > self.p2_scores)) if self.games else 0.0
+
+    @property
+    def second_player_win_rate(self) -> float:
+        return float(np.mean(self.p2_scores > self.p1_scores)) if self.games else 0.0
+
+    @property
+    def draw_rate(self) -> float:
+        return float(np.mean(self.p1_scores == self.p2_scores)) if self.games else 0.0
+
+    def score_distribution(self, player_number: int) -> np.ndarray:
+        """
+        :return: array whose i-th entry is the number of games in which the player scored i points
+        """
+        return np.bincount(self.p1_scores if player_number == 1 else self.p2_scores)
+
+    def summary(self) -> dict[str, int | float]:
+        return {
+            'width': self.width,
+            'games': self.games,
+            'game_length': self.game_length,
+            'p1_mean_score': float(np.mean(self.p1_scores)) if self.games else 0.0,
+            'p2_mean_score': float(np.mean(self.p2_scores)) if self.games else 0.0,
+            'p1_score_std': float(np.std(self.p1_scores)) if self.games else 0.0,
+            'p2_score_std': float(np.std(self.p2_scores)) if self.games else 0.0,
+            'first_player_win_rate': self.first_player_win_rate,
+            'second_player_win_rate': self.second_player_win_rate,
+            'draw_rate': self.draw_rate
+        }
+
+
+class BatchSimulator:
+    """
+    Plays many games between two random players (RandomComputerPlayer) at once with NumPy.
+
+    Choosing a random allowed field on every move is the same as filling the fields in a random order, so a batch of N
+    games is one N x fields array of move numbers - a random permutation in each row. A line is crossed off on the move
+    that fills its last field, i.e. the maximum of the move numbers of its fields, and the player who made that move
+    gets the points. All of it is computed for every line of every game with a single gather and reduction over
+    precomputed arrays of the fields of each line.
+    """
+    width: int = 0
+    field_count: int = 0
+    # line_fields[line_id] - indices of the fields of the line, padded with field_count (a column that is never the
+    # maximum) up to the length of the longest line
+    line_fields: np.ndarray
+    line_lengths: np.ndarray
+
+    # memory the gathered (games x lines x longest line) array may take per batch
+    BATCH_BYTES: int = 64 * 1024 * 1024
+
+    def __init__(self, width: int, seed: int = None) -> None:
+        """
+        :param width: width of the board - odd integer number
+        :param seed: seed for the random number generator - the same seed gives the same games
+        """
+        geometry = get_geometry(width)
+        self.width = width
+        self.field_count = len(geometry.fields)
+        self.random = np.random.default_rng(seed)
+
+        field_index = {(row - 1, col - 1): field_ind for field_ind, (row, col) in enumerate(geometry.fields)}
+        self.line_lengths = np.array(geometry.line_lengths, dtype=np.int32)
+        self.line_fields = np.full((len(geometry.lines), int(self.line_lengths.max())), self.field_count,
+                                   dtype=np.intp)
+        for line_id, line in enumerate(geometry.lines):
+            self.line_fields[line_id, :len(line)] = [field_index[field] for field in line]
+
+        # the smallest integer type that can hold the move numbers keeps the gathered array small
+        self.move_dtype = np.int16 if self.field_count < 2 ** 15 else np.int32
+        gathered_bytes_per_game = self.line_fields.size * np.dtype(self.move_dtype).itemsize
+        self.batch_size = max(1, self.BATCH_BYTES // gathered_bytes_per_game)
+
+    def random_move_numbers(self, games: int) -> np.ndarray:
+        """
+        :return: games x fields array - entry [g, i] is the move on which the i-th field of the geometry is filled up
+        in game g (0 - the first move)
+        """
+        move_numbers = np.tile(np.arange(self.field_count, dtype=self.move_dtype), (games, 1))
+        return self.random.permuted(move_numbers, axis=1)
+
+    def scores(self, move_numbers: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Final scores of the games given by their move numbers (see random_move_numbers).
+        :return: points of player 1 and of player 2 in each game
+        """
+        # the padding column (-1) never wins the maximum
+        padded = np.concatenate([move_numbers, np.full((len(move_numbers), 1), -1, dtype=move_numbers.dtype)], axis=1)
+        # move on which each line gets crossed off: games x lines
+        completion_moves = padded[:, self.line_fields].max(axis=2)
+        # player 1 makes the even moves (0, 2, ...)
+        crossed_by_p1 = completion_moves % 2 == 0
+        p1_scores = (crossed_by_p1 * self.line_lengths).sum(axis=1, dtype=np.int32)
+        p2_scores = (~crossed_by_p1 * self.line_lengths).sum(axis=1, dtype=np.int32)
+        return p1_scores, p2_scores
+
+    def simulate(self, games: int) -> BatchStats:
+        """
+        Plays the given number of random games, batch by batch so that memory stays bounded.
+        :return: BatchStats obj
+        """
+        p1_scores = []
+        p2_scores = []
+        for start in range(0, games, self.batch_size):
+            batch_p1_scores, batch_p2_scores = self.scores(self.random_move_numbers(min(self.batch_size,
+                                                                                        games - start)))
+            p1_scores.append(batch_p1_scores)
+            p2_scores.append(batch_p2_scores)
+
+        return BatchStats(
+            self.width,
+            self.field_count,
+            np.concatenate(p1_scores) if p1_scores else np.zeros(0, dtype=np.int32),
+            np.concatenate(p2_scores) if p2_scores else np.zeros(0, dtype=np.int32)
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate random Triangle games in batches.")
+    parser.add_argument("--width", type=int, nargs="+", default=[11], help="board widths (odd numbers)")
+    parser.add_argument("--games", type=int, default=100000, help="number of games per width")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    for board_width in args.width:
+        start_time = time.perf_counter()
+        stats = BatchSimulator(board_width, seed=args.seed).simulate(args.games)
+        elapsed = time.perf_counter() - start_time
+        summary = stats.summary()
+        print("Width " + str(board_width) + ": " + str(stats.games) + " games in " + str(round(elapsed, 2)) + " s")
+        for key, value in summary.items():
+            print("  " + key + ": " + str(round(value, 4) if isinstance(value, float) else value))
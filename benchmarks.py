@@ -0,0 +1,311 @@
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from book import get_book
+from game import Triangle
+from large_board import new_board
+from player import AIComputerPlayer, RandomComputerPlayer
+from search import AlphaBetaSearch
+from session import GameSession
+from transposition import TranspositionTable
+
+
+DEFAULT_WIDTHS = [5, 11, 21, 51, 101, 201]
+DEFAULT_AI_WIDTHS = [5, 11, 21, 51]
+DEFAULT_DEPTHS = [1, 2, 3, 4]
+# the minimax has no pruning, so it only gets the shallow depths
+DEFAULT_MINIMAX_DEPTHS = [1, 2]
+
+# metrics where a lower value is better; for all the other ones higher is better
+LOWER_IS_BETTER = ("peak_kb", "seconds_per_move")
+
+
+def shuffled_fields(width: int, seed: int) -> list[list[int]]:
+    fields = [list(field) for field in new_board(width).allowed_fields]
+    random.Random(seed).shuffle(fields)
+    return fields
+
+
+def bench_make_move(width: int, seed: int, min_time: float) -> dict[str, float]:
+    """
+    Fills up whole boards in a random order with make_move, for at least min_time seconds.
+    """
+    fields = shuffled_fields(width, seed)
+    moves = 0
+    elapsed = 0.0
+    while elapsed < min_time:
+        game = new_board(width)
+        start_time = time.perf_counter()
+        for field in fields:
+            game.make_move(field)
+        elapsed += time.perf_counter() - start_time
+        moves += len(fields)
+    return {'ops_per_sec': moves / elapsed}
+
+
+def bench_check_if_combo(width: int, seed: int, min_time: float) -> dict[str, float]:
+    """
+    Fills up whole boards in a random order, timing only the check_if_combo call after each move, for at least
+    min_time seconds.
+    """
+    fields = shuffled_fields(width, seed)
+    checks = 0
+    elapsed = 0.0
+    while elapsed < min_time:
+        game = new_board(width)
+        for move_ind, field in enumerate(fields):
+            game.make_move(field)
+            start_time = time.perf_counter()
+            game.check_if_combo(field, move_ind % 2 + 1)
+            elapsed += time.perf_counter() - start_time
+        checks += len(fields)
+    return {'ops_per_sec': checks / elapsed}
+
+
+def bench_random_game(width: int, seed: int, min_time: float) -> dict[str, float]:
+    """
+    Plays headless games between two random players for at least min_time seconds.
+    """
+    games = 0
+    moves = 0
+    start_time = time.perf_counter()
+    while True:
+        result = GameSession(RandomComputerPlayer(1, seed=seed + games), RandomComputerPlayer(2, seed=seed - games),
+                             width).run()
+        games += 1
+        moves += len(result.moves)
+        elapsed = time.perf_counter() - start_time
+        if elapsed >= min_time:
+            break
+    return {'games_per_sec': games / elapsed, 'moves_per_sec': moves / elapsed}
+
+
+def bench_ai_move(width: int, depth: int, seed: int, min_time: float, time_budget: float) -> dict[str, float]:
+    """
+    Alpha-beta search to the given depth from a position with a quarter of the fields filled up at random, repeated
+    for at least min_time seconds.
+    """
+    game = new_board(width)
+    fields = shuffled_fields(width, seed)
+    for move_ind, field in enumerate(fields[:len(fields) // 4]):
+        game.push_move(field, move_ind % 2 + 1)
+
+    searches = 0
+    nodes = 0
+    elapsed = 0.0
+    while elapsed < min_time:
+        searcher = AlphaBetaSearch(time_budget=time_budget, max_depth=depth, table=TranspositionTable(64))
+        start_time = time.perf_counter()
+        searcher.search(game, 1)
+        elapsed += time.perf_counter() - start_time
+        searches += 1
+        nodes += searcher.nodes
+    return {
+        'seconds_per_move': elapsed / searches,
+        'nodes_per_sec': nodes / elapsed,
+        # 0 if not even the first iteration finished within the time budget
+        'depth_reached': searcher.depth_reached
+    }
+
+
+def ai_position(width: int, seed: int, filled_fields: int) -> Triangle:
+    """
+    Position with the given number of fields filled up - both bottom corners first, as the AI player answers positions
+    with a free corner right away, without searching, and then random ones.
+    """
+    game = new_board(width)
+    corners = [[game.height, 1], [game.height, width]]
+    fields = corners + [field for field in shuffled_fields(width, seed) if field not in corners]
+    for move_ind, field in enumerate(fields[:filled_fields]):
+        game.push_move(field, move_ind % 2 + 1)
+    return game
+
+
+def bench_ai_player(width: int, search: str, depth: int, free_fields: int | None, seed: int, min_time: float,
+                    time_budget: float, endgame_threshold: int | None, endgame_time_budget: float,
+                    book_dir: str | None) -> dict[str, float]:
+    """
+    AIComputerPlayer.select_move with the settings the game is played with - the opening book and the endgame solver
+    are consulted before searching - repeated for at least min_time seconds, every time with a new player.
+    :param search: "minimax" to the given depth, or "alphabeta" within time_budget
+    :param free_fields: free fields of the position (see ai_position), None for three quarters of the board
+    """
+    field_count = len(new_board(width).allowed_fields)
+    game = ai_position(width, seed, field_count // 4 if free_fields is None else field_count - free_fields)
+
+    moves = 0
+    nodes = 0
+    elapsed = 0.0
+    while elapsed < min_time:
+        player = AIComputerPlayer(1, depth=depth, search=search, time_budget=time_budget, book_dir=book_dir,
+                                  endgame_threshold=endgame_threshold, endgame_time_budget=endgame_time_budget)
+        start_time = time.perf_counter()
+        player.select_move(game, 1)
+        elapsed += time.perf_counter() - start_time
+        moves += 1
+        nodes += player.last_stats.nodes
+    return {
+        'seconds_per_move': elapsed / moves,
+        'nodes_per_sec': nodes / elapsed,
+        'depth_reached': player.last_stats.depth
+    }
+
+
+def measure(benchmark, args: tuple, repeat: int) -> dict[str, float]:
+    """
+    Runs the benchmark repeat times and keeps the best result of every metric, then once more under tracemalloc for
+    the peak memory (tracing slows the code down, so that run isn't timed).
+    """
+    best = {}
+    for _ in range(repeat):
+        for metric, value in benchmark(*args).items():
+            if metric not in best:
+                best[metric] = value
+            elif metric in LOWER_IS_BETTER:
+                best[metric] = min(best[metric], value)
+            else:
+                best[metric] = max(best[metric], value)
+
+    tracemalloc.start()
+    benchmark(*args)
+    best['peak_kb'] = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return best
+
+
+def run_benchmarks(widths: list[int], ai_widths: list[int], depths: list[int], repeat: int, seed: int,
+                   min_time: float, ai_time_budget: float, minimax_depths: list[int] = None,
+                   player_time_budget: float = 0.2, endgame_threshold: int | None = 18,
+                   endgame_time_budget: float = 1.0, book_dir: str = None) -> dict[str, dict[str, float]]:
+    """
+    :param minimax_depths: depths of the AIComputerPlayer minimax benchmark, DEFAULT_MINIMAX_DEPTHS by default
+    :param player_time_budget: seconds per move of the AIComputerPlayer alpha-beta benchmark
+    :param endgame_threshold: endgame solver threshold of the AIComputerPlayer endgame benchmark, None to leave it out
+    - the minimax and alpha-beta benchmarks run without the solver, which would answer their positions on the small
+    boards before searching
+    :param book_dir: directory with the opening books of the AIComputerPlayer benchmarks - widths with a book get a
+    benchmark of the book move from the empty board
+    """
+    minimax_depths = minimax_depths if minimax_depths is not None else DEFAULT_MINIMAX_DEPTHS
+    results = {}
+    for width in widths:
+        results['make_move/w=' + str(width)] = measure(bench_make_move, (width, seed, min_time), repeat)
+        results['check_if_combo/w=' + str(width)] = measure(bench_check_if_combo, (width, seed, min_time), repeat)
+        results['random_game/w=' + str(width)] = measure(bench_random_game, (width, seed, min_time), repeat)
+    for width in ai_widths:
+        for depth in depths:
+            results['ai_move/w=' + str(width) + '/d=' + str(depth)] = measure(
+                bench_ai_move, (width, depth, seed, min_time, ai_time_budget), repeat)
+
+        search_settings = (seed, min_time, player_time_budget, None, endgame_time_budget, book_dir)
+        player_settings = (seed, min_time, player_time_budget, endgame_threshold, endgame_time_budget, book_dir)
+        for depth in minimax_depths:
+            results['ai_player/minimax/w=' + str(width) + '/d=' + str(depth)] = measure(
+                bench_ai_player, (width, "minimax", depth, None) + search_settings, repeat)
+        results['ai_player/alphabeta/w=' + str(width)] = measure(
+            bench_ai_player, (width, "alphabeta", 0, None) + search_settings, repeat)
+        # the position has to have free fields other than the corners
+        if endgame_threshold is not None and endgame_threshold + 2 < len(new_board(width).allowed_fields):
+            results['ai_player/endgame/w=' + str(width)] = measure(
+                bench_ai_player, (width, "alphabeta", 0, endgame_threshold) + player_settings, repeat)
+        if book_dir is not None and get_book(book_dir, width) is not None:
+            # from the empty board
+            results['ai_player/book/w=' + str(width)] = measure(
+                bench_ai_player, (width, "alphabeta", 0, len(new_board(width).allowed_fields)) + player_settings,
+                repeat)
+    return results
+
+
+def compare(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], threshold: float) \
+        -> list[str]:
+    """
+    :param threshold: allowed relative slowdown / memory growth, e.g. 0.2 for 20%
+    :return: descriptions of the metrics that regressed beyond the threshold
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            baseline_value = baseline.get(name, {}).get(metric)
+            # depth_reached is reported for information only
+            if not baseline_value or metric == 'depth_reached':
+                continue
+
+            if metric in LOWER_IS_BETTER:
+                change = value / baseline_value - 1
+            else:
+                change = baseline_value / value - 1 if value else math.inf
+            if change > threshold:
+                regressions.append(name + " " + metric + ": " + format(baseline_value, ".4g") + " -> "
+                                   + format(value, ".4g") + " (" + str(round(change * 100, 1)) + "% worse)")
+    return regressions
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks for Triangle and the AI players.")
+    parser.add_argument("--widths", type=int, nargs="+", default=DEFAULT_WIDTHS,
+                        help="board widths for the move, combo and random game benchmarks")
+    parser.add_argument("--ai-widths", type=int, nargs="+", default=DEFAULT_AI_WIDTHS,
+                        help="board widths for the AI benchmark")
+    parser.add_argument("--depths", type=int, nargs="+", default=DEFAULT_DEPTHS,
+                        help="search depths for the AI benchmark")
+    parser.add_argument("--ai-time-budget", type=float, default=5.0,
+                        help="cap in seconds on a single AI search (it stops at the last completed depth)")
+    parser.add_argument("--minimax-depths", type=int, nargs="+", default=DEFAULT_MINIMAX_DEPTHS,
+                        help="search depths for the AI player's minimax benchmark")
+    parser.add_argument("--player-time-budget", type=float, default=0.2,
+                        help="seconds per move for the AI player's alpha-beta benchmark")
+    parser.add_argument("--endgame-threshold", type=int, default=18,
+                        help="free fields up to which the AI player solves positions exactly, 0 for no endgame solver")
+    parser.add_argument("--endgame-time-budget", type=float, default=1.0,
+                        help="seconds the AI player may spend solving a position")
+    parser.add_argument("--book-dir", help="directory with the opening books of the AI player")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark, the best one counts")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds of a single benchmark run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file written by an earlier run to compare the results with")
+    parser.add_argument("--threshold", type=float, default=0.4,
+                        help="fail if a metric is worse than the baseline by more than this fraction")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.widths, args.ai_widths, args.depths, args.repeat, args.seed, args.min_time,
+                             args.ai_time_budget, args.minimax_depths, args.player_time_budget,
+                             args.endgame_threshold or None, args.endgame_time_budget, args.book_dir)
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        'results': results
+    }
+
+    for name, metrics in results.items():
+        print(name + ": " + ", ".join(metric + "=" + format(value, ".4g") for metric, value in metrics.items()))
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("Regressions against " + args.baseline + ":")
+            for regression in regressions:
+                print("  " + regression)
+            return 1
+        print("No regressions against " + args.baseline + ".")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+import argparse
+import math
+import mmap
+import os
+import struct
+import time
+
+from search import AlphaBetaSearch
+from transposition import TranspositionTable
+
+
+# directory the AI looks for books in by default - book_<width>.bin files written by this module
+DEFAULT_BOOK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "books")
+
+BOOK_MAGIC = b"TRIBOOK"
+BOOK_VERSION = 1
+# magic, version, width, number of plies covered, key size in bytes, number of entries
+BOOK_HEADER = struct.Struct("<7sBHHHI")
+# every entry is the canonical key (big-endian, so that the byte order of the keys is their numeric order) followed by
+# the best move for the canonical orientation and its evaluation
+ENTRY_TAIL = struct.Struct("<HHi")
+
+
+def book_path(directory: str, width: int) -> str:
+    return os.path.join(directory, "book_" + str(width) + ".bin")
+
+
+def key_size(width: int) -> int:
+    """
+    Bytes needed for a canonical key - one bit per field of the board.
+    """
+    field_count = ((width + 1) // 2) ** 2
+    return (field_count + 7) // 8
+
+
+class OpeningBook:
+    """
+    Best moves for the opening positions of one board width, read from a file written by write_book. The entries are
+    sorted by the canonical key of the position (Triangle.canonical_key), so a lookup is a binary search over the
+    memory-mapped file - nothing is read before the first lookup, and after that only the pages the search touches.
+
+    A position and its mirror image share an entry; the stored move is for the canonical orientation and gets mirrored
+    back when needed.
+    """
+    path: str = ""
+    width: int = 0
+    plies: int = 0
+    entries: int = 0
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as book_file:
+            header = book_file.read(BOOK_HEADER.size)
+        if len(header) < BOOK_HEADER.size:
+            raise ValueError(path + " is not an opening book.")
+        magic, version, self.width, self.plies, self.key_size, self.entries = BOOK_HEADER.unpack(header)
+        if magic != BOOK_MAGIC:
+            raise ValueError(path + " is not an opening book.")
+        if version != BOOK_VERSION:
+            raise ValueError(path + " has an unsupported format version: " + str(version) + ".")
+        self.entry_size = self.key_size + ENTRY_TAIL.size
+        self.data = None
+        self.file = None
+
+    def __len__(self) -> int:
+        return self.entries
+
+    def __map(self) -> None:
+        self.file = open(self.path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def lookup(self, game) -> tuple[list[int], int] | None:
+        """
+        :param game: Triangle class obj
+        :return: best move and its evaluation for the player to move, None if the position is not in the book
+        """
+        if game.width != self.width or len(game.geometry.fields) - len(game.allowed_fields) > self.plies:
+            return None
+        if self.data is None:
+            self.__map()
+
+        key, mirrored = game.canonical_key()
+        key_bytes = key.to_bytes(self.key_size, "big")
+        low = 0
+        high = self.entries
+        while low < high:
+            middle = (low + high) // 2
+            offset = BOOK_HEADER.size + middle * self.entry_size
+            entry_key = self.data[offset:offset + self.key_size]
+            if entry_key < key_bytes:
+                low = middle + 1
+            elif entry_key > key_bytes:
+                high = middle
+            else:
+                row, col, evaluation = ENTRY_TAIL.unpack_from(self.data, offset + self.key_size)
+                move = [row, col]
+                return (game.geometry.mirror_move(move) if mirrored else move), evaluation
+        return None
+
+    def close(self) -> None:
+        if self.data is not None:
+            self.data.close()
+            self.file.close()
+            self.data = None
+
+
+# books are opened once per file and shared by all players
+_BOOK_CACHE: dict[str, OpeningBook | None] = {}
+
+
+def get_book(directory: str, width: int) -> OpeningBook | None:
+    """
+    :return: the book for the given width from the directory, None if there is none
+    """
+    path = book_path(directory, width)
+    if path not in _BOOK_CACHE:
+        _BOOK_CACHE[path] = OpeningBook(path) if os.path.exists(path) else None
+    return _BOOK_CACHE[path]
+
+
+def build_book(width: int, plies: int, depth: int, time_budget: float = math.inf, verbose: bool = False) \
+        -> dict[int, tuple[list[int], int]]:
+    """
+    Searches the opening positions of the given width. For each side, the book player's positions are followed through
+    its best move and the other player's through every reply (one of every mirrored pair in symmetric positions), so
+    the book answers any opening the book player can run into, whether it moves first or second.
+    :param plies: positions with up to that many filled fields are covered
+    :param depth: search depth for every position
+    :param time_budget: cap in seconds on the search of a single position
+    :return: canonical key -> (best move for the canonical orientation, evaluation)
+    """
+    # imported here - game.py imports the player module, which imports this one
+    from game import Triangle
+
+    searcher = AlphaBetaSearch(time_budget=time_budget, max_depth=depth, table=TranspositionTable(64))
+    book = {}
+    visited = set()
+    start_time = time.perf_counter()
+
+    def expand(game, player_no: int, book_player: int) -> None:
+        if len(game.move_stack) > plies or game.is_end():
+            return
+        key, mirrored = game.canonical_key()
+        if (key, book_player) in visited:
+            return
+        visited.add((key, book_player))
+
+        next_player = 1 if player_no == 2 else 2
+        if player_no == book_player:
+            if key not in book:
+                move, evaluation = searcher.search(game, player_no)
+                # -inf if not even the first iteration fit into the time budget
+                evaluation = int(evaluation) if math.isfinite(evaluation) else 0
+                book[key] = (game.geometry.mirror_move(move) if mirrored else move, evaluation)
+                if verbose and not len(book) % 100:
+                    print(str(len(book)) + " positions, " + str(round(time.perf_counter() - start_time, 1)) + " s")
+            else:
+                move = book[key][0]
+                move = game.geometry.mirror_move(move) if mirrored else move
+            replies = [move]
+        else:
+            replies = searcher.order_moves(game)
+
+        for reply in replies:
+            game.push_move(reply, player_no)
+            expand(game, next_player, book_player)
+            game.pop_move()
+
+    for book_player in (1, 2):
+        expand(Triangle(width), 1, book_player)
+    return book
+
+
+def write_book(path: str, width: int, plies: int, book: dict[int, tuple[list[int], int]]) -> None:
+    size = key_size(width)
+    with open(path, "wb") as book_file:
+        book_file.write(BOOK_HEADER.pack(BOOK_MAGIC, BOOK_VERSION, width, plies, size, len(book)))
+        for key in sorted(book):
+            (row, col), evaluation = book[key]
+            book_file.write(key.to_bytes(size, "big") + ENTRY_TAIL.pack(row, col, evaluation))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build opening books for the AI player.")
+    parser.add_argument("--widths", type=int, nargs="+", default=[5, 7, 9, 11], help="board widths (odd numbers)")
+    parser.add_argument("--plies", type=int, default=4, help="filled fields up to which positions are covered")
+    parser.add_argument("--depth", type=int, default=4, help="search depth per position")
+    parser.add_argument("--time-budget", type=float, default=math.inf, help="cap in seconds per position")
+    parser.add_argument("--output", default=DEFAULT_BOOK_DIR, help="directory to write the books to")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    for board_width in args.widths:
+        build_start = time.perf_counter()
+        positions = build_book(board_width, args.plies, args.depth, args.time_budget, verbose=True)
+        write_book(book_path(args.output, board_width), board_width, args.plies, positions)
+        print("Width " + str(board_width) + ": " + str(len(positions)) + " positions in "
+              + str(round(time.perf_counter() - build_start, 1)) + " s")
@@ -0,0 +1,247 @@
+import math
+import sys
+import time
+
+from search import SearchTimeout
+
+
+class EndgameSolver:
+    """
+    Solves positions with few free fields exactly. The free fields are numbered and the position is encoded as a
+    bitmask of the ones still free; for every free field the lines going through it are kept as bitmasks of their free
+    fields, so a move completes a line when it is the last set bit of the line's mask. The game is then solved with
+    alpha-beta negamax over the points still to gain (the same evaluation AlphaBetaSearch uses), memoising the bounds
+    found for every mask - different move orders reaching the same set of free fields are solved once.
+
+    The solution is exact: the returned move is optimal and its evaluation is the final point difference the player to
+    move can force, counted from the current points. Later positions of the same game are subsets of the encoded one,
+    so the memo table carries over to the next moves.
+    """
+    # free fields up to which positions are solved
+    threshold: int = 20
+    time_budget: float = 1.0
+    # the memo table stops taking new states (but keeps being used) once it gets this big
+    memory_mb: float = 256
+    # statistics of the last solve: positions visited, positions evaluated without looking at their moves (end of
+    # the game, bound or memo table cutoffs) and beta cutoffs
+    nodes: int = 0
+    leaf_evaluations: int = 0
+    cutoffs: int = 0
+    elapsed: float = 0.0
+    solved: bool = False
+
+    # rough size of a memo entry: the dict slot, the int key and the (lower, upper, best move) tuple
+    ENTRY_SIZE: int = 180
+
+    def __init__(self, threshold: int = 20, time_budget: float = 1.0, memory_mb: float = 256) -> None:
+        """
+        :param threshold: positions with more free fields than that are not solved
+        :param time_budget: seconds a solve may take - after that it gives up
+        :param memory_mb: memory cap of the memo table
+        """
+        self.threshold = threshold
+        self.time_budget = time_budget
+        self.memory_mb = memory_mb
+        self.max_entries = max(1, int(memory_mb * 1024 * 1024 / self.ENTRY_SIZE))
+        self.memo = {}
+        self.nodes = 0
+        self.leaf_evaluations = 0
+        self.cutoffs = 0
+        self.elapsed = 0.0
+        self.solved = False
+        self.deadline = 0.0
+        # fields and lines of the position being solved
+        self.geometry = None
+        self.fields = []
+        # (row, col) -> bit of the field
+        self.field_bits = {}
+        # (free fields mask, length) of every line that had free fields when the position was encoded
+        self.lines = []
+        self.field_lines = []
+
+    def can_solve(self, game) -> bool:
+        return 0 < len(game.allowed_fields) <= self.threshold
+
+    def solve(self, game) -> tuple[list[int], int] | None:
+        """
+        The memo table is kept between calls as long as the free fields of the new position are a subset of the ones
+        encoded before - e.g. on the next move of the same game - so a solve that ran out of time still leaves its
+        results to the next one.
+        :param game: Triangle class obj
+        :return: optimal move and its evaluation for the player to move, None if the position has more free fields than
+        the threshold or the time budget ran out
+        """
+        self.nodes = 0
+        self.leaf_evaluations = 0
+        self.cutoffs = 0
+        self.solved = False
+        start_time = time.perf_counter()
+        self.deadline = start_time + self.time_budget
+        if not self.can_solve(game):
+            self.elapsed = 0.0
+            return None
+
+        remaining = self.__remaining(game)
+        if remaining is None:
+            self.__encode(game)
+            remaining = (1 << len(self.fields)) - 1
+        points_left = sum(line_length for line_mask, line_length in self.lines if line_mask & remaining)
+
+        try:
+            evaluation, best_bit = self.__solve_root(remaining, points_left)
+        except SearchTimeout:
+            return None
+        finally:
+            self.elapsed = time.perf_counter() - start_time
+
+        self.solved = True
+        return list(self.fields[best_bit.bit_length() - 1]), evaluation
+
+    def stats(self) -> dict[str, int | float | bool]:
+        """
+        :return: statistics of the last solve - states is the number of positions in the memo table and memo_bytes the
+        memory it takes
+        """
+        memo_bytes = sys.getsizeof(self.memo)
+        for key, entry in self.memo.items():
+            memo_bytes += sys.getsizeof(key) + sys.getsizeof(entry)
+        return {
+            'solved': self.solved,
+            'nodes': self.nodes,
+            'leaf_evaluations': self.leaf_evaluations,
+            'cutoffs': self.cutoffs,
+            'states': len(self.memo),
+            'memo_bytes': memo_bytes,
+            'seconds': self.elapsed,
+            'nodes_per_sec': self.nodes / self.elapsed if self.elapsed else 0.0
+        }
+
+    def __remaining(self, game) -> int | None:
+        """
+        :return: bitmask of the game's free fields in the current encoding, None if it can't be expressed in it
+        """
+        if game.geometry is not self.geometry:
+            return None
+        remaining = 0
+        for row, col in game.allowed_fields:
+            bit = self.field_bits.get((row, col))
+            if bit is None:
+                return None
+            remaining |= bit
+        return remaining
+
+    def __encode(self, game) -> None:
+        """
+        Numbers the free fields (bit i - the i-th free field), works out the lines going through each of them and
+        starts a new memo table.
+        """
+        self.geometry = game.geometry
+        self.fields = list(game.allowed_fields)
+        self.field_bits = {(row, col): 1 << field_ind for field_ind, (row, col) in enumerate(self.fields)}
+        self.memo = {}
+
+        line_masks = {}
+        for row, col in self.fields:
+            for line_id in game.geometry.field_lines[(row - 1, col - 1)]:
+                if line_id not in line_masks:
+                    line_mask = 0
+                    for line_row_ind, line_col_ind in game.geometry.lines[line_id]:
+                        # every field of the line that isn't filled is one of the free fields
+                        line_mask |= self.field_bits.get((line_row_ind + 1, line_col_ind + 1), 0)
+                    line_masks[line_id] = line_mask
+
+        self.lines = [(line_mask, game.geometry.line_lengths[line_id]) for line_id, line_mask in line_masks.items()]
+        self.field_lines = []
+        for row, col in self.fields:
+            self.field_lines.append(tuple((line_masks[line_id], game.geometry.line_lengths[line_id])
+                                          for line_id in game.geometry.field_lines[(row - 1, col - 1)]))
+
+    def __ordered_moves(self, remaining: int, best_bit: int) -> list[tuple[int, int]]:
+        """
+        :return: (points, bit) of every free field - the stored best move first, then the ones scoring the most
+        """
+        moves = []
+        field_lines = self.field_lines
+        fields_left = remaining
+        while fields_left:
+            bit = fields_left & -fields_left
+            fields_left ^= bit
+            points = 0
+            for line_mask, line_length in field_lines[bit.bit_length() - 1]:
+                # the field is the last free one of the line
+                if remaining & line_mask == bit:
+                    points += line_length
+            moves.append((points + (1000000 if bit == best_bit else 0), points, bit))
+        moves.sort(reverse=True)
+        return [(points, bit) for _, points, bit in moves]
+
+    def __solve_root(self, remaining: int, points_left: int) -> tuple[int, int]:
+        best_evaluation = -math.inf
+        best_bit = 0
+        for points, bit in self.__ordered_moves(remaining, 0):
+            evaluation = points - self.__negamax(remaining ^ bit, points_left - points, -math.inf,
+                                                 points - best_evaluation)
+            # strictly better only - with equal evaluations the move tried first wins
+            if evaluation > best_evaluation:
+                best_evaluation = evaluation
+                best_bit = bit
+        return best_evaluation, best_bit
+
+    def __negamax(self, remaining: int, points_left: int, alpha: int | float, beta: int | float) -> int:
+        """
+        :param remaining: bitmask of the free fields
+        :param points_left: points of the lines that are still to be completed
+        :return: evaluation from the perspective of the player to move (fail-soft)
+        """
+        self.nodes += 1
+        if not self.nodes & 1023 and time.perf_counter() > self.deadline:
+            raise SearchTimeout
+        if not remaining:
+            self.leaf_evaluations += 1
+            return 0
+        # the evaluation lies between -points_left and points_left
+        if points_left <= alpha:
+            self.leaf_evaluations += 1
+            return points_left
+        if -points_left >= beta:
+            self.leaf_evaluations += 1
+            return -points_left
+
+        best_bit = 0
+        entry = self.memo.get(remaining)
+        if entry is not None:
+            lower, upper, best_bit = entry
+            if lower >= beta or lower == upper:
+                self.leaf_evaluations += 1
+                return lower
+            if upper <= alpha:
+                self.leaf_evaluations += 1
+                return upper
+            alpha = max(alpha, lower)
+            beta = min(beta, upper)
+        else:
+            lower, upper = -points_left, points_left
+
+        original_alpha = alpha
+        best_evaluation = -math.inf
+        for points, bit in self.__ordered_moves(remaining, best_bit):
+            evaluation = points - self.__negamax(remaining ^ bit, points_left - points, points - beta, points - alpha)
+            if evaluation > best_evaluation:
+                best_evaluation = evaluation
+                best_bit = bit
+                if evaluation > alpha:
+                    alpha = evaluation
+                    if alpha >= beta:
+                        self.cutoffs += 1
+                        break
+
+        # tighten the bounds known for the position
+        if best_evaluation <= original_alpha:
+            upper = min(upper, best_evaluation)
+        elif best_evaluation >= beta:
+            lower = max(lower, best_evaluation)
+        else:
+            lower = upper = best_evaluation
+        if entry is not None or len(self.memo) < self.max_entries:
+            self.memo[remaining] = (lower, upper, best_bit)
+        return best_evaluation
@@ -0,0 +1,178 @@
+# geometry -> ids of the lines going through every field, by the index of the field in geometry.fields
+_FIELD_LINES_CACHE = {}
+
+# ThreatEvaluator.line_field_sums of the lines whose sum hasn't been worked out yet - far enough below zero to stay
+# negative whatever moved / unmoved add to it
+_UNKNOWN_SUM = -2 ** 62
+
+# with more candidate moves than that, score_moves looks at the fields of the lines about to be completed instead of at
+# the lines of every move
+SPARSE_SCORING_MOVES = 1024
+
+
+class _IndexedFieldLines:
+    """
+    _field_lines of a geometry that works its fields out on access (large_board.LargeBoardGeometry) - a list would take
+    as much memory as the board itself and a long time to build.
+    """
+    __slots__ = ('geometry',)
+
+    def __init__(self, geometry) -> None:
+        self.geometry = geometry
+
+    def __getitem__(self, field_ind: int) -> tuple[int, int, int, int]:
+        row_ind, col_ind = self.geometry.field(field_ind)
+        return self.geometry.line_ids(row_ind, col_ind)
+
+
+def _field_lines(geometry) -> list[tuple[int, int, int, int]] | _IndexedFieldLines:
+    if geometry not in _FIELD_LINES_CACHE:
+        if isinstance(geometry.fields, list):
+            _FIELD_LINES_CACHE[geometry] = [geometry.field_lines[(row - 1, col - 1)] for row, col in geometry.fields]
+        else:
+            _FIELD_LINES_CACHE[geometry] = _IndexedFieldLines(geometry)
+    return _FIELD_LINES_CACHE[geometry]
+
+
+def _free_cells(game, line_id: int) -> list[int]:
+    """
+    :return: indices of the free fields of the line
+    """
+    positions = game.allowed_fields.positions
+    return [field_ind for field_ind in game.geometry.line_cells(line_id) if positions[field_ind] >= 0]
+
+
+class ThreatEvaluator:
+    """
+    Static evaluation of a position for the leaves of the search, built on the threat map of the board - the number of
+    unfilled fields of every line, which the game keeps in line_remaining:
+
+    * filling the last field of a line (one move from completion) scores it;
+    * filling a field of a line two moves from completion hands the line to the other player.
+
+    score_moves scores candidate moves by both in a single pass over them. A leaf is worth what the player to move can
+    net with its best move - points scored minus points handed over - or 0 if no move nets anything (the player isn't
+    forced to hand points over while there are other fields). Short of searching one move deeper, that keeps the search
+    from stopping right before a line it could complete.
+
+    Only the last free fields of lines one move from completion can net anything, so that's all a leaf looks at. For
+    every line the evaluator keeps the sum of the indices of its free fields - once a single field is left the sum is
+    its index - and the set of lines with one free field left. Both are kept up to date with every move (moved /
+    unmoved after push_move / pop_move - only the four lines through the field change), so a leaf costs a few lookups
+    per line about to be completed instead of a pass over the board. The sum of a line is only worked out the first
+    time the line is one move from completion at a leaf, so reset costs a pass over the lines, not over the fields -
+    which on the widest boards would take longer than the whole time budget of a move. The evaluation is a whole
+    number, like the point differences the search adds it to, so transposition table entries and the parallel search's
+    shared bound keep working.
+    """
+    # line id -> sum of the geometry.fields indices of its free fields, negative if not worked out yet
+    line_field_sums: list[int]
+    # ids of the lines with a single free field left
+    one_away_lines: set[int]
+
+    def __init__(self) -> None:
+        self.line_field_sums = []
+        self.one_away_lines = set()
+
+    def reset(self, game) -> None:
+        """
+        Builds the threat map of the position from scratch - has to be called before the first moved / unmoved.
+        :param game: Triangle class obj
+        """
+        self.line_field_sums = [_UNKNOWN_SUM] * len(game.line_remaining)
+        self.one_away_lines = {line_id for line_id, remaining in enumerate(game.line_remaining) if remaining == 1}
+
+    def moved(self, game, coordinates: list[int]) -> None:
+        """
+        Updates the threat map after game.push_move(coordinates, ...).
+        """
+        field_ind = game.geometry.field_index[(coordinates[0], coordinates[1])]
+        line_remaining = game.line_remaining
+        for line_id in game.geometry.field_lines[(coordinates[0] - 1, coordinates[1] - 1)]:
+            self.line_field_sums[line_id] -= field_ind
+            # the line went from remaining + 1 to remaining free fields
+            remaining = line_remaining[line_id]
+            if remaining == 1:
+                self.one_away_lines.add(line_id)
+            elif remaining == 0:
+                self.one_away_lines.discard(line_id)
+
+    def unmoved(self, game, coordinates: list[int]) -> None:
+        """
+        Updates the threat map after game.pop_move() took back the move at coordinates.
+        """
+        field_ind = game.geometry.field_index[(coordinates[0], coordinates[1])]
+        line_remaining = game.line_remaining
+        for line_id in game.geometry.field_lines[(coordinates[0] - 1, coordinates[1] - 1)]:
+            self.line_field_sums[line_id] += field_ind
+            # the line went from remaining - 1 to remaining free fields
+            remaining = line_remaining[line_id]
+            if remaining == 1:
+                self.one_away_lines.add(line_id)
+            elif remaining == 2:
+                self.one_away_lines.discard(line_id)
+
+    def evaluate(self, game) -> int:
+        """
+        :param game: Triangle class obj in the position the threat map is kept for
+        :return: points the player to move can net with its next move
+        """
+        best_score = 0
+        if not self.one_away_lines:
+            return best_score
+
+        field_lines = _field_lines(game.geometry)
+        line_remaining = game.line_remaining
+        line_lengths = game.geometry.line_lengths
+        line_field_sums = self.line_field_sums
+        for one_away_line_id in self.one_away_lines:
+            field_ind = line_field_sums[one_away_line_id]
+            if field_ind < 0:
+                # the single free field of the line is its sum from now on
+                field_ind = _free_cells(game, one_away_line_id)[0]
+                line_field_sums[one_away_line_id] = field_ind
+            score = 0
+            for line_id in field_lines[field_ind]:
+                remaining = line_remaining[line_id]
+                if remaining == 1:
+                    score += line_lengths[line_id]
+                elif remaining == 2:
+                    score -= line_lengths[line_id]
+            if score > best_score:
+                best_score = score
+        return best_score
+
+    @staticmethod
+    def score_moves(game, moves) -> list[int]:
+        """
+        Scores all the candidate moves in a single pass: the points of the lines the move completes minus the points
+        of the lines it leaves one field from completion for the other player. Works from line_remaining alone, so it
+        can be used for move ordering anywhere, also outside of a search.
+        :param game: Triangle class obj
+        :param moves: [row, col] of free fields
+        :return: score of every move, in the order of moves
+        """
+        field_lines = game.geometry.field_lines
+        # value of filling a field of each line: the line itself if it's the last field, minus the line if it makes
+        # it the other player's
+        line_values = [line_length if remaining == 1 else -line_length if remaining == 2 else 0
+                       for remaining, line_length in zip(game.line_remaining, game.geometry.line_lengths)]
+        if len(moves) > SPARSE_SCORING_MOVES:
+            # only the free fields of the lines one or two moves from completion score anything - on a wide board
+            # that's a handful of lines, so going through their fields beats looking up the lines of every move
+            field_scores = {}
+            for line_id, line_value in enumerate(line_values):
+                if line_value:
+                    for field_ind in _free_cells(game, line_id):
+                        field_scores[field_ind] = field_scores.get(field_ind, 0) + line_value
+            fields = game.geometry.fields
+            move_scores = {tuple(fields[field_ind]): score for field_ind, score in field_scores.items()}
+            return [move_scores.get((row, col), 0) for row, col in moves]
+
+        scores = []
+        for row, col in moves:
+            # every field lies on a row, a column and two diagonals
+            horizontal, vertical, ltr_diagonal, rtl_diagonal = field_lines[(row - 1, col - 1)]
+            scores.append(line_values[horizontal] + line_values[vertical] + line_values[ltr_diagonal]
+                          + line_values[rtl_diagonal])
+        return scores
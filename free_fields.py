@@ -0,0 +1,128 @@
+from array import array
+
+from geometry import BoardGeometry
+
+
+class FreeFields:
+    """
+    The fields that haven't been filled up yet (Triangle.allowed_fields). Fields are identified by their index in
+    geometry.fields, and two structures are kept over those indices:
+
+    * a dense array of the free fields with the position of every field in it - membership checks, removal (the last
+      field is swapped into the gap) and picking a random free field (random.choice works on it) are O(1);
+    * a doubly linked list in row-by-row order - iterating goes through the free fields only, always in the same order
+      no matter in which order they were removed, which keeps the search deterministic.
+
+    remove() returns the position the field had in the dense array; restore() with it puts the field back exactly
+    where it was, as long as fields are restored in the opposite order to their removal (like push_move/pop_move do).
+    """
+    __slots__ = ('geometry', 'dense', 'positions', 'next_field', 'previous_field')
+
+    geometry: BoardGeometry
+    # indices of the free fields in no particular order
+    dense: array
+    # field index -> position in dense, -1 for filled fields
+    positions: array
+    # linked list of the free fields; index len(geometry.fields) is the head (and the tail) of the list
+    next_field: array
+    previous_field: array
+
+    def __init__(self, geometry: BoardGeometry) -> None:
+        field_count = len(geometry.fields)
+        self.geometry = geometry
+        self.dense = array('i', range(field_count))
+        self.positions = array('i', range(field_count))
+        # circular list: head -> 0 -> 1 -> ... -> field_count - 1 -> head
+        self.next_field = array('i', range(1, field_count + 2))
+        self.next_field[field_count] = 0 if field_count else field_count
+        self.previous_field = array('i', range(-1, field_count))
+        self.previous_field[0] = field_count
+
+    def __len__(self) -> int:
+        return len(self.dense)
+
+    def __iter__(self):
+        # the field being visited keeps its links while it's removed and restored, so the board can change during
+        # the iteration as long as every change is taken back before moving on (like in the search)
+        fields = self.geometry.fields
+        next_field = self.next_field
+        head = len(fields)
+        field_ind = next_field[head]
+        while field_ind != head:
+            yield fields[field_ind]
+            field_ind = next_field[field_ind]
+
+    def __getitem__(self, position: int) -> list[int]:
+        """
+        Field at the given position of the dense array - positions carry no meaning, this is what makes random.choice
+        work in O(1).
+        """
+        return self.geometry.fields[self.dense[position]]
+
+    def __contains__(self, coordinates) -> bool:
+        try:
+            field_ind = self.geometry.field_index.get(tuple(coordinates))
+        except TypeError:
+            return False
+        return field_ind is not None and self.positions[field_ind] >= 0
+
+    def __eq__(self, other) -> bool:
+        # compares the fields in the row-by-row order, also with plain lists
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return "FreeFields(" + str(list(self)) + ")"
+
+    def remove(self, coordinates: list[int]) -> int:
+        """
+        :param coordinates: [row, col] of a free field
+        :return: position the field had in the dense array - pass it to restore()
+        """
+        field_ind = self.geometry.field_index.get(tuple(coordinates))
+        if field_ind is None or self.positions[field_ind] < 0:
+            raise ValueError(str(coordinates) + " is not an allowed field.")
+
+        # swap the last field into the gap
+        position = self.positions[field_ind]
+        last_field_ind = self.dense.pop()
+        if last_field_ind != field_ind:
+            self.dense[position] = last_field_ind
+            self.positions[last_field_ind] = position
+        self.positions[field_ind] = -1
+
+        # unlink - the removed field keeps its own links, so it can be linked back in the same place
+        next_field_ind = self.next_field[field_ind]
+        previous_field_ind = self.previous_field[field_ind]
+        self.next_field[previous_field_ind] = next_field_ind
+        self.previous_field[next_field_ind] = previous_field_ind
+        return position
+
+    def restore(self, coordinates: list[int], position: int) -> None:
+        """
+        Takes back the last remove() that hasn't been taken back yet.
+        :param coordinates: [row, col] of the field
+        :param position: value returned by remove()
+        """
+        field_ind = self.geometry.field_index[tuple(coordinates)]
+
+        # undo the swap - the field that was moved into the gap goes back to the end
+        if position == len(self.dense):
+            self.dense.append(field_ind)
+        else:
+            moved_field_ind = self.dense[position]
+            self.positions[moved_field_ind] = len(self.dense)
+            self.dense.append(moved_field_ind)
+            self.dense[position] = field_ind
+        self.positions[field_ind] = position
+
+        self.next_field[self.previous_field[field_ind]] = field_ind
+        self.previous_field[self.next_field[field_ind]] = field_ind
+
+    def copy(self) -> "FreeFields":
+        free_fields = type(self).__new__(type(self))
+        free_fields.geometry = self.geometry
+        free_fields.dense = array('i', self.dense)
+        free_fields.positions = array('i', self.positions)
+        free_fields.next_field = array('i', self.next_field)
+        free_fields.previous_field = array('i', self.previous_field)
+        return free_fields
@@ -0,0 +1,146 @@
+import random
+
+
+def axis_strings(width: int, height: int) -> tuple[str, str, list[str]]:
+    """
+    :return: spacing between the fields, the bottom (x) axis and the labels of the rows (y axis) of the printed board
+    """
+    x_coord_axis = [str(i + 1) + "." for i in range(width)]
+
+    # adjusting the spacing between fields based on the largest number's number of digits. E.g. spacing = " " if
+    # the highest number has one digit, spacing = "  " if the highest number has two digits (then the spacing
+    # between single digit number is going  to be "  " but the spacing between two-digit numbers will be "  ", etc.
+    field_spacing = "".join([str(" ") for i in range(len(x_coord_axis[-1]))])
+
+    y_coord_axis = []
+    for i in range(height):
+        y_coord_axis.append(str(i + 1) + "." + (len(field_spacing) - len(str(i + 1))) * " ")
+
+    axis_str = ""
+    for coordinate in x_coord_axis:
+        axis_str += coordinate + "".join([" " for i in range(len(field_spacing) + 1 - len(coordinate))])
+    return field_spacing, axis_str, y_coord_axis
+
+
+class BoardGeometry:
+    """
+    Static description of the triangular board of a given width - which fields are playable and which rows, columns and
+    diagonals can be crossed off. None of it changes during a game, therefore a single instance is shared by every board
+    of the same width (see get_geometry()).
+    """
+    width: int
+    height: int
+    # 1-based coordinates of all playable fields, row by row - same order as the initial Triangle.allowed_fields
+    fields: list[list[int]]
+    # (row, col) -> index of the field in fields
+    field_index: dict[tuple[int, int], int]
+    # every line as a list of 0-based (row_ind, col_ind) tuples. Rows are ordered by column, columns by row and
+    # diagonals by column - i.e. the order in which check_if_combo has always reported crossed fields
+    lines: list[list[tuple[int, int]]]
+    # 'horizontal', 'vertical' or 'diagonal' for each line
+    line_directions: list[str]
+    # number of fields in each line (= points for crossing it off)
+    line_lengths: list[int]
+    # initial board - "O" for the playable fields and " " for the ones outside the triangle
+    board_template: tuple[tuple[str, ...], ...]
+    # strings used to print the board
+    field_spacing: str
+    axis_str: str
+    y_coord_axis: list[str]
+    # 0-based (row_ind, col_ind) -> ids of the lines going through that field: horizontal, vertical, diagonal from left
+    # to right and diagonal from right to left
+    field_lines: dict[tuple[int, int], tuple[int, int, int, int]]
+    # 0-based (row_ind, col_ind) -> random 64-bit number; the Zobrist hash of a position is the XOR of the numbers of
+    # its filled fields
+    zobrist_keys: dict[tuple[int, int], int]
+    # the board is symmetric left-to-right: field (row_ind, col_ind) maps to (row_ind, width - 1 - col_ind). Zobrist
+    # key of the mirrored field, so that the hash of the mirrored position can be kept up to date alongside
+    mirror_zobrist_keys: dict[tuple[int, int], int]
+
+    def __init__(self, width: int) -> None:
+        self.width = width
+        self.height = int((width + 1) / 2)
+        self.fields = []
+        self.lines = []
+        self.line_directions = []
+        self.line_lengths = []
+        self.field_lines = {}
+
+        rows = []
+        columns = {}
+        diagonals_ltr = {}
+        diagonals_rtl = {}
+        for row_ind in range(self.height):
+            # same as in Triangle.__init__ - each row has two fields more than the one above it
+            first_col_ind = self.height - 1 - row_ind
+            row = []
+            for col_ind in range(first_col_ind, first_col_ind + row_ind * 2 + 1):
+                self.fields.append([row_ind + 1, col_ind + 1])
+                row.append((row_ind, col_ind))
+                columns.setdefault(col_ind, []).append((row_ind, col_ind))
+                # fields on the same left-to-right diagonal share row - col, on the right-to-left one row + col
+                diagonals_ltr.setdefault(row_ind - col_ind, []).append((row_ind, col_ind))
+                diagonals_rtl.setdefault(row_ind + col_ind, []).append((row_ind, col_ind))
+            rows.append(row)
+
+        board_template = [[" " for col_ind in range(width)] for row_ind in range(self.height)]
+        for row, col in self.fields:
+            board_template[row - 1][col - 1] = "O"
+        self.board_template = tuple(tuple(row) for row in board_template)
+
+        self.field_spacing, self.axis_str, self.y_coord_axis = axis_strings(width, self.height)
+
+        # fields are visited row by row, so right-to-left diagonals come out ordered by descending column
+        for rtl_diagonal in diagonals_rtl.values():
+            rtl_diagonal.reverse()
+
+        line_ids = {}
+        for direction, group in (('horizontal', rows), ('vertical', columns.values()),
+                                 ('diagonal', diagonals_ltr.values()), ('diagonal', diagonals_rtl.values())):
+            for line in group:
+                for field in line:
+                    line_ids.setdefault(field, []).append(len(self.lines))
+                self.lines.append(line)
+                self.line_directions.append(direction)
+                self.line_lengths.append(len(line))
+
+        self.field_index = {(row, col): field_ind for field_ind, (row, col) in enumerate(self.fields)}
+
+        for field, ids in line_ids.items():
+            self.field_lines[field] = tuple(ids)
+
+        # seeded with the width, so hashes are the same in every process and can be stored on disk
+        zobrist_random = random.Random(width)
+        self.zobrist_keys = {(row - 1, col - 1): zobrist_random.getrandbits(64) for row, col in self.fields}
+        self.mirror_zobrist_keys = {(row_ind, col_ind): self.zobrist_keys[(row_ind, width - 1 - col_ind)]
+                                    for row_ind, col_ind in self.zobrist_keys}
+
+    def line_cells(self, line_id: int) -> list[int]:
+        """
+        :return: indices (in fields) of the fields of the line, in the order of lines - like
+        large_board.LargeBoardGeometry.line_cells
+        """
+        return [self.field_index[(row_ind + 1, col_ind + 1)] for row_ind, col_ind in self.lines[line_id]]
+
+    def mirror_move(self, coordinates: list[int]) -> list[int]:
+        """
+        :param coordinates: 1-based [row, col]
+        :return: coordinates of the mirrored field
+        """
+        return [coordinates[0], self.width + 1 - coordinates[1]]
+
+
+# geometries are immutable, so they are built once per width and reused by every board
+_GEOMETRY_CACHE: dict[int, BoardGeometry] = {}
+
+
+def get_geometry(width: int) -> BoardGeometry:
+    """
+    Returns the (shared) geometry of the board with the given width, building it on first use.
+    :param width: width of the board - odd integer number
+    :return: BoardGeometry obj
+    """
+    geometry = _GEOMETRY_CACHE.get(width)
+    if geometry is None:
+        geometry = _GEOMETRY_CACHE[width] = BoardGeometry(width)
+    return geometry
@@ -0,0 +1,204 @@
+import argparse
+import cProfile
+import json
+import pstats
+import sys
+import time
+
+
+def effective_branching_factor(nodes: int, depth: int) -> float | None:
+    """
+    Branching factor b of the uniform tree of the given depth with as many nodes as were visited, i.e. the solution
+    of b + b^2 + ... + b^depth = nodes.
+    :return: None if there is nothing to work it out from
+    """
+    if depth <= 0 or nodes <= 0:
+        return None
+
+    def tree_size(branching: float) -> float:
+        return sum(branching ** level for level in range(1, depth + 1))
+
+    # the size of the tree grows with b, so the solution can be found by bisection
+    low, high = 0.0, max(1.0, float(nodes))
+    for _ in range(100):
+        middle = (low + high) / 2
+        if tree_size(middle) < nodes:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+class SearchStats:
+    """
+    What it took a player to choose a single move. The counters are kept by the searches themselves as plain
+    integer increments, and the object is only put together once the move is chosen, so collecting them costs next
+    to nothing.
+    """
+    __slots__ = ('player', 'player_no', 'method', 'move', 'free_fields', 'seconds', 'nodes', 'leaf_evaluations',
+                 'combo_checks', 'cutoffs', 'table_lookups', 'table_hits', 'depth', 'playouts', 'states', 'memo_bytes')
+
+    player: str
+    player_no: int
+    # where the move came from: "book", "endgame", "corner", "alphabeta", "parallel", "minimax" or "mcts"
+    method: str
+    move: list[int] | None
+    # free fields before the move
+    free_fields: int
+    seconds: float
+    # positions visited
+    nodes: int
+    # positions evaluated at the bottom of the tree or at the end of the game
+    leaf_evaluations: int
+    # moves tried out on the board - each one checks the lines through the field for completed combos, the same way
+    # Triangle.check_if_combo does
+    combo_checks: int
+    cutoffs: int
+    # transposition table lookups and the ones that found the position
+    table_lookups: int
+    table_hits: int
+    # depth of the deepest completed iteration (or of the minimax, or the free fields of a solved endgame)
+    depth: int
+    playouts: int
+    # positions in the endgame solver's memo table and the memory they take
+    states: int
+    memo_bytes: int
+
+    def __init__(self, player: str, player_no: int, method: str, move: list[int] | None = None, free_fields: int = 0,
+                 seconds: float = 0.0, nodes: int = 0, leaf_evaluations: int = 0, combo_checks: int = 0,
+                 cutoffs: int = 0, table_lookups: int = 0, table_hits: int = 0, depth: int = 0,
+                 playouts: int = 0, states: int = 0, memo_bytes: int = 0) -> None:
+        self.player = player
+        self.player_no = player_no
+        self.method = method
+        self.move = move
+        self.free_fields = free_fields
+        self.seconds = seconds
+        self.nodes = nodes
+        self.leaf_evaluations = leaf_evaluations
+        self.combo_checks = combo_checks
+        self.cutoffs = cutoffs
+        self.table_lookups = table_lookups
+        self.table_hits = table_hits
+        self.depth = depth
+        self.playouts = playouts
+        self.states = states
+        self.memo_bytes = memo_bytes
+
+    @property
+    def effective_branching_factor(self) -> float | None:
+        return effective_branching_factor(self.nodes, self.depth)
+
+    @property
+    def table_hit_rate(self) -> float:
+        return self.table_hits / self.table_lookups if self.table_lookups else 0.0
+
+    @property
+    def nodes_per_sec(self) -> float:
+        return self.nodes / self.seconds if self.seconds else 0.0
+
+    def to_dict(self) -> dict[str, str | int | float | list[int] | None]:
+        stats_dict = {name: getattr(self, name) for name in self.__slots__}
+        stats_dict['effective_branching_factor'] = self.effective_branching_factor
+        stats_dict['table_hit_rate'] = self.table_hit_rate
+        stats_dict['nodes_per_sec'] = self.nodes_per_sec
+        return stats_dict
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    def summary(self) -> str:
+        summary = self.player + " " + str(self.move) + " by " + self.method + " in " \
+            + str(round(self.seconds * 1000, 1)) + " ms"
+        if self.nodes:
+            summary += ", " + str(self.nodes) + " nodes, " + str(self.leaf_evaluations) + " leaves, " \
+                + str(self.cutoffs) + " cutoffs"
+            if self.depth:
+                summary += ", depth " + str(self.depth)
+            if self.effective_branching_factor is not None:
+                summary += ", EBF " + str(round(self.effective_branching_factor, 2))
+        if self.table_lookups:
+            summary += ", table hits " + str(round(self.table_hit_rate * 100, 1)) + "%"
+        if self.playouts:
+            summary += ", " + str(self.playouts) + " playouts"
+        if self.states:
+            summary += ", " + str(self.states) + " memo states (" + str(round(self.memo_bytes / 1024 / 1024, 1)) \
+                + " MB)"
+        return summary
+
+
+def write_stats(stream, stats: SearchStats) -> None:
+    """
+    Writes the stats as a single JSON line.
+    :param stream: text stream, e.g. an open file or sys.stdout
+    """
+    stream.write(stats.to_json() + "\n")
+    stream.flush()
+
+
+def make_player(kind: str, player_no: int, time_budget: float, stats_stream):
+    # imported here - the player module imports this one
+    from player import AIComputerPlayer, MCTSComputerPlayer
+
+    if kind == "minimax":
+        return AIComputerPlayer(player_no, search="minimax", stats_stream=stats_stream)
+    if kind == "alphabeta":
+        return AIComputerPlayer(player_no, search="alphabeta", time_budget=time_budget, stats_stream=stats_stream)
+    if kind == "mcts":
+        return MCTSComputerPlayer(player_no, time_budget_ms=time_budget * 1000, stats_stream=stats_stream)
+    raise ValueError("Unknown player: " + str(kind) + ".")
+
+
+def run_game(width: int, player1, player2):
+    """
+    Plays a game, printing the stats of every move.
+    :return: session.GameResult obj
+    """
+    # imported here - the session module imports the player module, which imports this one
+    from session import GameSession
+
+    def print_stats(player, player_no: int, coordinates: list[int]) -> None:
+        print(player.last_stats.summary())
+
+    return GameSession(player1, player2, width, on_move=print_stats).run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play a bot-vs-bot game with search statistics for every move.")
+    # the players that keep stats of their moves
+    players = ("minimax", "alphabeta", "mcts")
+    parser.add_argument("--width", type=int, default=11, help="board width (odd number)")
+    parser.add_argument("--player1", choices=players, default="alphabeta")
+    parser.add_argument("--player2", choices=players, default="minimax")
+    parser.add_argument("--time-budget", type=float, default=0.2, help="seconds per move of the timed players")
+    parser.add_argument("--stats-jsonl", help="file to stream the stats of every move to as JSON lines")
+    parser.add_argument("--profile", action="store_true", help="run the game under cProfile")
+    parser.add_argument("--profile-output", help="file to save the raw profile to (for pstats / snakeviz)")
+    parser.add_argument("--top", type=int, default=20, help="functions listed in the profile summaries")
+    args = parser.parse_args()
+
+    jsonl_file = open(args.stats_jsonl, "a") if args.stats_jsonl else None
+    first = make_player(args.player1, 1, args.time_budget, jsonl_file)
+    second = make_player(args.player2, 2, args.time_budget, jsonl_file)
+
+    profiler = cProfile.Profile() if args.profile else None
+    game_start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    result = run_game(args.width, first, second)
+    if profiler is not None:
+        profiler.disable()
+    print("Result: " + str(result.p1) + " - " + str(result.p2) + " in "
+          + str(round(time.perf_counter() - game_start, 2)) + " s")
+
+    if jsonl_file is not None:
+        jsonl_file.close()
+    if profiler is not None:
+        if args.profile_output:
+            profiler.dump_stats(args.profile_output)
+        profile_stats = pstats.Stats(profiler, stream=sys.stdout).strip_dirs()
+        # where the time is spent itself, then which calls it is spent under
+        print("\nHot functions by own time:")
+        profile_stats.sort_stats("tottime").print_stats(args.top)
+        print("Hot paths by cumulative time:")
+        profile_stats.sort_stats("cumulative").print_stats(args.top)
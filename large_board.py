@@ -0,0 +1,555 @@
+from array import array
+import math
+import random
+
+from free_fields import FreeFields
+from game import Triangle
+from geometry import axis_strings
+
+
+# boards at least that wide are played on LargeTriangle (see new_board) - BoardGeometry of width 501 takes about half a
+# second and 60 MB to build, and both grow with the number of fields
+LARGE_BOARD_WIDTH = 501
+
+# states of the fields in LargeTriangle.cells - the same characters the character board uses
+FREE = ord("O")
+FILLED = ord("0")
+CROSSED = ord("X")
+
+
+class _Fields:
+    """
+    LargeBoardGeometry.fields - [row, col] of the i-th field, worked out from i.
+    """
+    __slots__ = ('geometry',)
+
+    def __init__(self, geometry: "LargeBoardGeometry") -> None:
+        self.geometry = geometry
+
+    def __len__(self) -> int:
+        return self.geometry.field_count
+
+    def __getitem__(self, field_ind: int) -> list[int]:
+        geometry = self.geometry
+        if not 0 <= field_ind < geometry.field_count:
+            raise IndexError("Field index out of range: " + str(field_ind) + ".")
+        # LargeBoardGeometry.field inlined - this is on the path of every move the players look at
+        row_ind = math.isqrt(field_ind)
+        return [row_ind + 1, field_ind - row_ind * row_ind - row_ind + geometry.height]
+
+    def __iter__(self):
+        height = self.geometry.height
+        for row_ind in range(height):
+            for col_ind in range(height - 1 - row_ind, height + row_ind):
+                yield [row_ind + 1, col_ind + 1]
+
+
+class _FieldIndex:
+    """
+    LargeBoardGeometry.field_index - 1-based (row, col) -> index of the field.
+    """
+    __slots__ = ('geometry',)
+
+    def __init__(self, geometry: "LargeBoardGeometry") -> None:
+        self.geometry = geometry
+
+    def get(self, coordinates: tuple[int, int], default=None) -> int | None:
+        row, col = coordinates
+        height = self.geometry.height
+        # is_playable and index inlined, with 1-based coordinates
+        if not 0 < row <= height or not height - row < col < height + row:
+            return default
+        return row * row - row + col - height
+
+    def __getitem__(self, coordinates: tuple[int, int]) -> int:
+        field_ind = self.get(coordinates)
+        if field_ind is None:
+            raise KeyError(coordinates)
+        return field_ind
+
+    def __contains__(self, coordinates) -> bool:
+        return self.get(coordinates) is not None
+
+
+class _FieldLines:
+    """
+    LargeBoardGeometry.field_lines - 0-based (row_ind, col_ind) -> ids of the lines going through the field.
+    """
+    __slots__ = ('geometry',)
+
+    def __init__(self, geometry: "LargeBoardGeometry") -> None:
+        self.geometry = geometry
+
+    def __getitem__(self, field: tuple[int, int]) -> tuple[int, int, int, int]:
+        row_ind, col_ind = field
+        geometry = self.geometry
+        height = geometry.height
+        # is_playable and line_ids inlined
+        if not 0 <= row_ind < height or not height - 1 - row_ind <= col_ind < height + row_ind:
+            raise KeyError(field)
+        return (row_ind, height + col_ind, 2 * height + geometry.width - 1 + row_ind - col_ind,
+                2 * geometry.width + 1 + row_ind + col_ind)
+
+
+class _Lines:
+    """
+    LargeBoardGeometry.lines - 0-based (row_ind, col_ind) of the fields of a line, built when asked for, so a line
+    costs only its own length.
+    """
+    __slots__ = ('geometry',)
+
+    def __init__(self, geometry: "LargeBoardGeometry") -> None:
+        self.geometry = geometry
+
+    def __len__(self) -> int:
+        return len(self.geometry.line_lengths)
+
+    def __getitem__(self, line_id: int) -> list[tuple[int, int]]:
+        return self.geometry.line_fields(line_id)
+
+    def __iter__(self):
+        for line_id in range(len(self)):
+            yield self.geometry.line_fields(line_id)
+
+
+class _LineDirections:
+    __slots__ = ('geometry',)
+
+    def __init__(self, geometry: "LargeBoardGeometry") -> None:
+        self.geometry = geometry
+
+    def __len__(self) -> int:
+        return len(self.geometry.line_lengths)
+
+    def __getitem__(self, line_id: int) -> str:
+        if line_id < self.geometry.height:
+            return 'horizontal'
+        elif line_id < self.geometry.height + self.geometry.width:
+            return 'vertical'
+        return 'diagonal'
+
+
+class _ZobristKeys:
+    """
+    LargeBoardGeometry.zobrist_keys and mirror_zobrist_keys - 0-based (row_ind, col_ind) -> key of the field (or of
+    its mirror image).
+    """
+    __slots__ = ('geometry', 'mirrored')
+
+    def __init__(self, geometry: "LargeBoardGeometry", mirrored: bool) -> None:
+        self.geometry = geometry
+        self.mirrored = mirrored
+
+    def __getitem__(self, field: tuple[int, int]) -> int:
+        row_ind, col_ind = field
+        if not self.geometry.is_playable(row_ind, col_ind):
+            raise KeyError(field)
+        if self.mirrored:
+            col_ind = self.geometry.width - 1 - col_ind
+        return self.geometry.keys[self.geometry.index(row_ind, col_ind)]
+
+
+class LargeBoardGeometry:
+    """
+    Counterpart of BoardGeometry for very wide boards. Nothing is stored per field except for the Zobrist keys (one
+    64-bit number each, the same ones BoardGeometry uses for that width): the fields are numbered row by row, so the
+    index of a field, the lines going through it and the fields of a line all follow from arithmetic on the
+    coordinates. The attributes BoardGeometry has (fields, field_index, lines, field_lines, ...) are provided as
+    read-only views computing their items on access, so code written against BoardGeometry works with it as well.
+
+    Line ids: rows 0 .. height - 1, then columns by column, then the left-to-right diagonals by row_ind - col_ind,
+    then the right-to-left ones by row_ind + col_ind. Fields of a line are in the same order as in BoardGeometry.
+    """
+    width: int
+    height: int
+    field_count: int
+    # number of fields in each line
+    line_lengths: array
+    # Zobrist key of every field, by field index
+    keys: array
+    # column step of a line (-1, 0 or 1) -> row_ind ** 2 + row_ind * (1 + step) for every row - the index of the field
+    # of the line in that row, less an offset that is the same for the whole line (see line_cells)
+    row_bases: dict[int, list[int]]
+    field_spacing: str
+    axis_str: str
+    y_coord_axis: list[str]
+
+    def __init__(self, width: int) -> None:
+        self.width = width
+        self.height = (width + 1) // 2
+        height = self.height
+        self.field_count = height * height
+
+        self.line_lengths = array('i', [row_ind * 2 + 1 for row_ind in range(height)])
+        self.line_lengths.extend(height - abs(col_ind - (height - 1)) for col_ind in range(width))
+        # left-to-right diagonals start in the row (height + row_ind - col_ind) // 2
+        self.line_lengths.extend(height - (height + difference) // 2 for difference in range(1 - height, height))
+        # right-to-left diagonals start in the row (row_ind + col_ind - height + 2) // 2
+        self.line_lengths.extend(height - (total - height + 2) // 2 for total in range(height - 1, 3 * height - 2))
+
+        # drawn in the same order as in BoardGeometry, so the hashes are the same on both
+        zobrist_random = random.Random(width)
+        self.keys = array('Q', (zobrist_random.getrandbits(64) for _ in range(self.field_count)))
+        self.row_bases = {col_step: [row_ind * row_ind + row_ind * (1 + col_step) for row_ind in range(height)]
+                          for col_step in (-1, 0, 1)}
+
+        self.field_spacing, self.axis_str, self.y_coord_axis = axis_strings(width, height)
+
+        self.fields = _Fields(self)
+        self.field_index = _FieldIndex(self)
+        self.field_lines = _FieldLines(self)
+        self.lines = _Lines(self)
+        self.line_directions = _LineDirections(self)
+        self.zobrist_keys = _ZobristKeys(self, False)
+        self.mirror_zobrist_keys = _ZobristKeys(self, True)
+
+    def is_playable(self, row_ind: int, col_ind: int) -> bool:
+        return 0 <= row_ind < self.height and self.height - 1 - row_ind <= col_ind < self.height + row_ind
+
+    def index(self, row_ind: int, col_ind: int) -> int:
+        """
+        Index of the (playable) field - the rows above hold row_ind ** 2 fields.
+        """
+        return row_ind * row_ind + row_ind + col_ind - self.height + 1
+
+    def field(self, field_ind: int) -> tuple[int, int]:
+        """
+        :return: 0-based (row_ind, col_ind) of the field with the given index
+        """
+        row_ind = math.isqrt(field_ind)
+        return row_ind, field_ind - row_ind * row_ind - row_ind + self.height - 1
+
+    def line_ids(self, row_ind: int, col_ind: int) -> tuple[int, int, int, int]:
+        """
+        :return: ids of the horizontal, vertical, left-to-right and right-to-left lines going through the field
+        """
+        height = self.height
+        return (row_ind,
+                height + col_ind,
+                2 * height + self.width - 1 + row_ind - col_ind,
+                2 * self.width + 1 + row_ind + col_ind)
+
+    def __line_start(self, line_id: int) -> tuple[int, int, int]:
+        """
+        :return: first row of the line, its column in that row and the change of the column from row to row
+        """
+        height = self.height
+        width = self.width
+        if line_id < height:
+            raise ValueError("Rows don't have a column step.")
+        elif line_id < height + width:
+            col_ind = line_id - height
+            return abs(col_ind - (height - 1)), col_ind, 0
+        elif line_id < height + 2 * width:
+            difference = line_id - (2 * height + width - 1)
+            row_ind = (height + difference) // 2
+            return row_ind, row_ind - difference, 1
+        elif line_id < height + 3 * width:
+            total = line_id - (2 * width + 1)
+            row_ind = (total - height + 2) // 2
+            return row_ind, total - row_ind, -1
+        raise IndexError("Line id out of range: " + str(line_id) + ".")
+
+    def line_fields(self, line_id: int) -> list[tuple[int, int]]:
+        """
+        :return: 0-based (row_ind, col_ind) of the fields of the line
+        """
+        if 0 <= line_id < self.height:
+            return [(line_id, col_ind) for col_ind in range(self.height - 1 - line_id, self.height + line_id)]
+        first_row_ind, first_col_ind, col_step = self.__line_start(line_id)
+        # diagonals are ordered by column, so the right-to-left ones go from the bottom row up
+        row_inds = range(first_row_ind, self.height) if col_step >= 0 else range(self.height - 1, first_row_ind - 1, -1)
+        return [(row_ind, first_col_ind + (row_ind - first_row_ind) * col_step) for row_ind in row_inds]
+
+    def line_cells(self, line_id: int) -> range | list[int]:
+        """
+        :return: indices of the fields of the line, in the order of line_fields - a row is a single run of indices
+        """
+        height = self.height
+        if 0 <= line_id < height:
+            return range(line_id * line_id, line_id * line_id + 2 * line_id + 1)
+        first_row_ind, first_col_ind, col_step = self.__line_start(line_id)
+        # index(row_ind, col_ind) with the column following the row - added up in C, as building the lines of the
+        # widest boards in a Python loop costs a good part of a move's time budget
+        offset = first_col_ind - first_row_ind * col_step - height + 1
+        row_bases = self.row_bases[col_step]
+        if col_step >= 0:
+            return list(map(offset.__add__, row_bases[first_row_ind:]))
+        return list(map(offset.__add__, row_bases[:first_row_ind - 1 if first_row_ind else None:-1]))
+
+    def mirror_move(self, coordinates: list[int]) -> list[int]:
+        return [coordinates[0], self.width + 1 - coordinates[1]]
+
+
+_LARGE_GEOMETRY_CACHE: dict[int, LargeBoardGeometry] = {}
+
+
+def get_large_geometry(width: int) -> LargeBoardGeometry:
+    geometry = _LARGE_GEOMETRY_CACHE.get(width)
+    if geometry is None:
+        geometry = _LARGE_GEOMETRY_CACHE[width] = LargeBoardGeometry(width)
+    return geometry
+
+
+class LargeFreeFields(FreeFields):
+    """
+    FreeFields of a LargeTriangle. The iteration works the coordinates of the fields out from their indices itself
+    instead of going through LargeBoardGeometry.fields, which halves the cost of a pass over the free fields - on the
+    widest boards there are hundreds of thousands of them, and every search starts with such a pass.
+    """
+    __slots__ = ()
+
+    def __iter__(self):
+        # same walk over the linked list as in FreeFields.__iter__
+        height = self.geometry.height
+        next_field = self.next_field
+        head = self.geometry.field_count
+        isqrt = math.isqrt
+        field_ind = next_field[head]
+        while field_ind != head:
+            row_ind = isqrt(field_ind)
+            yield [row_ind + 1, field_ind - row_ind * row_ind - row_ind + height]
+            field_ind = next_field[field_ind]
+
+
+class CellRows:
+    """
+    LargeTriangle.board - the rows of the character board, built from the cells when a row is asked for. Read-only:
+    the state of the game is in the cells.
+    """
+    __slots__ = ('game',)
+
+    def __init__(self, game: "LargeTriangle") -> None:
+        self.game = game
+
+    def __len__(self) -> int:
+        return self.game.geometry.height
+
+    def __getitem__(self, row_ind: int) -> list[str]:
+        height = self.game.geometry.height
+        if not 0 <= row_ind < height:
+            raise IndexError("Row index out of range: " + str(row_ind) + ".")
+        padding = [" "] * (height - 1 - row_ind)
+        first = row_ind * row_ind
+        return padding + list(self.game.cells[first:first + 2 * row_ind + 1].decode("ascii")) + padding
+
+    def __iter__(self):
+        for row_ind in range(len(self)):
+            yield self[row_ind]
+
+
+class LargeTriangle(Triangle):
+    """
+    Triangle for very wide boards (1001 fields and more). Only the playable fields are stored - one byte each in a
+    bytearray, row by row - instead of the full width x height character board, which is more than half padding, and
+    the geometry is a LargeBoardGeometry, which works everything out from the coordinates. Setting up a board is
+    therefore a handful of O(fields) array fills, and a move touches the four lines through the field and, when one
+    of them gets completed, its fields only.
+
+    Memory per field: 1 byte of cells + 16 bytes of FreeFields per game, and 8 bytes of Zobrist key shared by all
+    games of the width. At width 1001 (251001 fields) that's about 4.3 MB per game and 2 MB for the geometry.
+
+    The interface is the one of Triangle - the game loop, the renderer and the players use it unchanged; board is a
+    read-only view of the rows (see CellRows).
+    """
+    __slots__ = ('cells',)
+
+    # O (free), 0 (filled) or X (crossed) of every field, by field index
+    cells: bytearray
+
+    def __init__(self, width: int) -> None:
+        if type(width) is not int:
+            raise TypeError("The width variable must be an integer number.")
+        elif not width % 2:
+            raise ValueError("The number (width) must be odd. Got even instead.")
+
+        self.geometry = get_large_geometry(width)
+        self.cells = bytearray(b"O") * self.geometry.field_count
+        self.board = CellRows(self)
+        self.allowed_fields = LargeFreeFields(self.geometry)
+        self.line_remaining = array('i', self.geometry.line_lengths)
+        self.move_stack = []
+        self.position_hash = 0
+        self.mirror_hash = 0
+        self.p1 = 0
+        self.p2 = 0
+
+    def clone(self) -> "LargeTriangle":
+        game = type(self).__new__(type(self))
+        game.geometry = self.geometry
+        game.cells = bytearray(self.cells)
+        game.board = CellRows(game)
+        game.allowed_fields = self.allowed_fields.copy()
+        game.line_remaining = array('i', self.line_remaining)
+        game.move_stack = self.move_stack[:]
+        game.position_hash = self.position_hash
+        game.mirror_hash = self.mirror_hash
+        game.p1 = self.p1
+        game.p2 = self.p2
+        return game
+
+    def __fill(self, row_ind: int, col_ind: int) -> int:
+        """
+        Fills up the field, updating the line counters and the hashes.
+        :return: index of the field
+        """
+        geometry = self.geometry
+        field_ind = geometry.index(row_ind, col_ind)
+        self.cells[field_ind] = FILLED
+        for line_id in geometry.line_ids(row_ind, col_ind):
+            self.line_remaining[line_id] -= 1
+        self.position_hash ^= geometry.keys[field_ind]
+        self.mirror_hash ^= geometry.keys[geometry.index(row_ind, geometry.width - 1 - col_ind)]
+        return field_ind
+
+    def make_move(self, coordinates: list) -> bool:
+        if coordinates in self.allowed_fields:
+            self.allowed_fields.remove(coordinates)
+            self.__fill(coordinates[0] - 1, coordinates[1] - 1)
+            return True
+        else:
+            print("The field coordinates do not match any allowed field.")
+            return False
+
+    def check_if_combo(self, coordinates: list, player_number: int) -> [int, dict]:
+        row_ind = coordinates[0] - 1
+        col_ind = coordinates[1] - 1
+        geometry = self.geometry
+        points = 0
+        coordinate_matrix = {
+            'horizontal': [],
+            'vertical': [],
+            'diagonal': []
+        }
+
+        for line_id in geometry.line_ids(row_ind, col_ind):
+            if not self.line_remaining[line_id]:
+                points += geometry.line_lengths[line_id]
+                for field_ind in geometry.line_cells(line_id):
+                    self.cells[field_ind] = CROSSED
+                crossed_fields = coordinate_matrix[geometry.line_directions[line_id]]
+                for line_row_ind, line_col_ind in geometry.line_fields(line_id):
+                    crossed_fields.append([line_row_ind + 1, line_col_ind + 1])
+
+        if player_number == 1:
+            self.p1 += points
+            total_points = self.p1
+        else:
+            self.p2 += points
+            total_points = self.p2
+        return total_points, coordinate_matrix
+
+    def move_points(self, coordinates: list) -> int:
+        points = 0
+        for line_id in self.geometry.line_ids(coordinates[0] - 1, coordinates[1] - 1):
+            if self.line_remaining[line_id] == 1:
+                points += self.geometry.line_lengths[line_id]
+        return points
+
+    def push_move(self, coordinates: list, player_number: int) -> int:
+        # raises ValueError if the field is not allowed
+        free_field_position = self.allowed_fields.remove(coordinates)
+        row_ind = coordinates[0] - 1
+        col_ind = coordinates[1] - 1
+        self.__fill(row_ind, col_ind)
+
+        points = 0
+        # indices of the fields swapped from "0" to "X" by this move
+        crossed_fields = []
+        cells = self.cells
+        for line_id in self.geometry.line_ids(row_ind, col_ind):
+            if not self.line_remaining[line_id]:
+                points += self.geometry.line_lengths[line_id]
+                for field_ind in self.geometry.line_cells(line_id):
+                    if cells[field_ind] != CROSSED:
+                        cells[field_ind] = CROSSED
+                        crossed_fields.append(field_ind)
+
+        if player_number == 1:
+            self.p1 += points
+        else:
+            self.p2 += points
+
+        self.move_stack.append((coordinates, free_field_position, player_number, points, crossed_fields))
+        return points
+
+    def pop_move(self) -> list[int]:
+        coordinates, free_field_position, player_number, points, crossed_fields = self.move_stack.pop()
+        row_ind = coordinates[0] - 1
+        col_ind = coordinates[1] - 1
+        geometry = self.geometry
+
+        if player_number == 1:
+            self.p1 -= points
+        else:
+            self.p2 -= points
+
+        cells = self.cells
+        for field_ind in crossed_fields:
+            cells[field_ind] = FILLED
+        for line_id in geometry.line_ids(row_ind, col_ind):
+            self.line_remaining[line_id] += 1
+
+        field_ind = geometry.index(row_ind, col_ind)
+        cells[field_ind] = FREE
+        self.position_hash ^= geometry.keys[field_ind]
+        self.mirror_hash ^= geometry.keys[geometry.index(row_ind, geometry.width - 1 - col_ind)]
+        self.allowed_fields.restore(coordinates, free_field_position)
+        return coordinates
+
+    def __filled_bits(self, mirrored: bool) -> int:
+        """
+        Bitmask of the filled fields (bit i - the i-th field), built in one go from a string of binary digits instead
+        of setting the bits one by one.
+        """
+        digits = self.cells.translate(_FILLED_DIGITS)
+        if mirrored:
+            # the mirror image of a row is the row reversed
+            rows = []
+            for row_ind in range(self.geometry.height):
+                first = row_ind * row_ind
+                rows.append(digits[first:first + 2 * row_ind + 1][::-1])
+            digits = b"".join(rows)
+        # the last field is the most significant bit
+        return int(digits[::-1], 2) if digits else 0
+
+    def canonical_key(self) -> tuple[int, bool]:
+        key = self.__filled_bits(False)
+        mirror_key = self.__filled_bits(True)
+        if mirror_key < key:
+            return mirror_key, True
+        return key, False
+
+    def snapshot(self) -> tuple[int, int, int, int]:
+        return self.width, self.__filled_bits(False), self.p1, self.p2
+
+    @classmethod
+    def from_snapshot(cls, snapshot: tuple[int, int, int, int]) -> "LargeTriangle":
+        width, filled_mask, p1, p2 = snapshot
+        game = cls(width)
+        # binary digits from the least significant bit - testing the bits of a huge int one by one would be quadratic
+        for field_ind, digit in enumerate(bin(filled_mask)[:1:-1]):
+            if digit == "1":
+                game.make_move(game.geometry.fields[field_ind])
+
+        for line_id, line_remaining in enumerate(game.line_remaining):
+            if not line_remaining:
+                for field_ind in game.geometry.line_cells(line_id):
+                    game.cells[field_ind] = CROSSED
+
+        game.p1 = p1
+        game.p2 = p2
+        return game
+
+
+# cells -> "1" for the filled (and crossed) fields, "0" for the free ones
+_FILLED_DIGITS = bytes.maketrans(b"O0X", b"011")
+
+
+def new_board(width: int) -> Triangle:
+    """
+    Board for the given width - a LargeTriangle from LARGE_BOARD_WIDTH fields up, a Triangle below that.
+    """
+    if type(width) is int and width >= LARGE_BOARD_WIDTH:
+        return LargeTriangle(width)
+    return Triangle(width)
@@ -0,0 +1,529 @@
+import argparse
+from array import array
+import os
+import random
+import time
+
+# numpy is only needed for the learned evaluation, the game itself doesn't depend on it
+import numpy as np
+
+from player import RandomComputerPlayer
+from session import GameSession
+from tournament import make_player
+
+# lines are bucketed by the number of their unfilled fields - a line further from completion than that only counts
+# through the number of free fields
+MAX_REMAINING = 4
+# features of a position - the points and the number of the lines k fields away from completion (k = 1 ..
+# MAX_REMAINING), the number of free fields and its parity (who makes the last move), and a constant
+POSITION_FEATURES = tuple(["points_" + str(remaining) + "_away" for remaining in range(1, MAX_REMAINING + 1)]
+                          + ["lines_" + str(remaining) + "_away" for remaining in range(1, MAX_REMAINING + 1)]
+                          + ["free_fields", "free_fields_odd", "bias"])
+FREE_FIELDS_FEATURE = POSITION_FEATURES.index("free_fields")
+ODD_FEATURE = POSITION_FEATURES.index("free_fields_odd")
+BIAS_FEATURE = POSITION_FEATURES.index("bias")
+# whether a line ends up with the player to move mostly depends on the parity of the moves left, so the models also
+# get the line counters and the number of free fields once more, only where that number is odd
+PARITY_FEATURES = tuple(name + "_if_odd" for name in POSITION_FEATURES[:FREE_FIELDS_FEATURE + 1])
+# the logistic model also looks at the points lead of the player to move - the linear one predicts the points still
+# to gain, which don't depend on it
+LEAD_FEATURE = "points_lead"
+
+# players of the self-play games - the depth 1 minimax is quick, and its games are far closer to the positions the
+# search runs into than random ones (the endgame solver would only slow the games down)
+SELF_PLAY_PLAYER = "minimax:depth=1,endgame_threshold=None"
+
+# geometry -> geometry.fields index x 4 array of the ids of the lines going through the field, and the lengths of
+# the lines
+_LINE_ARRAYS_CACHE = {}
+
+
+def _line_arrays(geometry) -> tuple[np.ndarray, np.ndarray]:
+    if geometry not in _LINE_ARRAYS_CACHE:
+        _LINE_ARRAYS_CACHE[geometry] = (np.array([geometry.field_lines[(row - 1, col - 1)]
+                                                  for row, col in geometry.fields], dtype=np.intp),
+                                        np.array(geometry.line_lengths, dtype=np.int64))
+    return _LINE_ARRAYS_CACHE[geometry]
+
+
+def _as_numpy(values) -> np.ndarray:
+    # the line counters of LargeTriangle are arrays, which numpy can read without copying
+    if isinstance(values, array):
+        return np.frombuffer(values, dtype=np.dtype(values.typecode))
+    return np.array(values)
+
+
+class EvaluationModel:
+    """
+    Evaluation model fitted offline on self-play positions (see fit_linear / fit_logistic).
+
+    * "linear" - predicts the points the player to move will still net by the end of the game (its points minus the
+      other player's from now on), from the position features;
+    * "logistic" - predicts the probability that the player to move wins the game, from the position features and its
+      points lead.
+    """
+    kind: str = "linear"
+    feature_names: tuple[str, ...] = ()
+    weights: np.ndarray
+
+    def __init__(self, kind: str, weights: np.ndarray, feature_names: tuple[str, ...] = None) -> None:
+        if kind not in ("linear", "logistic"):
+            raise ValueError("The model must be either \"linear\" or \"logistic\". Got " + str(kind) + " instead.")
+        expected_names = model_features(kind)
+        if feature_names is not None and tuple(feature_names) != expected_names:
+            raise ValueError("The model was fitted on different features: " + ", ".join(feature_names) + ".")
+        if len(weights) != len(expected_names):
+            raise ValueError("A " + kind + " model has " + str(len(expected_names)) + " weights. Got "
+                             + str(len(weights)) + " instead.")
+        self.kind = kind
+        self.feature_names = expected_names
+        self.weights = np.asarray(weights, dtype=np.float64)
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """
+        :param features: positions x model_features(kind) - see expand_features and logistic_features
+        :return: predicted points still to net (linear) or win probabilities (logistic) of the players to move
+        """
+        values = features @ self.weights
+        if self.kind == "logistic":
+            return 1 / (1 + np.exp(-values))
+        return values
+
+    def save(self, path: str) -> None:
+        # np.savez adds the extension if it's missing - use the path as given
+        with open(path, "wb") as model_file:
+            np.savez(model_file, kind=self.kind, weights=self.weights, feature_names=np.array(self.feature_names))
+
+    @staticmethod
+    def load(path: str) -> "EvaluationModel":
+        with np.load(path) as data:
+            return EvaluationModel(str(data['kind']), data['weights'],
+                                   tuple(str(name) for name in data['feature_names']))
+
+
+def model_features(kind: str) -> tuple[str, ...]:
+    linear_features = POSITION_FEATURES + PARITY_FEATURES
+    return linear_features + (LEAD_FEATURE,) if kind == "logistic" else linear_features
+
+
+def expand_features(features: np.ndarray) -> np.ndarray:
+    """
+    :param features: positions x POSITION_FEATURES
+    :return: positions x the features of the linear model (POSITION_FEATURES + PARITY_FEATURES)
+    """
+    features = np.asarray(features, dtype=np.float64)
+    return np.hstack([features, features[:, :len(PARITY_FEATURES)] * features[:, ODD_FEATURE, np.newaxis]])
+
+
+class PositionFeatures:
+    """
+    Features of a position (see POSITION_FEATURES). They are counters over the lines, and a move only changes the four
+    lines through its field, so they are kept up to date with every move (moved / unmoved after push_move / pop_move)
+    instead of being computed over the whole board.
+    """
+    features: list[float]
+
+    def __init__(self) -> None:
+        self.features = [0.0] * len(POSITION_FEATURES)
+
+    def reset(self, game) -> None:
+        """
+        Computes the features of the position from scratch - has to be called before the first moved / unmoved.
+        :param game: Triangle class obj
+        """
+        self.features = position_features(game)
+
+    def moved(self, game, coordinates: list[int]) -> None:
+        """
+        Updates the features after game.push_move(coordinates, ...).
+        """
+        features = self.features
+        line_remaining = game.line_remaining
+        line_lengths = game.geometry.line_lengths
+        for line_id in game.geometry.field_lines[(coordinates[0] - 1, coordinates[1] - 1)]:
+            # the line went from remaining + 1 to remaining unfilled fields
+            remaining = line_remaining[line_id]
+            if remaining < MAX_REMAINING:
+                features[remaining] -= line_lengths[line_id]
+                features[MAX_REMAINING + remaining] -= 1
+            if 0 < remaining <= MAX_REMAINING:
+                features[remaining - 1] += line_lengths[line_id]
+                features[MAX_REMAINING + remaining - 1] += 1
+        features[FREE_FIELDS_FEATURE] -= 1
+        features[ODD_FEATURE] = 1 - features[ODD_FEATURE]
+
+    def unmoved(self, game, coordinates: list[int]) -> None:
+        """
+        Updates the features after game.pop_move() took back the move at coordinates.
+        """
+        features = self.features
+        line_remaining = game.line_remaining
+        line_lengths = game.geometry.line_lengths
+        for line_id in game.geometry.field_lines[(coordinates[0] - 1, coordinates[1] - 1)]:
+            # the line went from remaining - 1 to remaining unfilled fields
+            remaining = line_remaining[line_id]
+            if 1 < remaining <= MAX_REMAINING + 1:
+                features[remaining - 2] -= line_lengths[line_id]
+                features[MAX_REMAINING + remaining - 2] -= 1
+            if remaining <= MAX_REMAINING:
+                features[remaining - 1] += line_lengths[line_id]
+                features[MAX_REMAINING + remaining - 1] += 1
+        features[FREE_FIELDS_FEATURE] += 1
+        features[ODD_FEATURE] = 1 - features[ODD_FEATURE]
+
+
+class LearnedEvaluator(PositionFeatures):
+    """
+    Static evaluation of the leaves of the search with a linear EvaluationModel - a drop-in replacement of
+    ThreatEvaluator (reset, moved / unmoved, evaluate, score_moves), so AlphaBetaSearch, ParallelRootSearch and the
+    minimax of AIComputerPlayer can search with either. With the features kept up to date move by move, a leaf costs
+    a dot product of a couple dozen numbers.
+
+    child_values evaluates all the moves of a position at once: the features after every move are the position's
+    features plus the changes of the move's four lines, gathered for all the moves into one matrix - a single matrix
+    product with the weights scores them all, so the last ply of a search doesn't have to play the moves on the board
+    at all. Evaluations are rounded to whole numbers, like the point differences the search adds them to.
+    """
+    model: EvaluationModel
+
+    def __init__(self, model: EvaluationModel) -> None:
+        if model.kind != "linear":
+            raise ValueError("Only linear models predict points the search can add up. Got a " + model.kind
+                             + " model instead.")
+        self.model = model
+        self.weights = model.weights[:len(POSITION_FEATURES)].tolist()
+        self.parity_weights = model.weights[len(POSITION_FEATURES):].tolist()
+        super().__init__()
+
+    def evaluate(self, game) -> int:
+        """
+        :param game: Triangle class obj in the position the features are kept for
+        :return: points the player to move is expected to net by the end of the game
+        """
+        features = self.features
+        if not features[FREE_FIELDS_FEATURE]:
+            return 0
+        value = sum(weight * feature for weight, feature in zip(self.weights, features))
+        if features[ODD_FEATURE]:
+            value += sum(weight * feature for weight, feature in zip(self.parity_weights, features))
+        return round(value)
+
+    def child_values(self, game, moves) -> np.ndarray:
+        """
+        Evaluates all the moves in one go: the points a move scores minus what the other player is expected to net
+        after it - the same as playing the move and evaluating the position with evaluate(), but without touching
+        the board.
+        :param game: Triangle class obj in the position the features are kept for
+        :param moves: [row, col] of free fields
+        :return: evaluation of every move from the perspective of the player making it, in the order of moves
+        """
+        field_index = game.geometry.field_index
+        field_line_ids, line_lengths = _line_arrays(game.geometry)
+        line_ids = field_line_ids[[field_index[(row, col)] for row, col in moves]]
+        remaining = _as_numpy(game.line_remaining)[line_ids]
+        lengths = line_lengths[line_ids]
+
+        # features after every move: moves x features
+        features = np.tile(np.asarray(self.features, dtype=np.float64), (len(moves), 1))
+        move_inds = np.broadcast_to(np.arange(len(moves))[:, np.newaxis], line_ids.shape)
+        # every line through the field leaves its bucket and joins the one a field closer to completion
+        leaving = remaining <= MAX_REMAINING
+        np.subtract.at(features, (move_inds[leaving], remaining[leaving] - 1), lengths[leaving])
+        np.subtract.at(features, (move_inds[leaving], MAX_REMAINING + remaining[leaving] - 1), 1)
+        joining = (remaining > 1) & (remaining <= MAX_REMAINING + 1)
+        np.add.at(features, (move_inds[joining], remaining[joining] - 2), lengths[joining])
+        np.add.at(features, (move_inds[joining], MAX_REMAINING + remaining[joining] - 2), 1)
+        features[:, FREE_FIELDS_FEATURE] -= 1
+        features[:, ODD_FEATURE] = 1 - features[:, ODD_FEATURE]
+
+        other_player_values = np.rint(expand_features(features) @ self.model.weights)
+        # nothing left to net once the board is full
+        other_player_values[features[:, FREE_FIELDS_FEATURE] == 0] = 0
+        points = (lengths * (remaining == 1)).sum(axis=1)
+        return (points - other_player_values).astype(np.int64)
+
+    def score_moves(self, game, moves) -> list[int]:
+        """
+        Move ordering for the search - child_values of the moves.
+        """
+        return self.child_values(game, moves).tolist()
+
+
+def position_features(game) -> list[float]:
+    """
+    :param game: Triangle class obj
+    :return: features of the position, see POSITION_FEATURES
+    """
+    features = [0.0] * len(POSITION_FEATURES)
+    for remaining, line_length in zip(game.line_remaining, game.geometry.line_lengths):
+        if 0 < remaining <= MAX_REMAINING:
+            features[remaining - 1] += line_length
+            features[MAX_REMAINING + remaining - 1] += 1
+    free_fields = len(game.allowed_fields)
+    features[FREE_FIELDS_FEATURE] = free_fields
+    features[ODD_FEATURE] = free_fields % 2
+    features[BIAS_FEATURE] = 1
+    return features
+
+
+class PositionWriter:
+    """
+    Streams self-play positions to a directory in chunks - numbered .npz files of chunk_size positions each with the
+    arrays:
+
+    * features - positions x POSITION_FEATURES (float32);
+    * points_lead - points of the player to move minus the other player's;
+    * future_points - what the player to move netted from the position to the end of the game;
+    * result - 1 if the player to move won the game, 0.5 for a draw, 0 if it lost;
+    * width - width of the board.
+
+    Only the current chunk is kept in memory. Chunks already in the directory are kept, new ones are numbered after
+    them, so more games can be added later on.
+    """
+    directory: str = ""
+    chunk_size: int = 100000
+    chunks_written: int = 0
+
+    def __init__(self, directory: str, chunk_size: int = 100000) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.chunks_written = 0
+        self.next_chunk = len(chunk_paths(directory))
+        self.features = []
+        self.points_leads = []
+        self.future_points = []
+        self.results = []
+        self.widths = []
+
+    def __enter__(self) -> "PositionWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def add_game(self, width: int, features: list[list[float]], points_leads: list[int], future_points: list[int],
+                 results: list[float]) -> None:
+        self.features.extend(features)
+        self.points_leads.extend(points_leads)
+        self.future_points.extend(future_points)
+        self.results.extend(results)
+        self.widths.extend([width] * len(features))
+        while len(self.features) >= self.chunk_size:
+            self.__write_chunk(self.chunk_size)
+
+    def __write_chunk(self, size: int) -> None:
+        path = os.path.join(self.directory, "positions-" + str(self.next_chunk).zfill(5) + ".npz")
+        # written under another name first, so an interrupted write never leaves a broken chunk behind
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as chunk_file:
+            np.savez(chunk_file, features=np.array(self.features[:size], dtype=np.float32),
+                     points_lead=np.array(self.points_leads[:size], dtype=np.int32),
+                     future_points=np.array(self.future_points[:size], dtype=np.int32),
+                     result=np.array(self.results[:size], dtype=np.float32),
+                     width=np.array(self.widths[:size], dtype=np.int32))
+        os.replace(temporary_path, path)
+        del self.features[:size], self.points_leads[:size], self.future_points[:size], self.results[:size]
+        del self.widths[:size]
+        self.next_chunk += 1
+        self.chunks_written += 1
+
+    def close(self) -> None:
+        """
+        Writes the positions left over as a last, smaller chunk.
+        """
+        if self.features:
+            self.__write_chunk(len(self.features))
+
+
+def chunk_paths(directory: str) -> list[str]:
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.startswith("positions-") and name.endswith(".npz"))
+
+
+def load_chunks(directory: str):
+    """
+    Yields the chunks written by PositionWriter one at a time, as dicts of their arrays.
+    """
+    for path in chunk_paths(directory):
+        with np.load(path) as data:
+            yield {name: data[name] for name in data.files}
+
+
+def play_self_play_game(writer: PositionWriter, width: int, players: tuple[str, str], seed: int,
+                        opening_moves: int = 0, exploration: bool = False) -> None:
+    """
+    Plays a headless game and adds its positions (with the player to move) to the writer.
+    :param players: tournament.make_player specs of player 1 and player 2
+    :param opening_moves: random moves the game starts with, they aren't saved
+    :param exploration: make one random move at a random point of the game and only save the positions after it -
+    the players themselves rarely leave a line one field from completion, and the search needs to know what such
+    positions are worth just as much. The positions before the random move are left out, because their outcome
+    depends on a move the players wouldn't make.
+    """
+    # AIComputerPlayer picks between the corners with the random module
+    random.seed(seed)
+    random_player = RandomComputerPlayer(1, seed=seed)
+    session = GameSession(random_player, random_player, width)
+    for _ in range(min(opening_moves, len(session.game.allowed_fields))):
+        session.step()
+    players = {1: make_player(players[0], 1, seed), 2: make_player(players[1], 2, seed + 1)}
+    session.player1, session.player2 = players[1], players[2]
+
+    game = session.game
+    random_move_no = random_player.random.randrange(len(game.allowed_fields)) if exploration else -1
+    tracker = PositionFeatures()
+    tracker.reset(game)
+    features, movers, leads = [], [], []
+    for move_no in range(len(game.allowed_fields)):
+        player_no = session.player_turn
+        if move_no > random_move_no:
+            features.append(list(tracker.features))
+            movers.append(player_no)
+            leads.append(game.p1 - game.p2 if player_no == 1 else game.p2 - game.p1)
+        if move_no == random_move_no:
+            session.player1 = session.player2 = random_player
+        coordinates = session.step()
+        session.player1, session.player2 = players[1], players[2]
+        tracker.moved(game, coordinates)
+    session.close()
+
+    final_leads = {1: game.p1 - game.p2, 2: game.p2 - game.p1}
+    writer.add_game(width, features, leads, [final_leads[player_no] - lead for player_no, lead in zip(movers, leads)],
+                    [0.5 if not final_leads[player_no] else float(final_leads[player_no] > 0) for player_no in movers])
+
+
+def generate_positions(directory: str, widths: list[int], games: int,
+                       players: tuple[str, str] = (SELF_PLAY_PLAYER, SELF_PLAY_PLAYER),
+                       opening_moves: int = 0, exploration: bool = False, chunk_size: int = 100000, seed: int = 0,
+                       report_every: float | None = 10.0) -> int:
+    """
+    Plays games games of self-play on every width and streams their positions to the directory.
+    :return: number of chunks written
+    """
+    start_time = time.perf_counter()
+    last_report = start_time
+    with PositionWriter(directory, chunk_size) as writer:
+        for game_no in range(games):
+            for width in widths:
+                play_self_play_game(writer, width, players, seed * 1000003 + game_no * len(widths) + width,
+                                    opening_moves, exploration)
+            if report_every is not None and time.perf_counter() - last_report >= report_every:
+                last_report = time.perf_counter()
+                print(str(game_no + 1) + "/" + str(games) + " games, "
+                      + str(round((game_no + 1) / (last_report - start_time), 1)) + " games/s")
+    return writer.chunks_written
+
+
+def fit_linear(directory: str, ridge: float = 1e-3) -> EvaluationModel:
+    """
+    Least squares fit of the points still to net, streamed over the chunks - only the (features x features) normal
+    equations are accumulated, so the data set doesn't have to fit in memory.
+    :param ridge: regularisation keeping the solution stable when some feature barely varies
+    """
+    feature_count = len(model_features("linear"))
+    gram = np.zeros((feature_count, feature_count))
+    moments = np.zeros(feature_count)
+    for chunk in load_chunks(directory):
+        features = expand_features(chunk['features'])
+        gram += features.T @ features
+        moments += features.T @ chunk['future_points']
+    if not gram[BIAS_FEATURE, BIAS_FEATURE]:
+        raise ValueError("No positions in " + directory + ".")
+    weights = np.linalg.solve(gram + ridge * np.eye(feature_count), moments)
+    return EvaluationModel("linear", weights)
+
+
+def fit_logistic(directory: str, iterations: int = 20, ridge: float = 1e-3) -> EvaluationModel:
+    """
+    Logistic regression of the game result (draws count as half a win) by Newton's method, every iteration streamed
+    over the chunks.
+    """
+    feature_count = len(model_features("logistic"))
+    weights = np.zeros(feature_count)
+    for _ in range(iterations):
+        gradient = np.zeros(feature_count)
+        hessian = ridge * np.eye(feature_count)
+        for chunk in load_chunks(directory):
+            features = logistic_features(chunk)
+            probabilities = 1 / (1 + np.exp(-(features @ weights)))
+            gradient += features.T @ (chunk['result'] - probabilities)
+            hessian += (features * (probabilities * (1 - probabilities))[:, np.newaxis]).T @ features
+        step = np.linalg.solve(hessian, gradient - ridge * weights)
+        weights += step
+        if np.max(np.abs(step)) < 1e-8:
+            break
+    return EvaluationModel("logistic", weights)
+
+
+def logistic_features(chunk: dict[str, np.ndarray]) -> np.ndarray:
+    return np.column_stack([expand_features(chunk['features']), chunk['points_lead']])
+
+
+def model_error(model: EvaluationModel, directory: str) -> dict[str, float]:
+    """
+    :return: for a linear model the root mean squared error of the points still to net, and the same of always
+    predicting their mean; for a logistic one the share of decided games whose winner it predicts and the log loss
+    """
+    positions = 0
+    squared_error = 0.0
+    total = 0.0
+    total_squares = 0.0
+    correct = 0
+    decided = 0
+    log_loss = 0.0
+    for chunk in load_chunks(directory):
+        positions += len(chunk['result'])
+        if model.kind == "linear":
+            errors = model.predict(expand_features(chunk['features'])) - chunk['future_points']
+            squared_error += float(errors @ errors)
+            total += float(chunk['future_points'].sum())
+            total_squares += float((chunk['future_points'].astype(np.float64) ** 2).sum())
+        else:
+            probabilities = np.clip(model.predict(logistic_features(chunk)), 1e-12, 1 - 1e-12)
+            results = chunk['result']
+            log_loss -= float((results * np.log(probabilities) + (1 - results) * np.log(1 - probabilities)).sum())
+            decisive = results != 0.5
+            decided += int(decisive.sum())
+            correct += int(((probabilities[decisive] > 0.5) == (results[decisive] == 1)).sum())
+    if not positions:
+        raise ValueError("No positions in " + directory + ".")
+    if model.kind == "linear":
+        mean = total / positions
+        return {'positions': positions, 'rmse': (squared_error / positions) ** 0.5,
+                'baseline_rmse': max(total_squares / positions - mean * mean, 0.0) ** 0.5}
+    return {'positions': positions, 'accuracy': correct / decided if decided else 0.0, 'log_loss': log_loss / positions}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Self-play positions and the evaluation models fitted on them.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    generate_parser = subparsers.add_parser("generate", help="play self-play games and save their positions")
+    generate_parser.add_argument("directory", help="directory the chunks of positions are written to")
+    generate_parser.add_argument("--widths", type=int, nargs="+", default=[7, 9, 11], help="board widths (odd numbers)")
+    generate_parser.add_argument("--games", type=int, default=1000, help="games per width")
+    generate_parser.add_argument("--players", nargs=2, default=[SELF_PLAY_PLAYER, SELF_PLAY_PLAYER],
+                                 help="tournament player specs of player 1 and player 2, e.g. minimax:depth=1")
+    generate_parser.add_argument("--opening-moves", type=int, default=2, help="random moves every game starts with")
+    generate_parser.add_argument("--exploration", action="store_true",
+                                 help="make one random move in every game and only save the positions after it")
+    generate_parser.add_argument("--chunk-size", type=int, default=100000, help="positions per chunk file")
+    generate_parser.add_argument("--seed", type=int, default=0)
+    fit_parser = subparsers.add_parser("fit", help="fit an evaluation model on saved positions")
+    fit_parser.add_argument("directory", help="directory with the chunks of positions")
+    fit_parser.add_argument("--kind", choices=("linear", "logistic"), default="linear")
+    fit_parser.add_argument("--output", required=True, help="file the model is saved to (.npz)")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        generation_start = time.perf_counter()
+        written = generate_positions(args.directory, args.widths, args.games, tuple(args.players), args.opening_moves,
+                                     args.exploration, args.chunk_size, args.seed)
+        print("Wrote " + str(written) + " chunks in " + str(round(time.perf_counter() - generation_start, 2)) + " s")
+    else:
+        fitted = fit_linear(args.directory) if args.kind == "linear" else fit_logistic(args.directory)
+        fitted.save(args.output)
+        for name, weight in zip(fitted.feature_names, fitted.weights):
+            print("  " + name + ": " + str(round(float(weight), 4)))
+        for metric, value in model_error(fitted, args.directory).items():
+            print(metric + ": " + str(round(value, 4) if isinstance(value, float) else value))
@@ -1,24 +1,66 @@
+import abc
 import random
 import math
+import time
+from array import array
+from bisect import bisect_left
 from typing import Dict, Type, List
+from book import get_book
+from endgame import EndgameSolver
+from evaluation import ThreatEvaluator
+from instrumentation import SearchStats, write_stats
+from search import AlphaBetaSearch, ParallelRootSearch
+from transposition import TranspositionTable
 
 
-class Player:
+class Player(abc.ABC):
     name: str = ""
     points: int = 0
 
     def __init__(self):
         pass
 
+    @abc.abstractmethod
+    def select_move(self, game, player_no: int) -> list[int]:
+        """
+        Chooses the next move without printing anything - the common interface through which GameSession (or anything
+        else running a game) asks a player for its move.
+        :param game: Triangle class obj
+        :param player_no: number (ID) of the player in the game - 1 or 2
+        :return: coordinates of the chosen field
+        """
+
+    def close(self) -> None:
+        """
+        Releases what the player holds on to between moves - e.g. the worker processes of AIComputerPlayer. Nothing
+        to release by default.
+        """
+
+    def __enter__(self) -> "Player":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
 
 class HumanPlayer(Player):
     name: str = ""
     points: int = 0
 
-    def __init__(self, player_no: int = 1):
-        self.name = input("Set name for the player number " + str(player_no) + ": ")
+    def __init__(self, player_no: int = 1, name: str = None):
+        # ask for the name only if it wasn't given
+        self.name = name if name is not None else input("Set name for the player number " + str(player_no) + ": ")
         super().__init__()
 
+    def select_move(self, game, player_no: int) -> list[int]:
+        # keep asking until the player chooses one of the allowed fields
+        while True:
+            coordinates = self.get_move()
+            if coordinates and coordinates in game.allowed_fields:
+                return coordinates
+            elif coordinates:
+                print("The field coordinates do not match any allowed field.")
+
     def get_move(self) -> list[int] | bool:
         # take input from the player
         user_input = input(self.name + "'s turn. Choose available field from the board: ")
@@ -52,31 +94,132 @@ class RandomComputerPlayer(Player):
     name: str = ""
     points: int = 0
 
-    def __init__(self, player_no: int = 1):
+    def __init__(self, player_no: int = 1, seed: int = None):
+        """
+        :param seed: seed for the player's own random number generator - the same seed gives the same moves
+        """
+        # the generator is separate from the random module, so that games can be reproduced
+        self.random = random.Random(seed)
         # two lists of names so that it doesn't happen that two random players have the same names
         names = [
             ["Mark", "Tobias", "Otto", "Jason", "Rachel", "Lisa", "Rebecca", "Sammy"],
             ["Dominic", "Andy", "John", "Mike", "Alexa", "Tina", "Debby", "Claudia"]
         ]
-        self.name = random.choice(names[player_no - 1])
+        self.name = self.random.choice(names[player_no - 1])
         super().__init__()
 
     def get_move(self, allowed_fields: list[list[int]]) -> list[int]:
-        move = random.choice(allowed_fields)
+        move = self.random.choice(allowed_fields)
         print(self.name + "'s move: " + str(move))
         return move
 
+    def select_move(self, game, player_no: int) -> list[int]:
+        return self.random.choice(game.allowed_fields)
+
+
+class ScriptedPlayer(Player):
+    """
+    Plays a fixed sequence of moves - e.g. to replay a recorded game or to set up a position in a test.
+    """
+    name: str = ""
+    points: int = 0
+
+    def __init__(self, moves: list[list[int]], name: str = "Script"):
+        self.name = name
+        self.moves = iter(moves)
+        super().__init__()
+
+    def select_move(self, game, player_no: int) -> list[int]:
+        try:
+            return next(self.moves)
+        except StopIteration:
+            raise ValueError(self.name + " has run out of moves.") from None
+
 
 class AIComputerPlayer(Player):
     name: str = ""
     points: int = 0
 
-    def __init__(self, player_no: int = 1):
+    def __init__(self, player_no: int = 1, depth: int = 3, search: str = "minimax", time_budget: float = 0.2,
+                 table_memory_mb: float | None = 64, persistent_table: bool = False, workers: int = 1,
+                 book_dir: str = None, endgame_threshold: int | None = 18, endgame_time_budget: float = 1.0,
+                 stats_stream=None, static_evaluation: bool = True, evaluation_model=None):
+        """
+        :param depth: how many moves (both players' together) the minimax looks ahead
+        :param search: "minimax" - plain minimax to the given depth, or "alphabeta" - alpha-beta search deepening one
+        move at a time until time_budget runs out
+        :param time_budget: seconds per move in the "alphabeta" mode
+        :param table_memory_mb: memory cap of the transposition table used in the "alphabeta" mode, None to search
+        without one
+        :param persistent_table: keep the transposition table between moves of the game
+        :param workers: number of processes the "alphabeta" search is spread over - the top-level moves are split between
+        them (each with its own transposition table, which is not kept between moves)
+        :param book_dir: directory with opening books (see book.py) - positions found in the book for the board's width
+        are answered from it without searching, None to always search
+        :param endgame_threshold: positions with at most that many free fields are solved exactly (see endgame.py) if
+        the solver makes it within endgame_time_budget seconds, None to never solve them
+        :param stats_stream: text stream the stats of every move (see last_stats) are written to as JSON lines
+        :param static_evaluation: score the positions at the bottom of the tree with a ThreatEvaluator (the points the
+        player to move can net with its next move) instead of the points gained on the way only
+        :param evaluation_model: linear learning.EvaluationModel obj, or the path of one saved by learning.py - the
+        leaves are scored with its prediction of the points the player to move will still net (a LearnedEvaluator)
+        instead of the ThreatEvaluator, and the moves of the last ply are all scored at once
+        """
+        if search not in ("minimax", "alphabeta"):
+            raise ValueError("The search must be either \"minimax\" or \"alphabeta\". Got " + str(search) + " instead.")
+
         self.name = "OliverAI"
+        self.depth = depth
+        self.search = search
+        self.book_dir = book_dir
+        self.endgame_solver = EndgameSolver(endgame_threshold, endgame_time_budget) \
+            if endgame_threshold is not None else None
+        if evaluation_model is not None:
+            # imported here - numpy is only needed for the learned evaluation, and learning.py imports this module
+            from learning import EvaluationModel, LearnedEvaluator
+            if isinstance(evaluation_model, str):
+                evaluation_model = EvaluationModel.load(evaluation_model)
+            self.evaluator = LearnedEvaluator(evaluation_model)
+        else:
+            self.evaluator = ThreatEvaluator() if static_evaluation else None
+        # evaluators with child_values score all the moves of the last ply of the minimax at once
+        self.batched_evaluation = hasattr(self.evaluator, "child_values")
+        if workers > 1:
+            self.searcher = ParallelRootSearch(workers=workers, time_budget=time_budget,
+                                               table_memory_mb=table_memory_mb, evaluator=self.evaluator)
+        else:
+            table = TranspositionTable(table_memory_mb) if table_memory_mb is not None else None
+            self.searcher = AlphaBetaSearch(time_budget=time_budget, table=table, persistent_table=persistent_table,
+                                            evaluator=self.evaluator)
+        self.stats_stream = stats_stream
+        # instrumentation.SearchStats obj of the last move
+        self.last_stats = None
+        # positions visited and evaluated by the minimax
+        self.nodes = 0
+        self.leaf_evaluations = 0
         super().__init__()
 
+    def close(self) -> None:
+        """
+        Shuts the worker processes of the parallel search down - they are started again on the next move if needed.
+        """
+        if isinstance(self.searcher, ParallelRootSearch):
+            self.searcher.close()
+
     def get_move(self, game, player_no: int = 2) -> list[int]:
+        move = self.select_move(game, player_no)
+        print(self.name + "'s move: " + str(move))
+        return move
+
+    def select_move(self, game, player_no: int = 2) -> list[int]:
         # no type hinting @ game to avoid importing the Triangle class and therefore loop import error
+        start_time = time.perf_counter()
+        free_fields = len(game.allowed_fields)
+        book = get_book(self.book_dir, game.width) if self.book_dir is not None else None
+        book_entry = book.lookup(game) if book is not None else None
+        solution = None
+        if book_entry is None and self.endgame_solver is not None and self.endgame_solver.can_solve(game):
+            solution = self.endgame_solver.solve(game)
         corner_field = {
             'left': [game.height, 1],
             'right': [game.height, game.width]
@@ -84,98 +227,369 @@ class AIComputerPlayer(Player):
         # if both fields in the bottom left and right corners of the triangle are available then randomly choose one,
         # else choose whichever is available - those fields are a good starting tactic as they give instantly 2
         # points without increasing opponents chances of getting a combo
-        if corner_field['left'] and corner_field['right'] in game.allowed_fields:
+        stats = SearchStats(self.name, player_no, "corner", free_fields=free_fields)
+        if book_entry is not None:
+            # the opening book knows the position
+            move = book_entry[0]
+            stats.method = "book"
+        elif solution is not None:
+            # few enough fields left to play the provably best move
+            move = solution[0]
+            stats.method = "endgame"
+            stats.nodes = self.endgame_solver.nodes
+            stats.leaf_evaluations = self.endgame_solver.leaf_evaluations
+            stats.cutoffs = self.endgame_solver.cutoffs
+            # solved to the end of the game
+            stats.depth = free_fields
+            stats.states = len(self.endgame_solver.memo)
+            # EndgameSolver.stats() measures the memo exactly, but walks all of it - too slow for every move
+            stats.memo_bytes = stats.states * self.endgame_solver.ENTRY_SIZE
+        elif corner_field['left'] in game.allowed_fields and corner_field['right'] in game.allowed_fields:
             move = random.choice([corner_field['left'], corner_field['right']])
         elif corner_field['left'] in game.allowed_fields:
             move = corner_field['left']
         elif corner_field['right'] in game.allowed_fields:
             move = corner_field['right']
+        elif self.search == "alphabeta":
+            # search as deep as the time budget allows
+            move = self.searcher.search(game, player_no)[0]
+            stats.method = "parallel" if isinstance(self.searcher, ParallelRootSearch) else "alphabeta"
+            # every node but the root is reached by a push_move, which checks the lines through the field
+            stats.nodes = stats.combo_checks = self.searcher.nodes
+            stats.leaf_evaluations = self.searcher.leaf_evaluations
+            stats.cutoffs = self.searcher.cutoffs
+            stats.table_lookups = self.searcher.table_lookups
+            stats.table_hits = self.searcher.table_hits
+            stats.depth = self.searcher.depth_reached
         else:
             # use minimax algorithm to find the best possible move or set of moves
-            move = self.__minimax(state=game, depth=5)['position']
-
-        print(self.name + "'s move: " + str(move))
+            self.nodes = 0
+            self.leaf_evaluations = 0
+            if self.evaluator is not None:
+                self.evaluator.reset(game)
+            move = self.__minimax(state=game, depth=self.depth, ai_player=player_no, current_player=player_no)['position']
+            stats.method = "minimax"
+            stats.nodes = self.nodes
+            stats.combo_checks = self.nodes - 1
+            stats.leaf_evaluations = self.leaf_evaluations
+            stats.depth = min(self.depth, free_fields)
+
+        stats.move = move
+        stats.seconds = time.perf_counter() - start_time
+        self.last_stats = stats
+        if self.stats_stream is not None:
+            write_stats(self.stats_stream, stats)
         return move
 
-    def __minimax(self, state, depth: int, current_player: int = 2, current_child_pos: list = None) \
-            -> dict[str, Type[int | list[int]]]:
+    def __minimax(self, state, depth: int, ai_player: int = 2, current_player: int = 2) \
+            -> dict[str, float | list[int] | None]:
         """
-        Algorithm deducing the most optimal move. Considers evaluation of each field on the board and maximises the
-        value for AI while minimising the value for the other player. When it's AI's turn to make a move we evaluate if
-        it will bring any points and save the max number of points to evaluation variable, then, going back up to the
-        top of the tree, we consider all moves that the other player can make and write the min to the evaluation
-        variable, etc...
-        Unfortunately, the minimax aims only at the highest combos that it can get which makes it easy to defeat.
-        I spent a good deal amount of time trying to fix it, although, it doesn't seem to work. I'm going to leave the
-        code as it is now. Good enough for first AI.
+        Algorithm deducing the most optimal move. Tries out each allowed field on the board with state.push_move, goes
+        down the tree for the other player and then takes the move back with state.pop_move, so the game is left exactly
+        as it was and no copies of the board are needed. At the bottom of the tree (or when the board is full) the
+        position is evaluated as the difference between AI's and the other player's points - with the static evaluation,
+        corrected by what the player to move can net with its next move; AI maximises that value while the other player
+        minimises it.
 
         :param state: Triangle class obj
-        :param depth: How far down the tree the algorithm should go (depth > 0)
-        :param current_player: number (ID) of the current player - 2 for the AI, 1 for the other player
-        :param current_child_pos: coordinates of the child node to be considered when returning static evaluation of the
-        current position
-        :return: dictionary with evaluation value and list containing two integer numbers - coordinates
+        :param depth: How far down the tree the algorithm should go (depth >= 0)
+        :param ai_player: number (ID) of the AI player
+        :param current_player: number (ID) of the player to move - 2 for the AI, 1 for the other player by default
+        :return: dictionary with evaluation value and list containing two integer numbers - coordinates of the best
+        move (None at the bottom of the tree)
         """
         minimax_dict = {
-            'evaluation': float,
-            'points': int,
-            'position': list[int]
+            'evaluation': 0,
+            'position': None
         }
-
-        # at the bottom of the tree evaluate child node at specified position and return the dictionary to the parent
-        # node
-        if depth == 1 and current_child_pos is not None:
-            minimax_dict['points'] = state.check_if_combo(current_child_pos, current_player)[0]
-            minimax_dict['position'] = current_child_pos
+        self.nodes += 1
+
+        # at the bottom of the tree return the static evaluation of the position
+        if depth == 0 or state.is_end():
+            self.leaf_evaluations += 1
+            if ai_player == 2:
+                minimax_dict['evaluation'] = state.p2 - state.p1
+            else:
+                minimax_dict['evaluation'] = state.p1 - state.p2
+            if self.evaluator is not None:
+                # what the player to move can still net with its next move
+                threats = self.evaluator.evaluate(state)
+                minimax_dict['evaluation'] += threats if current_player == ai_player else -threats
             return minimax_dict
 
-        if depth > 2 and current_child_pos:
-            parent_points = state.check_if_combo(current_child_pos, current_player)[0]
-        else:
-            parent_points = 0
-
-        if current_player == 2:
-            # if the current player is AI then set max_evaluation to -inf - i.e. worse than the worst possible
-            # evaluation
-            max_evaluation = -math.inf
-            for child_position in state.allowed_fields:
-                # go down the tree node for each possible position on the board then from the depth == 1 go back up
-                child_minimax_dict = self.__minimax(state, depth - 1, current_player=1,
-                                                    current_child_pos=child_position)
-
-                # evaluate for the child node
-                child_eval = int(child_minimax_dict['points'])*(depth - 1) + parent_points*depth
-
-                # save the best evaluation present
-                minimax_dict['evaluation'] = max(max_evaluation, child_eval)
-                minimax_dict['points'] = child_minimax_dict['points'] if depth == 2 else parent_points
-
-                # save the coordinate that has the max evaluation. Note that child_minimax_dict['position'] ==
-                # child_position. We are saving the new position if it has higher evaluation than the previous, else we
-                # leave it as it was
-                if child_eval > max_evaluation:
-                    minimax_dict['position'] = child_position
-
+        maximising = current_player == ai_player
+        # start with the worse than the worst evaluation from the current player's perspective
+        minimax_dict['evaluation'] = -math.inf if maximising else math.inf
+        next_player = 1 if current_player == 2 else 2
+
+        if depth == 1 and self.batched_evaluation:
+            # the children are all leaves - their evaluations are the points lead now plus (from the current player's
+            # perspective) what each move nets, including what the other player is expected to net after it
+            moves = list(state.allowed_fields)
+            move_values = self.evaluator.child_values(state, moves)
+            lead = state.p2 - state.p1 if ai_player == 2 else state.p1 - state.p2
+            self.nodes += len(moves)
+            self.leaf_evaluations += len(moves)
+            # both players go for the move netting them the most - the first of equally good ones, like in the loop
+            # below
+            best_ind = int(move_values.argmax())
+            minimax_dict['evaluation'] = lead + int(move_values[best_ind]) if maximising \
+                else lead - int(move_values[best_ind])
+            minimax_dict['position'] = moves[best_ind]
             return minimax_dict
-        else:
-            # if the current player is the other player then max_evaluation is set to the worse than the worst (from the
-            # AI perspective)
-            min_evaluation = math.inf
-            for child_position in state.allowed_fields:
-                # go down the tree and back up recursively for the other player
-                child_minimax_dict = self.__minimax(state, depth - 1, current_player=1,
-                                                    current_child_pos=child_position)
 
-                child_eval = int(child_minimax_dict['points'])*(depth - 1) + parent_points*depth
-
-                # minimise the evaluation for the other player
-                minimax_dict['evaluation'] = min(min_evaluation, child_eval)
-                minimax_dict['points'] = child_minimax_dict['points'] if depth == 2 else parent_points
+        # pop_move puts the field back where it was in allowed_fields, so they can be iterated directly
+        for child_position in state.allowed_fields:
+            state.push_move(child_position, current_player)
+            if self.evaluator is not None:
+                self.evaluator.moved(state, child_position)
+            child_evaluation = self.__minimax(state, depth - 1, ai_player, next_player)['evaluation']
+            state.pop_move()
+            if self.evaluator is not None:
+                self.evaluator.unmoved(state, child_position)
+
+            # save the coordinate that has the best evaluation for the current player
+            if (maximising and child_evaluation > minimax_dict['evaluation']) or \
+                    (not maximising and child_evaluation < minimax_dict['evaluation']):
+                minimax_dict['evaluation'] = child_evaluation
+                minimax_dict['position'] = child_position
+
+        return minimax_dict
+
+
+# geometry -> indices (in geometry.fields) of the fields of every line, for the playouts of MCTSComputerPlayer
+_LINE_FIELDS_CACHE = {}
+
+
+def _line_fields(geometry) -> list[tuple[int, ...]]:
+    if geometry not in _LINE_FIELDS_CACHE:
+        # line_cells works the indices out directly, also on geometries that have no list of the fields of each line
+        _LINE_FIELDS_CACHE[geometry] = [tuple(geometry.line_cells(line_id)) for line_id in range(len(geometry.lines))]
+    return _LINE_FIELDS_CACHE[geometry]
+
+
+class MCTSNode:
+    """
+    Node of the MCTS tree - a position reached by playing move (by player_no) in the parent position.
+    """
+    __slots__ = ('move', 'player_no', 'parent', 'children', 'untried_moves', 'visits', 'wins', 'position_hash')
+
+    def __init__(self, move: list[int] | None, player_no: int, parent: "MCTSNode | None", position_hash: int) -> None:
+        self.move = move
+        self.player_no = player_no
+        self.parent = parent
+        self.children = []
+        # indices (in geometry.fields) of the moves not expanded yet - filled in on the first visit
+        self.untried_moves = None
+        self.visits = 0
+        # results of the playouts through the node from player_no's point of view: 1 - win, 0.5 - draw, 0 - loss
+        self.wins = 0.0
+        self.position_hash = position_hash
+
+
+class MCTSComputerPlayer(Player):
+    """
+    Monte Carlo tree search (UCT). Every iteration walks down the tree choosing the child with the best upper
+    confidence bound, adds one new position and finishes the game from it at random; the result is counted in every
+    node on the way. The more iterations, the better the moves, and the cost of one iteration grows only linearly with
+    the size of the board, so the player can be given any amount of thinking time.
+
+    A random playout fills the free fields in a random order, which is all that matters for the result: a line goes to
+    the player who fills its last field. So instead of playing the moves on a board, the playout gives the free fields
+    random keys (the order they get filled in) and looks up the last one of every line that isn't complete yet - the
+    game itself is only touched along the tree path (push_move / pop_move on a copy).
+
+    The tree is kept between moves: on the next call the node of the new position (the chosen move, then the
+    opponent's reply found by the Zobrist hash of the position) becomes the root with all its statistics.
+    """
+    name: str = ""
+    points: int = 0
 
-                # save the coordinate that has the min evaluation
-                if child_eval < min_evaluation:
-                    minimax_dict['position'] = child_position
+    def __init__(self, player_no: int = 1, playouts: int | None = None, time_budget_ms: float | None = 500,
+                 exploration: float = math.sqrt(2), seed: int = None, stats_stream=None):
+        """
+        :param playouts: number of playouts per move, None for no limit
+        :param time_budget_ms: milliseconds per move, None for no limit (at least one of the limits has to be given)
+        :param exploration: UCT exploration constant
+        :param seed: seed for the player's own random number generator
+        :param stats_stream: text stream the stats of every move (see last_stats) are written to as JSON lines
+        """
+        if playouts is None and time_budget_ms is None:
+            raise ValueError("Either the number of playouts or the time budget must be given.")
+
+        self.name = "MonteCarlo"
+        self.playouts = playouts
+        self.time_budget_ms = time_budget_ms
+        self.exploration = exploration
+        self.random = random.Random(seed)
+        self.root = None
+        self.root_geometry = None
+        # move returned by the last call - the way down the tree on the next one
+        self.last_move = None
+        # statistics of the last move
+        self.last_playouts = 0
+        self.last_seconds = 0.0
+        # length of the last iteration - the next one is only started if there's that much time left
+        self.iteration_seconds = 0.0
+        self.stats_stream = stats_stream
+        self.last_stats = None
+        super().__init__()
 
-            return minimax_dict
+    @property
+    def playouts_per_sec(self) -> float:
+        return self.last_playouts / self.last_seconds if self.last_seconds else 0.0
 
+    def get_move(self, game, player_no: int = 2) -> list[int]:
+        move = self.select_move(game, player_no)
+        print(self.name + "'s move: " + str(move) + " (" + str(self.last_playouts) + " playouts, "
+              + str(round(self.playouts_per_sec)) + " playouts/s)")
+        return move
 
+    def select_move(self, game, player_no: int = 2) -> list[int]:
+        start_time = time.perf_counter()
+        deadline = start_time + self.time_budget_ms / 1000 if self.time_budget_ms is not None else math.inf
+        max_playouts = self.playouts if self.playouts is not None else math.inf
+
+        # the node of the current position played "by" the other player, whose move led to it
+        other_player = 1 if player_no == 2 else 2
+        if self.root_geometry is not game.geometry:
+            self.iteration_seconds = 0.0
+        self.root = self.__reused_root(game, other_player)
+        self.root_geometry = game.geometry
+        state = game.clone()
+        line_fields = _line_fields(game.geometry)
+
+        playouts = 0
+        tree_moves = 0
+        while playouts < max_playouts:
+            iteration_start = time.perf_counter()
+            # on the widest boards a single playout takes a good part of the budget, so an iteration that wouldn't be
+            # over by the deadline isn't started - as long as there is a move to return
+            if iteration_start + self.iteration_seconds > deadline and self.root.children:
+                break
+            node = self.__select_and_expand(state)
+            result = self.__playout(state, line_fields, 1 if node.player_no == 2 else 2, deadline)
+            if result is None:
+                # the time ran out in the middle of the playout - the new node stays without a result
+                break
+            self.__backpropagate(node, *result)
+            # back to the root position
+            tree_moves += len(state.move_stack) - len(game.move_stack)
+            while len(state.move_stack) > len(game.move_stack):
+                state.pop_move()
+            playouts += 1
+            self.iteration_seconds = time.perf_counter() - iteration_start
+
+        self.last_playouts = playouts
+        self.last_seconds = time.perf_counter() - start_time
+        # the most visited move is the most reliable one
+        self.last_move = max(self.root.children, key=lambda child: child.visits).move
+        # the playouts don't touch the board - only the tree moves count as nodes
+        self.last_stats = SearchStats(self.name, player_no, "mcts", self.last_move, len(game.allowed_fields),
+                                      self.last_seconds, nodes=tree_moves, combo_checks=tree_moves,
+                                      leaf_evaluations=playouts, playouts=playouts)
+        if self.stats_stream is not None:
+            write_stats(self.stats_stream, self.last_stats)
+        return self.last_move
+
+    def __reused_root(self, game, other_player: int) -> MCTSNode:
+        """
+        Node of the game's position from the tree of the previous move - the move chosen then, followed by the other
+        player's reply - or a new one if there's none. The reply is found by the hash of the position; the move is
+        matched exactly, since the same fields filled in a different order can mean different points.
+        """
+        if self.root is not None and self.root_geometry is game.geometry:
+            for child in self.root.children:
+                if child.move != self.last_move:
+                    continue
+                for grandchild in child.children:
+                    if grandchild.position_hash == game.position_hash and grandchild.player_no == other_player:
+                        grandchild.parent = None
+                        return grandchild
+        return MCTSNode(None, other_player, None, game.position_hash)
+
+    def __select_and_expand(self, state) -> MCTSNode:
+        """
+        Walks down the tree by UCT (playing the moves on the state) and adds one child to the first node that has
+        unexplored moves.
+        :return: the new node, or a node of a finished game
+        """
+        node = self.root
+        while True:
+            if node.untried_moves is None:
+                # indices of the free fields, copied in one go - turning all of them into coordinates (and shuffling
+                # them) would cost as much as a playout on a wide board
+                node.untried_moves = array('i', state.allowed_fields.dense)
+            player_no = 1 if node.player_no == 2 else 2
+
+            untried_moves = node.untried_moves
+            if untried_moves:
+                # a random untried move - swapped with the last one, which takes its place
+                move_position = self.random.randrange(len(untried_moves))
+                field_ind = untried_moves[move_position]
+                untried_moves[move_position] = untried_moves[-1]
+                untried_moves.pop()
+                move = list(state.geometry.fields[field_ind])
+                state.push_move(move, player_no)
+                child = MCTSNode(move, player_no, node, state.position_hash)
+                node.children.append(child)
+                return child
+            if not node.children:
+                # the game is over
+                return node
+
+            log_visits = math.log(node.visits)
+            exploration = self.exploration
+            node = max(node.children, key=lambda child: child.wins / child.visits
+                       + exploration * math.sqrt(log_visits / child.visits))
+            state.push_move(node.move, player_no)
+
+    def __playout(self, state, line_fields: list[tuple[int, ...]], player_no: int, deadline: float) \
+            -> tuple[int, int] | None:
+        """
+        Finishes the game at random without touching the state.
+        :param player_no: player to move
+        :param deadline: time.perf_counter() by which the playout has to be over
+        :return: final points of both players, None if the deadline passed first
+        """
+        # the free fields get filled in the order of random keys - the keys are sorted in C, while shuffling the fields
+        # would be a Python loop, which on wide boards takes most of the playout
+        free_fields = state.allowed_fields.dense
+        rand = self.random.random
+        free_keys = [rand() for _ in free_fields]
+        # key of every field, -1 for the fields that already are filled
+        field_keys = [-1.0] * len(state.geometry.fields)
+        for field_ind, key in zip(free_fields, free_keys):
+            field_keys[field_ind] = key
+        free_keys.sort()
+
+        p1 = state.p1
+        p2 = state.p2
+        line_lengths = state.geometry.line_lengths
+        perf_counter = time.perf_counter
+        # the player to move makes the even moves
+        parity = 0 if player_no == 1 else 1
+        for line_id, line_remaining in enumerate(state.line_remaining):
+            if line_remaining:
+                if perf_counter() > deadline:
+                    return None
+                # the last field of the line to be filled, and on which move it's filled
+                last_key = max(map(field_keys.__getitem__, line_fields[line_id]))
+                if bisect_left(free_keys, last_key) % 2 == parity:
+                    p1 += line_lengths[line_id]
+                else:
+                    p2 += line_lengths[line_id]
+        return p1, p2
+
+    @staticmethod
+    def __backpropagate(node: MCTSNode, p1: int, p2: int) -> None:
+        if p1 > p2:
+            results = {1: 1.0, 2: 0.0}
+        elif p2 > p1:
+            results = {1: 0.0, 2: 1.0}
+        else:
+            results = {1: 0.5, 2: 0.5}
+        while node is not None:
+            node.visits += 1
+            node.wins += results[node.player_no]
+            node = node.parent
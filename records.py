@@ -0,0 +1,348 @@
+import argparse
+import mmap
+from array import array
+import os
+import struct
+
+
+# file layout:
+#   file header: magic, format version
+#   game records one after another, each: game header, then the moves in the order they were made
+FILE_MAGIC = b"TRIREC"
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct("<6sH")
+# record magic, width, player 1 type, player 2 type, player 1 points, player 2 points, number of moves
+GAME_HEADER = struct.Struct("<2sHBBiiI")
+GAME_MAGIC = b"GR"
+# a move is the row with the player (0 - player 1, 1 - player 2) in the top bit, followed by the column; one byte each
+# on boards up to SMALL_MOVE_WIDTH fields wide, where the rows (up to 127) leave the top bit free, two bytes each on
+# wider boards
+SMALL_MOVE_WIDTH = 253
+SMALL_MOVE = struct.Struct("<BB")
+LARGE_MOVE = struct.Struct("<HH")
+SMALL_PLAYER_BIT = 0x80
+LARGE_PLAYER_BIT = 0x8000
+
+# codes of the player types stored in the game headers
+PLAYER_TYPES = {
+    "unknown": 0,
+    "HumanPlayer": 1,
+    "RandomComputerPlayer": 2,
+    "AIComputerPlayer": 3,
+    "ScriptedPlayer": 4,
+    "MCTSComputerPlayer": 5
+}
+PLAYER_TYPE_NAMES = {code: name for name, code in PLAYER_TYPES.items()}
+
+
+def player_type(player) -> int:
+    """
+    :param player: Player obj, the name of its class or None
+    :return: code stored in the game header
+    """
+    name = player if isinstance(player, str) or player is None else type(player).__name__
+    return PLAYER_TYPES.get(name, PLAYER_TYPES["unknown"])
+
+
+def move_format(width: int) -> tuple[struct.Struct, int]:
+    """
+    :return: struct of a single move and the bit marking player 2's moves for boards of the given width
+    """
+    if width <= SMALL_MOVE_WIDTH:
+        return SMALL_MOVE, SMALL_PLAYER_BIT
+    return LARGE_MOVE, LARGE_PLAYER_BIT
+
+
+def encode_moves(width: int, moves: list[tuple[int, list[int]]]) -> bytes:
+    """
+    :param moves: (player number, [row, col]) for every move
+    """
+    move_struct, player_bit = move_format(width)
+    encoded = bytearray(move_struct.size * len(moves))
+    for move_ind, (player_no, (row, col)) in enumerate(moves):
+        move_struct.pack_into(encoded, move_ind * move_struct.size, row | (player_bit if player_no == 2 else 0), col)
+    return bytes(encoded)
+
+
+class GameRecordWriter:
+    """
+    Appends games to a record file. The file is only ever appended to - every finished game is written with a single
+    write() call, so many games can be streamed into the same file over time (also by separate runs) and a crash can
+    cost at most the game that was being written. A record cut off that way is dropped when the file is opened again,
+    so the games written afterwards don't end up behind it.
+
+    Games can be written whole with write_game, or move by move: start_game, add_move for every move, finish_game once
+    the scores are known. Only the moves of the current game (a few bytes each) are kept in memory.
+    """
+    path: str = ""
+    games_written: int = 0
+
+    def __init__(self, path: str, flush_every: int = 1) -> None:
+        """
+        :param path: record file, created if it doesn't exist
+        :param flush_every: flush the file after every that many games
+        """
+        self.path = path
+        self.flush_every = flush_every
+        self.games_written = 0
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+            self.file.flush()
+        else:
+            with open(path, "rb") as record_file:
+                read_file_header(record_file.read(FILE_HEADER.size), path)
+                complete_end = find_complete_end(record_file)
+            if complete_end < self.file.tell():
+                self.file.truncate(complete_end)
+
+        # the game being written move by move
+        self.width = None
+        self.player_types = (0, 0)
+        self.moves = bytearray()
+        self.move_count = 0
+
+    def __enter__(self) -> "GameRecordWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write_game(self, width: int, player1, player2, moves: list[tuple[int, list[int]]], p1: int, p2: int) -> None:
+        """
+        :param player1: Player obj (or the name of its class) of player 1
+        :param player2: Player obj (or the name of its class) of player 2
+        :param moves: (player number, [row, col]) for every move in the order they were made
+        :param p1: final points of player 1
+        :param p2: final points of player 2
+        """
+        self.__write(width, (player_type(player1), player_type(player2)), encode_moves(width, moves), len(moves),
+                     p1, p2)
+
+    def write_result(self, result, player1, player2) -> None:
+        """
+        :param result: session.GameResult obj
+        """
+        self.write_game(result.width, player1, player2, result.moves, result.p1, result.p2)
+
+    def start_game(self, width: int, player1, player2) -> None:
+        self.width = width
+        self.player_types = (player_type(player1), player_type(player2))
+        self.moves = bytearray()
+        self.move_count = 0
+
+    def add_move(self, player_no: int, coordinates: list[int]) -> None:
+        if self.width is None:
+            raise ValueError("start_game has to be called before adding moves.")
+        self.moves += encode_moves(self.width, [(player_no, coordinates)])
+        self.move_count += 1
+
+    def finish_game(self, p1: int, p2: int) -> None:
+        if self.width is None:
+            raise ValueError("start_game has to be called before finishing a game.")
+        self.__write(self.width, self.player_types, bytes(self.moves), self.move_count, p1, p2)
+        self.width = None
+        self.moves = bytearray()
+        self.move_count = 0
+
+    def __write(self, width: int, player_types: tuple[int, int], encoded_moves: bytes, move_count: int, p1: int,
+                p2: int) -> None:
+        self.file.write(GAME_HEADER.pack(GAME_MAGIC, width, player_types[0], player_types[1], p1, p2, move_count)
+                        + encoded_moves)
+        self.games_written += 1
+        if not self.games_written % self.flush_every:
+            self.file.flush()
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.file.close()
+
+
+def read_file_header(data: bytes, path: str) -> None:
+    if len(data) < FILE_HEADER.size:
+        raise ValueError(path + " is not a game record file.")
+    magic, version = FILE_HEADER.unpack_from(data)
+    if magic != FILE_MAGIC:
+        raise ValueError(path + " is not a game record file.")
+    if version != FILE_VERSION:
+        raise ValueError(path + " has an unsupported format version: " + str(version) + ".")
+
+
+def find_complete_end(record_file) -> int:
+    """
+    Hops from game header to game header - only the headers are read, so it's quick on large files as well.
+    :param record_file: record file opened for binary reading, its file header already checked
+    :return: offset right after the last complete game record
+    """
+    file_size = os.fstat(record_file.fileno()).st_size
+    offset = FILE_HEADER.size
+    while offset + GAME_HEADER.size <= file_size:
+        record_file.seek(offset)
+        header = record_file.read(GAME_HEADER.size)
+        magic, width, player1_type, player2_type, p1, p2, move_count = GAME_HEADER.unpack(header)
+        record_end = offset + GAME_HEADER.size + move_count * move_format(width)[0].size
+        # anything that isn't a whole game record can only be what a crash left behind
+        if magic != GAME_MAGIC or record_end > file_size:
+            break
+        offset = record_end
+    return offset
+
+
+class GameRecord:
+    """
+    A single game of a record file. Only the header is read up front - the moves are read from the memory map when
+    they are iterated.
+    """
+    __slots__ = ('data', 'offset', 'width', 'player_types', 'p1', 'p2', 'move_count')
+
+    width: int
+    # names of the players' classes (see PLAYER_TYPES)
+    player_types: tuple[str, str]
+    p1: int
+    p2: int
+    move_count: int
+
+    def __init__(self, data, offset: int) -> None:
+        """
+        :param data: memory map (or any buffer) of the record file
+        :param offset: offset of the game header in data
+        """
+        magic, width, player1_type, player2_type, p1, p2, move_count = GAME_HEADER.unpack_from(data, offset)
+        if magic != GAME_MAGIC:
+            raise ValueError("No game record at offset " + str(offset) + ".")
+        self.data = data
+        self.offset = offset
+        self.width = width
+        self.player_types = (PLAYER_TYPE_NAMES.get(player1_type, "unknown"),
+                             PLAYER_TYPE_NAMES.get(player2_type, "unknown"))
+        self.p1 = p1
+        self.p2 = p2
+        self.move_count = move_count
+
+    @property
+    def size(self) -> int:
+        """
+        Bytes the record takes in the file, header included.
+        """
+        return GAME_HEADER.size + self.move_count * move_format(self.width)[0].size
+
+    @property
+    def winner(self) -> int | None:
+        if self.p1 > self.p2:
+            return 1
+        elif self.p2 > self.p1:
+            return 2
+        return None
+
+    def moves(self):
+        """
+        Yields (player number, [row, col]) for every move, decoded one at a time.
+        """
+        move_struct, player_bit = move_format(self.width)
+        start = self.offset + GAME_HEADER.size
+        for row, col in move_struct.iter_unpack(self.data[start:start + self.move_count * move_struct.size]):
+            if row & player_bit:
+                yield 2, [row ^ player_bit, col]
+            else:
+                yield 1, [row, col]
+
+    def replay(self, game_cls=None, check_scores: bool = True):
+        """
+        Plays the game through on a fresh board.
+        :param game_cls: Triangle class or a subclass of it, by default the one large_board.new_board picks for the
+        width
+        :param check_scores: raise ValueError if the points don't match the ones in the header
+        :return: the game after the last move
+        """
+        if game_cls is None:
+            # imported here - game.py imports this module
+            from large_board import new_board
+            game = new_board(self.width)
+        else:
+            game = game_cls(self.width)
+        for player_no, coordinates in self.moves():
+            if not game.make_move(coordinates):
+                raise ValueError("Illegal move " + str(coordinates) + " in the game at offset " + str(self.offset)
+                                 + ".")
+            game.check_if_combo(coordinates, player_no)
+
+        if check_scores and (game.p1, game.p2) != (self.p1, self.p2):
+            raise ValueError("The replayed scores " + str((game.p1, game.p2)) + " don't match the recorded ones "
+                             + str((self.p1, self.p2)) + ".")
+        return game
+
+
+class GameRecordReader:
+    """
+    Reads a record file through a read-only memory map, so files far larger than memory can be gone through - only the
+    pages actually read are loaded, and games are decoded one at a time. An incomplete record at the end of the file
+    (e.g. left by a crash while writing) is ignored.
+
+    Iterating goes through the games in order; for random access (reader[i], len(reader)) an index of the game offsets
+    is built on first use - 8 bytes per game, found by hopping from header to header.
+    """
+    path: str = ""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.file = open(path, "rb")
+        # a zero-length file can't be memory-mapped
+        if os.fstat(self.file.fileno()).st_size:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.data = b""
+        read_file_header(self.data[:FILE_HEADER.size], path)
+        self.offsets = None
+
+    def __enter__(self) -> "GameRecordReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __iter__(self):
+        offset = FILE_HEADER.size
+        end = len(self.data)
+        while offset + GAME_HEADER.size <= end:
+            record = GameRecord(self.data, offset)
+            if offset + record.size > end:
+                break
+            yield record
+            offset += record.size
+
+    def __len__(self) -> int:
+        return len(self.__index())
+
+    def __getitem__(self, game_ind: int) -> GameRecord:
+        return GameRecord(self.data, self.__index()[game_ind])
+
+    def __index(self) -> array:
+        if self.offsets is None:
+            self.offsets = array('Q', (record.offset for record in self))
+        return self.offsets
+
+    def close(self) -> None:
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summary of a game record file.")
+    parser.add_argument("path")
+    parser.add_argument("--replay", action="store_true", help="replay every game and check its scores")
+    args = parser.parse_args()
+
+    games = 0
+    moves = 0
+    wins = {1: 0, 2: 0, None: 0}
+    with GameRecordReader(args.path) as reader:
+        for game_record in reader:
+            games += 1
+            moves += game_record.move_count
+            wins[game_record.winner] += 1
+            if args.replay:
+                game_record.replay()
+
+    print("Games: " + str(games) + ", moves: " + str(moves))
+    print("Player 1 wins: " + str(wins[1]) + ", player 2 wins: " + str(wins[2]) + ", draws: " + str(wins[None]))
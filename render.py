@@ -0,0 +1,159 @@
+import shutil
+import sys
+
+# ANSI escape codes
+CLEAR_SCREEN = "\x1b[H\x1b[2J"
+CLEAR_LINE = "\x1b[2K"
+
+
+def move_cursor(line: int, column: int) -> str:
+    """
+    :return: escape code moving the cursor to the given (1-based) line and column
+    """
+    return "\x1b[" + str(line) + ";" + str(column) + "H"
+
+
+def crossed_fields_str(fields_dict: dict) -> str:
+    crossed_fields = []
+    # fields_dict will be empty right after initialization in the play function
+    if fields_dict != {}:
+        # create a long string containing all H/V/D directions of crossing with fields coordinates
+        if fields_dict['horizontal']:
+            crossed_fields.append("Horizontal: " + str(fields_dict['horizontal']) + " ")
+        if fields_dict['vertical']:
+            crossed_fields.append("Vertical: " + str(fields_dict['vertical']) + " ")
+        if fields_dict['diagonal']:
+            crossed_fields.append("Diagonal: " + str(fields_dict['diagonal']) + " ")
+
+    return "".join(crossed_fields)
+
+
+class BoardRenderer:
+    """
+    Draws the board (the same frame as Triangle.print_board) with a single write to the stream. The row prefixes,
+    spacing and axis come from the game's geometry, which is shared by all boards of the same width, so only the
+    fields and the scores are put together on every frame.
+
+    * diff mode - after the first frame only the score lines and the fields that changed since the previous frame are
+      redrawn, using cursor-addressing escape codes. The frame is drawn at the top of the screen.
+    * viewport mode - boards wider than the terminal are shown through a window of columns centred on a chosen column
+      (e.g. the last move); the axis line says which columns are visible.
+    """
+    # lines taken by the scores above the board
+    SCORE_LINES: int = 2
+
+    def __init__(self, stream=None, diff: bool = False, viewport: bool = False, terminal_columns: int = None) -> None:
+        """
+        :param stream: file-like object to write to, sys.stdout (at the time of drawing) by default
+        :param diff: redraw only what changed since the previous frame
+        :param viewport: show only the columns that fit in the terminal
+        :param terminal_columns: width of the terminal for the viewport mode, detected by default
+        """
+        self.stream = stream
+        self.diff = diff
+        self.viewport = viewport
+        self.terminal_columns = terminal_columns
+        # fields and visible columns of the last frame (diff mode)
+        self.previous_board = None
+        self.previous_view = None
+
+    @staticmethod
+    def score_lines(game, p1, p2, x_fields: dict, p: int) -> list[str]:
+        """
+        Players' names, points and crossed fields next to the player who crossed them.
+        """
+        str_x_fields = crossed_fields_str(x_fields)
+        if str_x_fields != "" and p == 1:
+            return ["".join((p1.name, ": ", str(game.p1), " ")),
+                    "".join((p2.name, ": ", str(game.p2), " ", str_x_fields))]
+        elif str_x_fields != "" and p == 2:
+            return ["".join((p1.name, ": ", str(game.p1), " ", str_x_fields)),
+                    "".join((p2.name, ": ", str(game.p2)))]
+        else:
+            return ["".join((p1.name, ": ", str(game.p1))), "".join((p2.name, ": ", str(game.p2)))]
+
+    def visible_columns(self, game, focus_col: int = None) -> tuple[int, int]:
+        """
+        :param focus_col: 1-based column the viewport is centred on, the middle of the board by default
+        :return: 0-based range [first, last) of the columns to draw
+        """
+        if not self.viewport:
+            return 0, game.width
+
+        terminal_columns = self.terminal_columns or shutil.get_terminal_size().columns
+        # every field takes the spacing and the field itself
+        field_columns = len(game.field_spacing) + 1
+        prefix_columns = len(game.y_coord_axis[0])
+        columns = max(1, min(game.width, (terminal_columns - prefix_columns) // field_columns))
+
+        focus_col_ind = (focus_col - 1) if focus_col is not None else game.width // 2
+        first = min(max(0, focus_col_ind - columns // 2), game.width - columns)
+        return first, first + columns
+
+    def render_frame(self, game, p1, p2, x_fields: dict, p: int, first: int = 0, last: int = None) -> str:
+        """
+        :param first: first column (0-based) to draw
+        :param last: column after the last one to draw, the whole width by default
+        :return: the frame as a single string
+        """
+        last = game.width if last is None else last
+        spacing = game.field_spacing
+        lines = self.score_lines(game, p1, p2, x_fields, p)
+        if first == 0 and last == game.width:
+            for row_ind, row in enumerate(game.board):
+                lines.append(game.y_coord_axis[row_ind] + spacing.join(row))
+            lines.append(" " + spacing + game.axis_str)
+        else:
+            for row_ind, row in enumerate(game.board):
+                lines.append(game.y_coord_axis[row_ind] + spacing.join(row[first:last]))
+            field_columns = len(spacing) + 1
+            lines.append(" " + spacing + game.axis_str[first * field_columns:last * field_columns]
+                         + " (columns " + str(first + 1) + "-" + str(last) + " of " + str(game.width) + ")")
+        lines.append("")
+        return "\n".join(lines)
+
+    def render_diff(self, game, p1, p2, x_fields: dict, p: int, first: int, last: int) -> str:
+        """
+        Escape codes redrawing the score lines and the fields that changed since the previous frame.
+        """
+        parts = []
+        for line_ind, line in enumerate(self.score_lines(game, p1, p2, x_fields, p)):
+            parts.append(move_cursor(line_ind + 1, 1) + CLEAR_LINE + line)
+
+        field_columns = len(game.field_spacing) + 1
+        for row_ind, row in enumerate(game.board):
+            previous_row = self.previous_board[row_ind]
+            if row == previous_row:
+                continue
+            line = self.SCORE_LINES + row_ind + 1
+            prefix_columns = len(game.y_coord_axis[row_ind])
+            for col_ind in range(first, last):
+                if row[col_ind] != previous_row[col_ind]:
+                    parts.append(move_cursor(line, prefix_columns + (col_ind - first) * field_columns + 1)
+                                 + row[col_ind])
+
+        # leave the cursor below the frame
+        parts.append(move_cursor(self.SCORE_LINES + game.height + 2, 1))
+        return "".join(parts)
+
+    def draw(self, game, p1, p2, x_fields: dict, p: int, focus_col: int = None) -> None:
+        """
+        Writes the frame (or in the diff mode, the changes since the previous one) in one go.
+        :param focus_col: column the viewport is centred on
+        """
+        stream = self.stream if self.stream is not None else sys.stdout
+        first, last = self.visible_columns(game, focus_col)
+
+        if not self.diff:
+            output = self.render_frame(game, p1, p2, x_fields, p, first, last)
+        elif self.previous_board is not None and self.previous_view == (game.width, first, last):
+            output = self.render_diff(game, p1, p2, x_fields, p, first, last)
+        else:
+            output = CLEAR_SCREEN + self.render_frame(game, p1, p2, x_fields, p, first, last)
+
+        if self.diff:
+            self.previous_board = [row[:] for row in game.board]
+            self.previous_view = (game.width, first, last)
+
+        stream.write(output)
+        stream.flush()
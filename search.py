@@ -0,0 +1,477 @@
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from evaluation import ThreatEvaluator
+from transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+
+class SearchTimeout(Exception):
+    """
+    Raised from inside the search tree when the time budget for the move has run out.
+    """
+    pass
+
+
+class AlphaBetaSearch:
+    """
+    Alpha-beta search used by AIComputerPlayer in the 'alphabeta' mode. Positions are scored as the difference between
+    the points the player to move can still gain and the points the other player can still gain (negamax), so the
+    value of a position does not depend on how the points were split so far.
+
+    The search deepens one ply at a time until the time budget runs out and returns the best move of the deepest
+    completed iteration. Moves that complete a line are tried first, and on the top level the best move of the previous
+    iteration goes first, so most of the tree gets cut off by the alpha-beta bounds. With a transposition table,
+    results of positions reached through different move orders are reused and the best move stored for a position is
+    tried first.
+
+    A position and its mirror image are equivalent, so the table is keyed by the canonical hash (best moves are stored
+    for the canonical orientation), and in positions that are symmetric themselves only one move of every mirrored pair
+    is searched.
+
+    Without an evaluator the leaves are worth 0 - only the points gained on the way down count. With a ThreatEvaluator
+    the leaves get its static evaluation of the lines about to be completed, and the moves are ordered by its scores,
+    which also look at the lines a move hands to the other player. A learning.LearnedEvaluator is used the same way,
+    and evaluates all the moves of the last ply in one go (child_values) instead of playing them.
+    """
+    time_budget: float = 0.2
+    max_depth: int | None = None
+    table: TranspositionTable | None = None
+    # keep the table between moves - entries stay valid as positions are scored by the points still to gain
+    persistent_table: bool = False
+    # skip mirrored twins of moves in symmetric positions
+    use_symmetry: bool = True
+    evaluator: ThreatEvaluator | None = None
+    # statistics of the last search: positions visited, positions evaluated at the bottom of the tree (or at the end
+    # of the game), alpha-beta cutoffs, and transposition table lookups and hits
+    nodes: int = 0
+    leaf_evaluations: int = 0
+    cutoffs: int = 0
+    table_lookups: int = 0
+    table_hits: int = 0
+    # depth of the deepest completed iteration of the last search
+    depth_reached: int = 0
+    deadline: float = 0.0
+
+    def __init__(self, time_budget: float = 0.2, max_depth: int = None, table: TranspositionTable = None,
+                 persistent_table: bool = False, use_symmetry: bool = True, evaluator: ThreatEvaluator = None) -> None:
+        """
+        :param time_budget: seconds the search may take per move
+        :param max_depth: optional limit for the iterative deepening (number of moves of both players)
+        :param table: optional transposition table
+        :param persistent_table: if False the table is cleared before every search
+        :param use_symmetry: search only one move of every mirrored pair in symmetric positions
+        :param evaluator: static evaluation of the leaves and move ordering, None to score leaves as 0
+        """
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.table = table
+        self.persistent_table = persistent_table
+        self.use_symmetry = use_symmetry
+        self.evaluator = evaluator
+        # evaluators with child_values (learning.LearnedEvaluator) score all the moves of the last ply at once,
+        # without playing them
+        self.batched_evaluation = hasattr(evaluator, "child_values")
+
+    def candidate_moves(self, game) -> list[list[int]]:
+        """
+        Allowed fields, except that in a symmetric position fields right of the middle column are left out - their
+        mirror images are equally good.
+        """
+        if self.use_symmetry and game.is_symmetric():
+            middle_col = (game.width + 1) / 2
+            return [move for move in game.allowed_fields if move[1] <= middle_col]
+        return game.allowed_fields
+
+    def order_moves(self, game) -> list[list[int]]:
+        """
+        Candidate moves sorted so that the ones completing the most valuable lines come first (with an evaluator: the
+        ones scoring best in its score_moves). Ties keep the order of game.allowed_fields.
+        """
+        moves = self.candidate_moves(game)
+        if self.evaluator is not None:
+            moves = list(moves)
+            scores = self.evaluator.score_moves(game, moves)
+            return [moves[move_ind] for move_ind in sorted(range(len(moves)), key=scores.__getitem__, reverse=True)]
+        return sorted(moves, key=game.move_points, reverse=True)
+
+    def search(self, game, player_no: int) -> tuple[list[int] | None, int | float]:
+        """
+        Iterative deepening alpha-beta search on the live board - moves are applied with push_move and taken back with
+        pop_move, so the game is left as it was, also when the search is interrupted by the time budget.
+        :param game: Triangle class obj
+        :param player_no: number (ID) of the player to move
+        :return: best move found and its evaluation (points lead the player can secure within the searched depth)
+        """
+        self.reset_stats()
+        self.deadline = time.perf_counter() + self.time_budget
+        stack_size = len(game.move_stack)
+        if self.table is not None and not self.persistent_table:
+            self.table.clear()
+        table_lookups = self.table.hits + self.table.misses if self.table is not None else 0
+        table_hits = self.table.hits if self.table is not None else 0
+        if self.evaluator is not None:
+            self.evaluator.reset(game)
+
+        moves = self.order_moves(game)
+        if not moves:
+            return None, 0
+        self.__move_table_move_first(game, moves)
+
+        # if even the first iteration doesn't make it in time, the move completing the best line is a sane answer
+        best_move, best_evaluation = moves[0], -math.inf
+        if time.perf_counter() > self.deadline:
+            # on the widest boards ordering the moves alone can take the whole budget
+            return best_move, best_evaluation
+        # in symmetric positions only half of the moves are searched, but the game still lasts as many moves as there
+        # are free fields
+        free_fields = len(game.allowed_fields)
+        max_depth = free_fields if self.max_depth is None else min(self.max_depth, free_fields)
+
+        for depth in range(1, max_depth + 1):
+            try:
+                move, evaluation = self.__search_root(game, moves, depth, player_no)
+            except SearchTimeout:
+                # unwind the moves that were on the board when the clock ran out
+                while len(game.move_stack) > stack_size:
+                    game.pop_move()
+                break
+            best_move, best_evaluation = move, evaluation
+            self.depth_reached = depth
+
+            # search the best move first in the next iteration
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+
+        if self.table is not None:
+            self.table_lookups = self.table.hits + self.table.misses - table_lookups
+            self.table_hits = self.table.hits - table_hits
+        return best_move, best_evaluation
+
+    def reset_stats(self) -> None:
+        self.nodes = 0
+        self.leaf_evaluations = 0
+        self.cutoffs = 0
+        self.table_lookups = 0
+        self.table_hits = 0
+        self.depth_reached = 0
+
+    def __search_root(self, game, moves: list[list[int]], depth: int, player_no: int) \
+            -> tuple[list[int], int | float]:
+        alpha = -math.inf
+        best_move = moves[0]
+
+        for move in moves:
+            evaluation = self.search_move(game, move, depth, player_no, alpha)
+
+            # strictly better only - with equal evaluations the move searched first wins
+            if evaluation > alpha:
+                alpha = evaluation
+                best_move = move
+
+        return best_move, alpha
+
+    def search_move(self, game, move: list[int], depth: int, player_no: int, alpha: int | float = -math.inf) \
+            -> int | float:
+        """
+        Evaluates a single top-level move. The deadline has to be set by the caller.
+        :param alpha: evaluation the move has to beat - a result above alpha is exact, otherwise it is only known that
+        the move is not better than alpha
+        :return: evaluation of the move from the perspective of the player making it
+        """
+        next_player = 1 if player_no == 2 else 2
+        points = game.push_move(move, player_no)
+        if self.evaluator is not None:
+            self.evaluator.moved(game, move)
+        evaluation = points - self.__negamax(game, depth - 1, -math.inf, points - alpha, next_player)
+        game.pop_move()
+        if self.evaluator is not None:
+            self.evaluator.unmoved(game, move)
+        return evaluation
+
+    def __negamax(self, game, depth: int, alpha: int | float, beta: int | float, player_no: int) -> int | float:
+        """
+        :return: evaluation of the position from the perspective of the player to move (fail-soft)
+        """
+        self.nodes += 1
+        # reading the clock is cheap compared to ordering the moves, so it's checked in every node
+        if time.perf_counter() > self.deadline:
+            raise SearchTimeout
+
+        if depth == 0 or not game.allowed_fields:
+            self.leaf_evaluations += 1
+            return self.evaluator.evaluate(game) if self.evaluator is not None else 0
+
+        if self.table is not None:
+            entry = self.table.lookup(game.canonical_hash()[0])
+            if entry is not None and entry[0] >= depth:
+                # the position has already been searched at least as deep - use the result if it decides this node
+                kind, score = entry[1], entry[2]
+                if kind == EXACT or (kind == LOWER_BOUND and score >= beta) or (kind == UPPER_BOUND and score <= alpha):
+                    return score
+
+        next_player = 1 if player_no == 2 else 2
+        original_alpha = alpha
+        best_evaluation = -math.inf
+        best_move = None
+
+        if depth == 1 and self.batched_evaluation:
+            # every child is a leaf - evaluate them all at once, which gives the exact value of the position. The free
+            # fields are iterated in a different order than they are indexed, so they are listed first
+            moves = list(self.candidate_moves(game))
+            evaluations = self.evaluator.child_values(game, moves)
+            best_ind = int(evaluations.argmax())
+            best_evaluation, best_move = int(evaluations[best_ind]), moves[best_ind]
+            self.nodes += len(moves)
+            self.leaf_evaluations += len(moves)
+            kind = EXACT
+        else:
+            evaluator = self.evaluator
+            moves = self.order_moves(game)
+            self.__move_table_move_first(game, moves)
+            for move in moves:
+                points = game.push_move(move, player_no)
+                if evaluator is not None:
+                    evaluator.moved(game, move)
+                # the child is evaluated from the other player's perspective - shift and flip the window accordingly
+                evaluation = points - self.__negamax(game, depth - 1, points - beta, points - alpha, next_player)
+                game.pop_move()
+                if evaluator is not None:
+                    evaluator.unmoved(game, move)
+
+                if evaluation > best_evaluation:
+                    best_evaluation = evaluation
+                    best_move = move
+                    if evaluation > alpha:
+                        alpha = evaluation
+                        if alpha >= beta:
+                            # the other player won't let the game get here - no need to look at the remaining moves
+                            self.cutoffs += 1
+                            break
+
+            if best_evaluation <= original_alpha:
+                kind = UPPER_BOUND
+            elif best_evaluation >= beta:
+                kind = LOWER_BOUND
+            else:
+                kind = EXACT
+
+        if self.table is not None:
+            key, mirrored = game.canonical_hash()
+            if mirrored:
+                best_move = game.geometry.mirror_move(best_move)
+            self.table.store(key, depth, kind, best_evaluation, best_move)
+
+        return best_evaluation
+
+    def __move_table_move_first(self, game, moves: list[list[int]]) -> None:
+        """
+        Moves the best move stored in the transposition table for the current position (if any) to the front.
+        """
+        if self.table is None:
+            return
+        key, mirrored = game.canonical_hash()
+        entry = self.table.entries.get(key)
+        if entry is None or entry[3] is None:
+            return
+
+        table_move = game.geometry.mirror_move(entry[3]) if mirrored else entry[3]
+        if table_move != moves[0] and table_move in moves:
+            moves.remove(table_move)
+            moves.insert(0, table_move)
+
+
+# value of the shared alpha before any top-level move has been evaluated - stands for -inf
+_NO_ALPHA = -2 ** 62
+
+# state of a ParallelRootSearch worker process: the shared alpha, and the last position with its search
+_worker_alpha = None
+_worker_state = None
+
+
+def _init_worker(shared_alpha) -> None:
+    global _worker_alpha
+    _worker_alpha = shared_alpha
+
+
+def _search_root_move(snapshot: tuple[int, int, int, int], move: list[int], depth: int, player_no: int,
+                      deadline: float, table_memory_mb: float | None, use_symmetry: bool,
+                      evaluator) -> tuple[int | None, int]:
+    """
+    Evaluates one top-level move in a worker process of ParallelRootSearch. The position is rebuilt from the snapshot
+    only when it changes, so the worker's transposition table is shared by all the moves it gets for that position.
+    :param deadline: time.time() by which the search has to finish
+    :param evaluator: copy of the evaluator of the search (ThreatEvaluator or learning.LearnedEvaluator), None to
+    search without one
+    :return: evaluation of the move (None if the deadline has passed) and the worker's nodes, leaf evaluations and
+    cutoffs
+    """
+    global _worker_state
+    # imported here - game imports player, which imports this module
+    from game import Triangle
+
+    if _worker_state is None or _worker_state[0] != snapshot:
+        table = TranspositionTable(table_memory_mb) if table_memory_mb is not None else None
+        searcher = AlphaBetaSearch(table=table, use_symmetry=use_symmetry,
+                                   evaluator=evaluator)
+        _worker_state = (snapshot, Triangle.from_snapshot(snapshot), searcher)
+    game, searcher = _worker_state[1], _worker_state[2]
+    if searcher.evaluator is not None:
+        # also brings it back in sync after a search cut off by the deadline
+        searcher.evaluator.reset(game)
+
+    searcher.reset_stats()
+    searcher.deadline = time.perf_counter() + (deadline - time.time())
+    alpha = _worker_alpha.value
+    # evaluations are whole numbers, so with alpha - 1 a move exactly as good as the best one so far still gets its
+    # exact evaluation - needed to pick the same move as the serial search out of equally good ones
+    alpha = -math.inf if alpha == _NO_ALPHA else alpha - 1
+    try:
+        evaluation = searcher.search_move(game, move, depth, player_no, alpha)
+    except SearchTimeout:
+        while game.move_stack:
+            game.pop_move()
+        return None, (searcher.nodes, searcher.leaf_evaluations, searcher.cutoffs)
+
+    # let the other workers know about the better bound
+    with _worker_alpha.get_lock():
+        if evaluation > _worker_alpha.value:
+            _worker_alpha.value = evaluation
+    return evaluation, (searcher.nodes, searcher.leaf_evaluations, searcher.cutoffs)
+
+
+class ParallelRootSearch:
+    """
+    Multi-process version of AlphaBetaSearch - the top-level moves are spread over a pool of worker processes, each
+    of them searching its moves with its own transposition table. Workers get a compact snapshot of the position
+    (Triangle.snapshot) instead of the pickled board, and share the best evaluation found so far through shared memory
+    so that their searches are cut off by it as well.
+
+    Top-level moves are ordered and the results merged exactly like in AlphaBetaSearch, therefore for the same depth
+    both searches pick the same move. The pool is started on first use and kept until close() is called.
+    """
+    workers: int = 1
+    time_budget: float = 0.2
+    max_depth: int | None = None
+    table_memory_mb: float | None = 64
+    use_symmetry: bool = True
+    evaluator: ThreatEvaluator | None = None
+    # statistics of the last search summed over all the workers (see AlphaBetaSearch); the workers' tables are not
+    # counted
+    nodes: int = 0
+    leaf_evaluations: int = 0
+    cutoffs: int = 0
+    table_lookups: int = 0
+    table_hits: int = 0
+    # depth of the deepest completed iteration of the last search
+    depth_reached: int = 0
+
+    def __init__(self, workers: int = None, time_budget: float = 0.2, max_depth: int = None,
+                 table_memory_mb: float | None = 64, use_symmetry: bool = True, evaluator: ThreatEvaluator = None) \
+            -> None:
+        """
+        :param workers: number of worker processes, all CPUs by default
+        :param time_budget: seconds the search may take per move
+        :param max_depth: optional limit for the iterative deepening (number of moves of both players)
+        :param table_memory_mb: memory cap of the transposition table of each worker, None to search without one
+        :param use_symmetry: search only one move of every mirrored pair in symmetric positions
+        :param evaluator: static evaluation of the leaves - each worker searches with a copy of its own
+        """
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.table_memory_mb = table_memory_mb
+        self.use_symmetry = use_symmetry
+        self.evaluator = evaluator
+        self.executor = None
+        self.shared_alpha = None
+        # only used to order the top-level moves the same way as the serial search does
+        self.move_orderer = AlphaBetaSearch(use_symmetry=use_symmetry, evaluator=evaluator)
+
+    def __start_pool(self) -> None:
+        context = multiprocessing.get_context()
+        self.shared_alpha = context.Value('q', _NO_ALPHA)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_init_worker,
+                                            initargs=(self.shared_alpha,))
+
+    def close(self) -> None:
+        """
+        Shuts the worker processes down.
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def search(self, game, player_no: int) -> tuple[list[int] | None, int | float]:
+        """
+        Iterative deepening like in AlphaBetaSearch.search, with every iteration searched by the worker processes.
+        The game itself is not modified.
+        :param game: Triangle class obj
+        :param player_no: number (ID) of the player to move
+        :return: best move found and its evaluation
+        """
+        self.reset_stats()
+        deadline = time.time() + self.time_budget
+
+        moves = self.move_orderer.order_moves(game)
+        if not moves:
+            return None, 0
+
+        best_move, best_evaluation = moves[0], -math.inf
+        # in symmetric positions only half of the moves are searched, but the game still lasts as many moves as there
+        # are free fields
+        free_fields = len(game.allowed_fields)
+        max_depth = free_fields if self.max_depth is None else min(self.max_depth, free_fields)
+        for depth in range(1, max_depth + 1):
+            result = self.search_depth(game, player_no, depth, moves, deadline)
+            if result is None:
+                break
+            best_move, best_evaluation = result
+            self.depth_reached = depth
+
+            # search the best move first in the next iteration
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+
+        return best_move, best_evaluation
+
+    def reset_stats(self) -> None:
+        self.nodes = 0
+        self.leaf_evaluations = 0
+        self.cutoffs = 0
+        self.depth_reached = 0
+
+    def search_depth(self, game, player_no: int, depth: int, moves: list[list[int]] = None,
+                     deadline: float = math.inf) -> tuple[list[int], int] | None:
+        """
+        Searches all top-level moves to the given depth in parallel.
+        :param moves: top-level moves in the order of preference, ordered like in AlphaBetaSearch by default
+        :param deadline: time.time() by which the search has to finish
+        :return: best move and its evaluation, None if the deadline passed
+        """
+        if self.executor is None:
+            self.__start_pool()
+        if moves is None:
+            moves = self.move_orderer.order_moves(game)
+
+        snapshot = game.snapshot()
+        self.shared_alpha.value = _NO_ALPHA
+        futures = [self.executor.submit(_search_root_move, snapshot, move, depth, player_no, deadline,
+                                        self.table_memory_mb, self.use_symmetry, self.evaluator)
+                   for move in moves]
+
+        timed_out = False
+        best_move, best_evaluation = None, -math.inf
+        for move, future in zip(moves, futures):
+            evaluation, (nodes, leaf_evaluations, cutoffs) = future.result()
+            self.nodes += nodes
+            self.leaf_evaluations += leaf_evaluations
+            self.cutoffs += cutoffs
+            if evaluation is None:
+                timed_out = True
+            # strictly better only - out of equally good moves the one ordered first wins, as in the serial search
+            elif evaluation > best_evaluation:
+                best_move, best_evaluation = move, evaluation
+
+        return None if timed_out else (best_move, best_evaluation)
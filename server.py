@@ -0,0 +1,502 @@
+import argparse
+import asyncio
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from game import Triangle
+from player import Player, RandomComputerPlayer, AIComputerPlayer
+
+
+PROTOCOL_VERSION = 1
+OPPONENTS = ("human", "random", "ai")
+
+# a command is a few short words, anything longer is a broken (or malicious) client
+MAX_LINE_BYTES = 128
+# clients that don't read their messages are disconnected once this much output is waiting for them
+MAX_WRITE_BUFFER = 64 * 1024
+MAX_GAMES_PER_CONNECTION = 16
+MAX_WIDTH = 101
+
+# the AI player lives in the executor's worker process - one per process rather than one per game, so that the memory
+# taken by the transposition table and the endgame solver's memo doesn't grow with the number of games
+_process_player = None
+
+
+def _ai_move(snapshot: tuple[int, int, int, int], player_no: int, settings: dict) -> list[int]:
+    """
+    Runs in an executor process, so the searches don't hold up the event loop.
+    :param snapshot: Triangle.snapshot() of the game
+    :param settings: keyword arguments of the AIComputerPlayer (see ServerAIPlayer.settings)
+    """
+    global _process_player
+    if _process_player is None:
+        _process_player = AIComputerPlayer(player_no, search="alphabeta", **settings)
+    return _process_player.select_move(Triangle.from_snapshot(snapshot), player_no)
+
+
+class ServerAIPlayer(Player):
+    """
+    Marks the seat of the server's AI player. It holds no search state - the moves are worked out by the AI players
+    of the executor processes - so a single instance is shared by all the games.
+    """
+    # keyword arguments of the AIComputerPlayer the moves are searched with
+    settings: dict
+
+    def __init__(self, time_budget: float = 0.2, table_memory_mb: float | None = 16, endgame_threshold: int | None = 14,
+                 endgame_time_budget: float = 0.2) -> None:
+        self.name = "OliverAI"
+        self.settings = {'time_budget': time_budget, 'table_memory_mb': table_memory_mb,
+                         'endgame_threshold': endgame_threshold, 'endgame_time_budget': endgame_time_budget}
+
+    def select_move(self, game, player_no: int) -> list[int]:
+        # the server runs _ai_move in its executor instead - this searches in the calling process
+        return _ai_move(game.snapshot(), player_no, self.settings)
+
+
+class Connection:
+    """
+    A client connected to the server. Output is written without waiting for the client to read it, but a client that
+    falls behind by more than MAX_WRITE_BUFFER bytes is disconnected, so memory per connection stays bounded.
+    """
+    __slots__ = ('reader', 'writer', 'name', 'games', 'closed')
+
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    name: str
+    # ids of the games the connection takes part in
+    games: set[int]
+    closed: bool
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, name: str) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.name = name
+        self.games = set()
+        self.closed = False
+
+    def send(self, line: str) -> None:
+        if self.closed:
+            return
+        if self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            self.close()
+            return
+        self.writer.write(line.encode() + b"\n")
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.writer.close()
+
+
+class ServerGame:
+    """
+    A game hosted by the server. Seats hold either a Connection (a remote human player) or a Player playing in-process.
+    """
+    __slots__ = ('game_id', 'game', 'seats', 'player_turn', 'ai_thinking')
+
+    game_id: int
+    game: Triangle
+    # player number -> Connection / Player / None (waiting for someone to join)
+    seats: dict[int, Connection | Player | None]
+    player_turn: int
+    # the in-process player's move is being worked out
+    ai_thinking: bool
+
+    def __init__(self, game_id: int, width: int, creator: Connection) -> None:
+        self.game_id = game_id
+        self.game = Triangle(width)
+        self.seats = {1: creator, 2: None}
+        self.player_turn = 1
+        self.ai_thinking = False
+
+    def connections(self) -> list[Connection]:
+        return [seat for seat in self.seats.values() if isinstance(seat, Connection)]
+
+    def broadcast(self, line: str) -> None:
+        for connection in self.connections():
+            connection.send(line)
+
+    def board_str(self) -> str:
+        """
+        Playable fields of every row ("O" - free, "0" - filled, "X" - crossed) with rows separated by "/".
+        """
+        return self.game.board_string()
+
+
+class GameServer:
+    """
+    Hosts any number of concurrent games over a line-based TCP protocol. Every line is a command or a message - words
+    separated by spaces.
+
+    Client -> server:
+        NAME <name>                     - set the name shown to other players
+        NEW <width> human|random|ai     - create a game as player 1 (moves first)
+        LIST                            - games waiting for a second human player
+        JOIN <game id>                  - join a waiting game as player 2
+        MOVE <game id> <row> <col>      - make a move
+        BOARD <game id>                 - current board
+        LEAVE <game id>                 - give up the game
+        QUIT                            - disconnect
+    Server -> client:
+        HELLO triangle <version>
+        GAME <game id> <player number> <width>
+        START <game id> <player 1 name> <player 2 name>
+        TURN <game id> <player number>
+        MOVED <game id> <player number> <row> <col> <points gained> <p1 points> <p2 points>
+        BOARD <game id> <p1 points> <p2 points> <player to move> <rows>
+        OPEN <game id>:<width> ...
+        END <game id> <p1 points> <p2 points> 1|2|0 (draw)|abandoned
+        ERR <message>
+
+    Random players move right away in the event loop; AI searches run in a process pool, so the server keeps serving
+    other games in the meantime.
+    """
+    host: str = "127.0.0.1"
+    port: int = 0
+    games: dict[int, ServerGame]
+    # games waiting for the second human player
+    open_games: dict[int, ServerGame]
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, ai_workers: int = 2, ai_time_budget: float = 0.2,
+                 ai_table_memory_mb: float = 16, ai_endgame_threshold: int | None = 14,
+                 ai_endgame_time_budget: float = 0.2, max_width: int = MAX_WIDTH,
+                 max_games_per_connection: int = MAX_GAMES_PER_CONNECTION) -> None:
+        """
+        :param port: port to listen on, 0 - any free port (see self.port once started)
+        :param ai_workers: number of processes running AI searches (at most that many searches at a time)
+        :param ai_time_budget: seconds per AI move
+        :param ai_table_memory_mb: memory cap of the transposition table of each AI process
+        :param ai_endgame_threshold: free fields up to which the AI solves the positions exactly (see endgame.py), None
+        to never solve them - the solver's memo takes up to 256 MB per process
+        :param ai_endgame_time_budget: seconds the AI may spend solving a position, on top of ai_time_budget if it fails
+        """
+        self.host = host
+        self.port = port
+        self.ai_player = ServerAIPlayer(ai_time_budget, ai_table_memory_mb, ai_endgame_threshold,
+                                        ai_endgame_time_budget)
+        self.max_width = max_width
+        self.max_games_per_connection = max_games_per_connection
+        self.ai_workers = ai_workers
+        self.executor = ProcessPoolExecutor(max_workers=ai_workers)
+        self.games = {}
+        self.open_games = {}
+        self.game_ids = itertools.count(1)
+        self.connection_ids = itertools.count(1)
+        # keeps references to the running computer moves, otherwise the tasks could be garbage collected
+        self.tasks = set()
+        self.connections = set()
+        self.connection_tasks = set()
+        self.server = None
+        self.moves_played = 0
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port, limit=MAX_LINE_BYTES)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            for connection in list(self.connections):
+                connection.close()
+            # let the connection handlers see the closed connections and finish
+            await asyncio.gather(*self.connection_tasks, return_exceptions=True)
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        connection = Connection(reader, writer, "Player" + str(next(self.connection_ids)))
+        connection.send("HELLO triangle " + str(PROTOCOL_VERSION))
+        self.connections.add(connection)
+        self.connection_tasks.add(asyncio.current_task())
+        try:
+            while not connection.closed:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # the line didn't fit into the reader's buffer
+                    connection.send("ERR Line too long.")
+                    break
+                if not line:
+                    break
+                words = line.decode(errors="replace").split()
+                if not words:
+                    continue
+                if words[0].upper() == "QUIT":
+                    break
+                self.handle_command(connection, words)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for game_id in list(connection.games):
+                self.abandon(game_id)
+            connection.close()
+            self.connections.discard(connection)
+            self.connection_tasks.discard(asyncio.current_task())
+
+    def handle_command(self, connection: Connection, words: list[str]) -> None:
+        command = words[0].upper()
+        handlers = {
+            "NAME": self.command_name,
+            "NEW": self.command_new,
+            "LIST": self.command_list,
+            "JOIN": self.command_join,
+            "MOVE": self.command_move,
+            "BOARD": self.command_board,
+            "LEAVE": self.command_leave
+        }
+        if command not in handlers:
+            connection.send("ERR Unknown command " + command + ".")
+            return
+
+        try:
+            handlers[command](connection, words[1:])
+        except ValueError as error:
+            connection.send("ERR " + str(error))
+
+    def get_game(self, connection: Connection, game_id: str) -> ServerGame:
+        if not game_id.isdigit() or int(game_id) not in connection.games:
+            raise ValueError("Not a game of yours: " + game_id + ".")
+        return self.games[int(game_id)]
+
+    def command_name(self, connection: Connection, args: list[str]) -> None:
+        if len(args) != 1 or len(args[0]) > 32:
+            raise ValueError("Usage: NAME <name> (up to 32 characters).")
+        connection.name = args[0]
+
+    def command_new(self, connection: Connection, args: list[str]) -> None:
+        if len(args) != 2 or not args[0].isdigit() or args[1] not in OPPONENTS:
+            raise ValueError("Usage: NEW <width> " + "|".join(OPPONENTS) + ".")
+        width = int(args[0])
+        if not width % 2 or width > self.max_width:
+            raise ValueError("The width must be an odd number up to " + str(self.max_width) + ".")
+        if len(connection.games) >= self.max_games_per_connection:
+            raise ValueError("Too many games (" + str(self.max_games_per_connection) + " at most).")
+
+        server_game = ServerGame(next(self.game_ids), width, connection)
+        self.games[server_game.game_id] = server_game
+        connection.games.add(server_game.game_id)
+        connection.send("GAME " + str(server_game.game_id) + " 1 " + str(width))
+
+        if args[1] == "human":
+            self.open_games[server_game.game_id] = server_game
+        else:
+            if args[1] == "random":
+                server_game.seats[2] = RandomComputerPlayer(2)
+            else:
+                server_game.seats[2] = self.ai_player
+            self.start_game(server_game)
+
+    def command_list(self, connection: Connection, args: list[str]) -> None:
+        # the list is capped to keep the line short
+        open_games = itertools.islice(self.open_games.values(), 50)
+        connection.send(" ".join(["OPEN"] + [str(server_game.game_id) + ":" + str(server_game.game.width)
+                                             for server_game in open_games]))
+
+    def command_join(self, connection: Connection, args: list[str]) -> None:
+        if len(args) != 1 or not args[0].isdigit() or int(args[0]) not in self.open_games:
+            raise ValueError("No such game waiting for a player.")
+        server_game = self.open_games[int(args[0])]
+        if server_game.seats[1] is connection:
+            raise ValueError("You can't join your own game.")
+        if len(connection.games) >= self.max_games_per_connection:
+            raise ValueError("Too many games (" + str(self.max_games_per_connection) + " at most).")
+
+        del self.open_games[server_game.game_id]
+        server_game.seats[2] = connection
+        connection.games.add(server_game.game_id)
+        connection.send("GAME " + str(server_game.game_id) + " 2 " + str(server_game.game.width))
+        self.start_game(server_game)
+
+    def command_move(self, connection: Connection, args: list[str]) -> None:
+        if len(args) != 3 or not args[1].isdigit() or not args[2].isdigit():
+            raise ValueError("Usage: MOVE <game id> <row> <col>.")
+        server_game = self.get_game(connection, args[0])
+        if server_game.seats[2] is None:
+            raise ValueError("The game hasn't started yet.")
+        if server_game.seats[server_game.player_turn] is not connection:
+            raise ValueError("Not your turn.")
+        coordinates = [int(args[1]), int(args[2])]
+        if coordinates not in server_game.game.allowed_fields:
+            raise ValueError("The field coordinates do not match any allowed field.")
+        self.play_move(server_game, coordinates)
+
+    def command_board(self, connection: Connection, args: list[str]) -> None:
+        if len(args) != 1:
+            raise ValueError("Usage: BOARD <game id>.")
+        server_game = self.get_game(connection, args[0])
+        connection.send(" ".join(("BOARD", str(server_game.game_id), str(server_game.game.p1),
+                                  str(server_game.game.p2), str(server_game.player_turn), server_game.board_str())))
+
+    def command_leave(self, connection: Connection, args: list[str]) -> None:
+        if len(args) != 1:
+            raise ValueError("Usage: LEAVE <game id>.")
+        self.abandon(self.get_game(connection, args[0]).game_id)
+
+    def start_game(self, server_game: ServerGame) -> None:
+        server_game.broadcast(" ".join(("START", str(server_game.game_id), server_game.seats[1].name,
+                                        server_game.seats[2].name)))
+        self.next_turn(server_game)
+
+    def next_turn(self, server_game: ServerGame) -> None:
+        server_game.broadcast("TURN " + str(server_game.game_id) + " " + str(server_game.player_turn))
+        if isinstance(server_game.seats[server_game.player_turn], Player):
+            task = asyncio.get_running_loop().create_task(self.play_computer_move(server_game))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def play_computer_move(self, server_game: ServerGame) -> None:
+        player = server_game.seats[server_game.player_turn]
+        if isinstance(player, ServerAIPlayer):
+            server_game.ai_thinking = True
+            try:
+                coordinates = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, _ai_move, server_game.game.snapshot(), server_game.player_turn, player.settings)
+            except Exception as error:
+                if isinstance(error, BrokenProcessPool):
+                    # a worker process died - the pool can't take any more searches, so the next games get a new one
+                    self.executor.shutdown(wait=False)
+                    self.executor = ProcessPoolExecutor(max_workers=self.ai_workers)
+                # the AI can't move, so the game can't go on
+                if self.games.get(server_game.game_id) is server_game:
+                    server_game.broadcast("ERR The AI player failed: " + type(error).__name__ + ".")
+                    self.end_game(server_game, "abandoned")
+                return
+            finally:
+                server_game.ai_thinking = False
+        else:
+            coordinates = player.select_move(server_game.game, server_game.player_turn)
+
+        # the game could have been abandoned in the meantime
+        if self.games.get(server_game.game_id) is server_game:
+            self.play_move(server_game, coordinates)
+
+    def play_move(self, server_game: ServerGame, coordinates: list[int]) -> None:
+        game = server_game.game
+        player_no = server_game.player_turn
+        game.make_move(coordinates)
+        previous_points = game.p1 if player_no == 1 else game.p2
+        total_points = game.check_if_combo(coordinates, player_no)[0]
+        self.moves_played += 1
+        server_game.broadcast(" ".join(str(word) for word in (
+            "MOVED", server_game.game_id, player_no, coordinates[0], coordinates[1], total_points - previous_points,
+            game.p1, game.p2)))
+
+        if game.is_end():
+            if game.p1 > game.p2:
+                winner = "1"
+            elif game.p2 > game.p1:
+                winner = "2"
+            else:
+                winner = "0"
+            self.end_game(server_game, winner)
+        else:
+            # alternate player numbers
+            server_game.player_turn = 1 if player_no == 2 else 2
+            self.next_turn(server_game)
+
+    def abandon(self, game_id: int) -> None:
+        if game_id in self.games:
+            self.end_game(self.games[game_id], "abandoned")
+
+    def end_game(self, server_game: ServerGame, result: str) -> None:
+        server_game.broadcast(" ".join(("END", str(server_game.game_id), str(server_game.game.p1),
+                                        str(server_game.game.p2), result)))
+        for connection in server_game.connections():
+            connection.games.discard(server_game.game_id)
+        del self.games[server_game.game_id]
+        self.open_games.pop(server_game.game_id, None)
+
+
+class LineClient:
+    """
+    Minimal client for the server's protocol - e.g. for testing it over the loopback interface.
+    """
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host: str = "127.0.0.1", port: int = 7777) -> "LineClient":
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def send(self, line: str) -> None:
+        self.writer.write(line.encode() + b"\n")
+        await self.writer.drain()
+
+    async def receive(self) -> list[str]:
+        """
+        :return: words of the next line from the server, an empty list once the connection is closed
+        """
+        return (await self.reader.readline()).decode().split()
+
+    async def receive_until(self, *message_types: str) -> list[str]:
+        """
+        Skips lines until one of the given types (first word) arrives.
+        """
+        while True:
+            words = await self.receive()
+            if not words or words[0] in message_types:
+                return words
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def play_in_terminal(host: str, port: int, width: int, opponent: str) -> None:
+    """
+    Plays a game against the server's random or AI player, reading moves from the keyboard.
+    """
+    client = await LineClient.connect(host, port)
+    await client.send("NEW " + str(width) + " " + opponent)
+    game_id = (await client.receive_until("GAME", "ERR"))[1]
+    while True:
+        words = await client.receive_until("TURN", "MOVED", "END", "ERR")
+        if not words or words[0] == "END":
+            print(" ".join(words))
+            break
+        elif words[0] == "MOVED" or words[0] == "ERR":
+            print(" ".join(words))
+        elif words[1] == game_id and words[2] == "1":
+            await client.send("BOARD " + game_id)
+            print("\n".join((await client.receive_until("BOARD"))[5].split("/")))
+            move = await asyncio.get_running_loop().run_in_executor(None, input, "Your move (row col): ")
+            await client.send("MOVE " + game_id + " " + move)
+    await client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Triangle game server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--ai-workers", type=int, default=2, help="processes running AI searches")
+    parser.add_argument("--ai-time-budget", type=float, default=0.2, help="seconds per AI move")
+    parser.add_argument("--ai-endgame-threshold", type=int, default=14,
+                        help="free fields up to which the AI solves positions exactly, 0 to never solve them")
+    parser.add_argument("--ai-endgame-time-budget", type=float, default=0.2,
+                        help="seconds the AI may spend solving a position")
+    parser.add_argument("--client", choices=("random", "ai"),
+                        help="instead of serving, connect to a server and play against its random or AI player")
+    parser.add_argument("--width", type=int, default=11, help="board width for --client")
+    args = parser.parse_args()
+
+    if args.client:
+        asyncio.run(play_in_terminal(args.host, args.port, args.width, args.client))
+    else:
+        game_server = GameServer(args.host, args.port, ai_workers=args.ai_workers, ai_time_budget=args.ai_time_budget,
+                                 ai_endgame_threshold=args.ai_endgame_threshold or None,
+                                 ai_endgame_time_budget=args.ai_endgame_time_budget)
+        print("Serving on " + args.host + ":" + str(args.port))
+        asyncio.run(game_server.serve_forever())
@@ -0,0 +1,121 @@
+from typing import Callable
+
+from game import Triangle
+from large_board import new_board
+from player import Player
+from records import GameRecordWriter
+
+
+class GameResult:
+    """
+    Outcome of a finished game.
+    """
+    width: int = 0
+    # (player number, [row, col]) for every move in the order they were made
+    moves: list[tuple[int, list[int]]]
+    p1: int = 0
+    p2: int = 0
+    # 1 or 2, None for a draw
+    winner: int | None = None
+
+    def __init__(self, width: int, moves: list[tuple[int, list[int]]], p1: int, p2: int) -> None:
+        self.width = width
+        self.moves = moves
+        self.p1 = p1
+        self.p2 = p2
+        if p1 > p2:
+            self.winner = 1
+        elif p2 > p1:
+            self.winner = 2
+        else:
+            self.winner = None
+
+
+class GameSession:
+    """
+    Runs a game between two players without any input(), print() or sleep() - each player is only asked for its move
+    through Player.select_move, so any move source (random, AI, scripted, a human behind some other interface) can
+    be plugged in. Meant for running large numbers of bot-vs-bot games.
+    """
+    player1: Player
+    player2: Player
+    game: Triangle
+    # number of the player to make the next move
+    player_turn: int = 1
+    moves: list[tuple[int, list[int]]]
+    # finished games are appended to it if given
+    recorder: GameRecordWriter | None = None
+    # called with the player, its number and the coordinates after every move
+    on_move: Callable[[Player, int, list[int]], None] | None = None
+
+    def __init__(self, player1: Player, player2: Player, width: int, first_player: int = 1,
+                 recorder: GameRecordWriter = None, on_move: Callable[[Player, int, list[int]], None] = None) -> None:
+        """
+        :param player1: player number 1
+        :param player2: player number 2
+        :param width: width of the board - odd integer number
+        :param first_player: number of the player that makes the first move
+        :param recorder: writer the game is recorded with once it's over
+        :param on_move: called after every move with the player that made it, its number and the coordinates - e.g.
+        to show the move or the player's stats
+        """
+        if first_player not in (1, 2):
+            raise ValueError("The first player must be either 1 or 2. Got " + str(first_player) + " instead.")
+
+        self.player1 = player1
+        self.player2 = player2
+        # LargeTriangle for very wide boards
+        self.game = new_board(width)
+        self.player_turn = first_player
+        self.moves = []
+        self.recorder = recorder
+        self.on_move = on_move
+
+    def close(self) -> None:
+        """
+        Closes both players - for games played step by step, run() does it itself.
+        """
+        self.player1.close()
+        self.player2.close()
+
+    def is_over(self) -> bool:
+        return self.game.is_end()
+
+    def step(self) -> list[int]:
+        """
+        Asks the player to move for its move and plays it.
+        :return: coordinates of the move
+        """
+        player = self.player1 if self.player_turn == 1 else self.player2
+        coordinates = player.select_move(self.game, self.player_turn)
+        if coordinates not in self.game.allowed_fields:
+            raise ValueError("Player " + str(self.player_turn) + " (" + player.name + ") chose a field that is not "
+                             "allowed: " + str(coordinates))
+
+        self.game.make_move(coordinates)
+        self.game.check_if_combo(coordinates, self.player_turn)
+        self.moves.append((self.player_turn, coordinates))
+        if self.on_move is not None:
+            self.on_move(player, self.player_turn, coordinates)
+
+        # alternate player numbers
+        self.player_turn = 1 if self.player_turn == 2 else 2
+        return coordinates
+
+    def run(self) -> GameResult:
+        """
+        Plays the game until all fields are filled up. The players are closed afterwards (see Player.close).
+        :return: GameResult obj
+        """
+        try:
+            while not self.game.is_end():
+                self.step()
+        finally:
+            self.close()
+
+        self.player1.points = self.game.p1
+        self.player2.points = self.game.p2
+        result = GameResult(self.game.width, self.moves, self.game.p1, self.game.p2)
+        if self.recorder is not None:
+            self.recorder.write_result(result, self.player1, self.player2)
+        return result
@@ -0,0 +1,51 @@
+import math
+import random
+import unittest
+
+import numpy as np
+
+from batch import BatchSimulator
+from geometry import get_geometry
+from player import RandomComputerPlayer, ScriptedPlayer
+from session import GameSession
+
+
+class BatchSimulatorTest(unittest.TestCase):
+    """
+    The batch simulator has to score games the same way GameSession plays them.
+    """
+
+    def test_scores_match_replayed_games(self) -> None:
+        rng = random.Random(1)
+        for width in (5, 9, 15):
+            simulator = BatchSimulator(width)
+            fields = simulator.field_count
+            for game_no in range(5):
+                order = list(range(fields))
+                rng.shuffle(order)
+                move_numbers = np.empty((1, fields), dtype=simulator.move_dtype)
+                move_numbers[0, order] = np.arange(fields)
+                p1_scores, p2_scores = simulator.scores(move_numbers)
+
+                # the same fields in the same order, played out by two scripted players
+                moves = [list(get_geometry(width).fields[field_ind]) for field_ind in order]
+                result = GameSession(ScriptedPlayer(moves[0::2]), ScriptedPlayer(moves[1::2]), width).run()
+                self.assertEqual((int(p1_scores[0]), int(p2_scores[0])), (result.p1, result.p2))
+
+    def test_statistics_match_random_games(self) -> None:
+        width = 7
+        games = 2000
+        session_scores = np.array([GameSession(RandomComputerPlayer(1, seed=seed),
+                                               RandomComputerPlayer(2, seed=games + seed), width).run().p1
+                                   for seed in range(games)])
+        stats = BatchSimulator(width, seed=0).simulate(20 * games)
+        self.assertEqual(stats.games, 20 * games)
+        # every line gets crossed off by someone, so the points of the players always add up to the same total
+        self.assertEqual(len(set((stats.p1_scores + stats.p2_scores).tolist())), 1)
+        # the mean scores agree within a few standard errors
+        standard_error = math.sqrt(session_scores.var() / games + stats.p1_scores.var() / stats.games)
+        self.assertLess(abs(session_scores.mean() - stats.p1_scores.mean()), 4 * standard_error)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+
+from book import OpeningBook, book_path, build_book, get_book, write_book
+from game import Triangle
+
+
+class OpeningBookTest(unittest.TestCase):
+    """
+    Books are built and written to a temporary directory, and every position put in them is looked up again.
+    """
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.width, self.plies = 7, 2
+        self.positions = build_book(self.width, self.plies, depth=2)
+        self.path = book_path(self.directory.name, self.width)
+        write_book(self.path, self.width, self.plies, self.positions)
+        self.book = OpeningBook(self.path)
+
+    def tearDown(self) -> None:
+        self.book.close()
+        self.directory.cleanup()
+
+    def test_lookup_returns_the_stored_moves(self) -> None:
+        self.assertEqual((self.book.width, self.book.plies, len(self.book)),
+                         (self.width, self.plies, len(self.positions)))
+
+        game = Triangle(self.width)
+        move, evaluation = self.book.lookup(game)
+        key, mirrored = game.canonical_key()
+        self.assertEqual((move if not mirrored else game.geometry.mirror_move(move), evaluation), self.positions[key])
+
+        # the replies to every first move - a position and its mirror image share the entry
+        found = 0
+        for first_move in list(game.allowed_fields):
+            game.push_move(first_move, 1)
+            entry = self.book.lookup(game)
+            key, mirrored = game.canonical_key()
+            if key in self.positions:
+                found += 1
+                stored_move, stored_evaluation = self.positions[key]
+                self.assertEqual(entry, (game.geometry.mirror_move(stored_move) if mirrored else stored_move,
+                                         stored_evaluation))
+                self.assertIn(entry[0], game.allowed_fields)
+
+                mirror = Triangle(self.width)
+                mirrored_first_move = game.geometry.mirror_move(first_move)
+                mirror.push_move(mirrored_first_move, 1)
+                # a symmetric position is its own mirror image and gets the same answer
+                expected = entry[0] if mirrored_first_move == first_move else game.geometry.mirror_move(entry[0])
+                self.assertEqual(self.book.lookup(mirror)[0], expected)
+            else:
+                self.assertIsNone(entry)
+            game.pop_move()
+        self.assertEqual(found, len(game.allowed_fields))
+
+    def test_positions_outside_the_book(self) -> None:
+        game = Triangle(self.width)
+        for move in ([4, 1], [4, 7], [3, 3]):
+            game.push_move(move, 1)
+        # deeper than the book goes
+        self.assertIsNone(self.book.lookup(game))
+        # other widths
+        self.assertIsNone(self.book.lookup(Triangle(9)))
+        self.assertIsNone(get_book(self.directory.name, 9))
+
+    def test_files_that_are_not_books_are_rejected(self) -> None:
+        path = os.path.join(self.directory.name, "book_5.bin")
+        with open(path, "wb") as book_file:
+            book_file.write(b"not a book at all, but long enough")
+        with self.assertRaises(ValueError):
+            OpeningBook(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
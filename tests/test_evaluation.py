@@ -0,0 +1,104 @@
+import random
+import unittest
+
+import evaluation
+from evaluation import ThreatEvaluator
+from game import Triangle
+from large_board import LargeTriangle
+from search import AlphaBetaSearch
+
+
+def reference_evaluation(game: Triangle) -> int:
+    """
+    ThreatEvaluator.evaluate computed from scratch: the best score of a free field that completes at least one line.
+    """
+    best = 0
+    for row, col in game.allowed_fields:
+        line_ids = game.geometry.field_lines[(row - 1, col - 1)]
+        score = 0
+        for line_id in line_ids:
+            if game.line_remaining[line_id] == 1:
+                score += game.geometry.line_lengths[line_id]
+            elif game.line_remaining[line_id] == 2:
+                score -= game.geometry.line_lengths[line_id]
+        if any(game.line_remaining[line_id] == 1 for line_id in line_ids):
+            best = max(best, score)
+    return best
+
+
+class ThreatEvaluatorTest(unittest.TestCase):
+    """
+    The evaluator fills in the field sums of the lines lazily and scores long move lists sparsely - both have to give
+    the same results as the straightforward computation, on the small and on the large boards.
+    """
+
+    def test_incremental_evaluation_and_sparse_scoring(self) -> None:
+        rng = random.Random(3)
+        for board_class, width in ((Triangle, 9), (Triangle, 15), (LargeTriangle, 21)):
+            for game_no in range(3):
+                game = board_class(width)
+                for move_no in range(rng.randrange(len(game.allowed_fields))):
+                    game.push_move(list(rng.choice(game.allowed_fields)), 1)
+                evaluator = ThreatEvaluator()
+                evaluator.reset(game)
+                moves = []
+                for step in range(150):
+                    if moves and (rng.random() < 0.45 or not game.allowed_fields):
+                        move = moves.pop()
+                        game.pop_move()
+                        evaluator.unmoved(game, move)
+                    elif game.allowed_fields:
+                        move = list(rng.choice(game.allowed_fields))
+                        game.push_move(move, 1)
+                        evaluator.moved(game, move)
+                        moves.append(move)
+                    self.assertEqual(evaluator.evaluate(game), reference_evaluation(game))
+
+                    free_fields = list(game.allowed_fields)
+                    dense_scores = ThreatEvaluator.score_moves(game, free_fields)
+                    sparse_threshold = evaluation.SPARSE_SCORING_MOVES
+                    evaluation.SPARSE_SCORING_MOVES = -1
+                    try:
+                        sparse_scores = ThreatEvaluator.score_moves(game, free_fields)
+                    finally:
+                        evaluation.SPARSE_SCORING_MOVES = sparse_threshold
+                    self.assertEqual(sparse_scores, dense_scores)
+
+    def test_move_scores_are_points_gained_minus_points_handed_over(self) -> None:
+        rng = random.Random(5)
+        for game_no in range(5):
+            game = Triangle(11)
+            for move_no in range(rng.randrange(10, len(game.allowed_fields) - 1)):
+                game.push_move(list(rng.choice(game.allowed_fields)), 1)
+            moves = list(game.allowed_fields)
+            for move, score in zip(moves, ThreatEvaluator.score_moves(game, moves)):
+                points = game.move_points(move)
+                game.push_move(move, 1)
+                # lines the move leaves with a single free field - the other player completes them
+                handed_over = sum(game.geometry.line_lengths[line_id]
+                                  for line_id in game.geometry.field_lines[(move[0] - 1, move[1] - 1)]
+                                  if game.line_remaining[line_id] == 1)
+                game.pop_move()
+                self.assertEqual(score, points - handed_over)
+
+    def test_leaves_of_the_search_get_the_evaluation(self) -> None:
+        rng = random.Random(8)
+        for game_no in range(5):
+            game = Triangle(9)
+            for move_no in range(rng.randrange(5, len(game.allowed_fields) - 1)):
+                game.push_move(list(rng.choice(game.allowed_fields)), 1)
+            # one ply deep: the points of the move minus what the other player can net after it
+            expected = -float("inf")
+            for move in list(game.allowed_fields):
+                points = game.move_points(move)
+                game.push_move(move, 1)
+                expected = max(expected, points - reference_evaluation(game))
+                game.pop_move()
+            searcher = AlphaBetaSearch(time_budget=60, max_depth=1, evaluator=ThreatEvaluator())
+            move, evaluation = searcher.search(game, 1)
+            self.assertEqual(evaluation, expected)
+            self.assertIn(move, game.allowed_fields)
+
+
+if __name__ == "__main__":
+    unittest.main()
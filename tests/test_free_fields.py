@@ -0,0 +1,72 @@
+import random
+import unittest
+
+from free_fields import FreeFields
+from geometry import get_geometry
+
+
+class FreeFieldsTest(unittest.TestCase):
+    """
+    Random removals and restores, with both structures checked against a plain set of the free fields after every step.
+    """
+
+    def assert_consistent(self, free_fields: FreeFields, expected: set[int]) -> None:
+        geometry = free_fields.geometry
+        field_count = len(geometry.fields)
+        self.assertEqual(sorted(free_fields.dense), sorted(expected))
+        for field_ind in range(field_count):
+            position = free_fields.positions[field_ind]
+            if field_ind in expected:
+                self.assertEqual(free_fields.dense[position], field_ind)
+                self.assertIn(geometry.fields[field_ind], free_fields)
+            else:
+                self.assertEqual(position, -1)
+                self.assertNotIn(geometry.fields[field_ind], free_fields)
+        # the linked list goes through the free fields in the row-by-row order, both ways
+        forward = [geometry.field_index[tuple(field)] for field in free_fields]
+        self.assertEqual(forward, sorted(expected))
+        backward = []
+        field_ind = free_fields.previous_field[field_count]
+        while field_ind != field_count:
+            backward.append(field_ind)
+            field_ind = free_fields.previous_field[field_ind]
+        self.assertEqual(backward, forward[::-1])
+
+    def test_push_and_pop_keep_the_structures_consistent(self) -> None:
+        rng = random.Random(3)
+        geometry = get_geometry(9)
+        free_fields = FreeFields(geometry)
+        expected = set(range(len(geometry.fields)))
+        self.assert_consistent(free_fields, expected)
+
+        # (field index, position) of the removals that haven't been taken back, like a move stack
+        stack = []
+        for _ in range(300):
+            if stack and (not expected or rng.random() < 0.4):
+                field_ind, position = stack.pop()
+                free_fields.restore(geometry.fields[field_ind], position)
+                expected.add(field_ind)
+            else:
+                field_ind = free_fields.dense[rng.randrange(len(free_fields))]
+                stack.append((field_ind, free_fields.remove(geometry.fields[field_ind])))
+                expected.discard(field_ind)
+            self.assert_consistent(free_fields, expected)
+
+        # taking everything back restores the dense array exactly
+        while stack:
+            field_ind, position = stack.pop()
+            free_fields.restore(geometry.fields[field_ind], position)
+        self.assertEqual(list(free_fields.dense), list(range(len(geometry.fields))))
+
+    def test_removing_a_filled_field_fails(self) -> None:
+        free_fields = FreeFields(get_geometry(5))
+        free_fields.remove([2, 2])
+        with self.assertRaises(ValueError):
+            free_fields.remove([2, 2])
+        with self.assertRaises(ValueError):
+            free_fields.remove([9, 9])
+        self.assertEqual(len(free_fields), len(get_geometry(5).fields) - 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
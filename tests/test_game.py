@@ -0,0 +1,44 @@
+import unittest
+
+from game import Triangle
+from large_board import LargeTriangle
+
+
+class TriangleStateTest(unittest.TestCase):
+    """
+    Every board keeps the state of its own game only - everything that depends on the width alone is shared.
+    """
+
+    def test_boards_of_the_same_width_share_the_geometry_only(self) -> None:
+        first, second = Triangle(7), Triangle(7)
+        self.assertIs(first.geometry, second.geometry)
+        self.assertFalse(hasattr(first, "__dict__"))
+
+        first.push_move([4, 1], 1)
+        self.assertEqual(second.board, Triangle(7).board)
+        self.assertEqual(len(second.allowed_fields), 16)
+        self.assertEqual(second.line_remaining, list(second.geometry.line_lengths))
+        self.assertEqual((second.move_stack, second.position_hash, second.p1), ([], 0, 0))
+        self.assertEqual(first.geometry.board_template, Triangle(7).geometry.board_template)
+
+    def test_clone_is_independent(self) -> None:
+        for game in (Triangle(9), LargeTriangle(9)):
+            game.push_move([5, 1], 1)
+            clone = game.clone()
+            clone.push_move([5, 2], 2)
+            clone.push_move([5, 3], 1)
+
+            self.assertEqual(len(game.allowed_fields), 24)
+            self.assertEqual(len(clone.allowed_fields), 22)
+            self.assertNotEqual(game.position_hash, clone.position_hash)
+            self.assertEqual(game.snapshot(), type(game).from_snapshot(game.snapshot()).snapshot())
+            # the clone can be taken back to the original position
+            clone.pop_move()
+            clone.pop_move()
+            self.assertEqual(clone.snapshot(), game.snapshot())
+            self.assertEqual(clone.position_hash, game.position_hash)
+            self.assertEqual(list(clone.line_remaining), list(game.line_remaining))
+
+
+if __name__ == "__main__":
+    unittest.main()
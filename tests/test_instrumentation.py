@@ -0,0 +1,34 @@
+import io
+import json
+import unittest
+
+from game import Triangle
+from player import AIComputerPlayer
+
+
+class EndgameStatsTest(unittest.TestCase):
+    """
+    Moves answered by the endgame solver report what the solve took, like the searched ones.
+    """
+
+    def test_endgame_move_stats(self) -> None:
+        game = Triangle(7)
+        for move_no, move in enumerate(([4, 1], [4, 7], [3, 3], [1, 4], [4, 4])):
+            game.push_move(move, move_no % 2 + 1)
+        stream = io.StringIO()
+        player = AIComputerPlayer(1, search="alphabeta", endgame_threshold=len(game.allowed_fields),
+                                  endgame_time_budget=10.0, stats_stream=stream)
+        player.select_move(game, 1)
+
+        stats = player.last_stats
+        self.assertEqual(stats.method, "endgame")
+        self.assertEqual(stats.depth, len(game.allowed_fields))
+        self.assertGreater(stats.nodes, 0)
+        self.assertGreater(stats.states, 0)
+        self.assertGreater(stats.memo_bytes, 0)
+        written = json.loads(stream.getvalue())
+        self.assertEqual((written['states'], written['depth']), (stats.states, stats.depth))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+from game import Triangle
+from player import MCTSComputerPlayer, RandomComputerPlayer
+
+
+class MCTSComputerPlayerTest(unittest.TestCase):
+
+    def test_plays_legal_moves_to_the_end(self) -> None:
+        for width in (5, 9):
+            game = Triangle(width)
+            players = {1: MCTSComputerPlayer(1, playouts=200, time_budget_ms=None, seed=width),
+                       2: RandomComputerPlayer(2, seed=width)}
+            player_no = 1
+            while not game.is_end():
+                move = players[player_no].select_move(game, player_no)
+                self.assertIn(move, game.allowed_fields)
+                game.push_move(move, player_no)
+                player_no = 1 if player_no == 2 else 2
+            self.assertEqual(players[1].last_playouts, 200)
+
+    def test_same_seed_same_moves(self) -> None:
+        moves = []
+        for _ in range(2):
+            game = Triangle(9)
+            moves.append(MCTSComputerPlayer(2, playouts=300, time_budget_ms=None, seed=4).select_move(game, 2))
+        self.assertEqual(moves[0], moves[1])
+
+    def test_tree_is_reused_after_the_reply(self) -> None:
+        game = Triangle(9)
+        player = MCTSComputerPlayer(1, playouts=500, time_budget_ms=None, seed=1)
+        move = player.select_move(game, 1)
+        game.push_move(move, 1)
+
+        # reply with a move the tree already has statistics for
+        child = next(child for child in player.root.children if child.move == move)
+        reply_node = max(child.children, key=lambda node: node.visits)
+        game.push_move(reply_node.move, 2)
+        earlier_visits = reply_node.visits
+        self.assertGreater(earlier_visits, 0)
+
+        player.select_move(game, 1)
+        self.assertIs(player.root, reply_node)
+        self.assertIsNone(player.root.parent)
+        self.assertEqual(player.root.visits, earlier_visits + 500)
+
+        # a position the tree doesn't know starts a new tree
+        other = Triangle(9)
+        other.push_move([5, 1], 2)
+        player.select_move(other, 1)
+        self.assertIsNot(player.root, reply_node)
+        self.assertEqual(player.root.visits, 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
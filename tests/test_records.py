@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+from records import SMALL_MOVE_WIDTH, GameRecordReader, GameRecordWriter
+
+
+class GameRecordWriterTest(unittest.TestCase):
+    """
+    Games appended after a crash in the middle of writing a record have to stay readable.
+    """
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "games.rec")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def write_games(self, count: int) -> None:
+        with GameRecordWriter(self.path) as writer:
+            for game_no in range(count):
+                writer.write_game(5, "AIComputerPlayer", "RandomComputerPlayer", [(1, [1, 3]), (2, [2, 2])],
+                                  game_no, 1)
+
+    def read_scores(self) -> list[tuple[int, int]]:
+        with GameRecordReader(self.path) as reader:
+            return [(record.p1, record.p2) for record in reader]
+
+    def test_truncated_record_is_dropped_on_opening(self) -> None:
+        self.write_games(2)
+        complete_size = os.path.getsize(self.path)
+        for cut in (3, 20):
+            # a game record cut off in its header and in its moves
+            self.write_games(1)
+            with open(self.path, "rb+") as record_file:
+                record_file.truncate(complete_size + cut)
+
+            self.write_games(1)
+            self.assertEqual(self.read_scores(), [(0, 1), (1, 1), (0, 1)])
+            with open(self.path, "rb+") as record_file:
+                record_file.truncate(complete_size)
+
+    def test_complete_file_is_appended_to(self) -> None:
+        self.write_games(2)
+        self.write_games(1)
+        self.assertEqual(self.read_scores(), [(0, 1), (1, 1), (0, 1)])
+
+    def test_moves_round_trip_at_the_width_limits(self) -> None:
+        # the widest boards with one-byte moves and the narrowest with two-byte ones
+        widths = (SMALL_MOVE_WIDTH, SMALL_MOVE_WIDTH + 2)
+        with GameRecordWriter(self.path) as writer:
+            for width in widths:
+                height = (width + 1) // 2
+                moves = [(1, [height, 1]), (2, [height, width]), (1, [height, height]), (2, [1, height])]
+                writer.write_game(width, "AIComputerPlayer", "RandomComputerPlayer", moves, 4, 2)
+
+        with GameRecordReader(self.path) as reader:
+            for record, width in zip(reader, widths):
+                height = (width + 1) // 2
+                self.assertEqual(record.width, width)
+                self.assertEqual(list(record.moves()), [(1, [height, 1]), (2, [height, width]), (1, [height, height]),
+                                                        (2, [1, height])])
+
+
+if __name__ == "__main__":
+    unittest.main()
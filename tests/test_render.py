@@ -0,0 +1,60 @@
+import io
+import unittest
+
+from game import Triangle
+from player import HumanPlayer
+from render import CLEAR_SCREEN, BoardRenderer, move_cursor
+
+
+class BoardRendererTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.p1, self.p2 = HumanPlayer(1, "Ann"), HumanPlayer(2, "Bob")
+
+    def test_full_frame_matches_the_board(self) -> None:
+        game = Triangle(5)
+        stream = io.StringIO()
+        BoardRenderer(stream).draw(game, self.p1, self.p2, {}, 1)
+        self.assertEqual(stream.getvalue(), "Ann: 0\nBob: 0\n"
+                                            "1.       O      \n"
+                                            "2.    O  O  O   \n"
+                                            "3. O  O  O  O  O\n"
+                                            "   1. 2. 3. 4. 5. \n")
+
+    def test_diff_redraws_only_the_changed_fields(self) -> None:
+        game = Triangle(5)
+        stream = io.StringIO()
+        renderer = BoardRenderer(stream, diff=True)
+        renderer.draw(game, self.p1, self.p2, {}, 1)
+        self.assertTrue(stream.getvalue().startswith(CLEAR_SCREEN))
+
+        game.push_move([3, 2], 1)
+        stream.seek(0)
+        stream.truncate()
+        renderer.draw(game, self.p1, self.p2, {}, 1)
+        output = stream.getvalue()
+        self.assertNotIn(CLEAR_SCREEN, output)
+        # the score lines, the one changed field (row 3 is line 5 under the scores, column 2 starts after "3. O  ")
+        # and the cursor put below the frame
+        self.assertEqual(output, move_cursor(1, 1) + "\x1b[2KAnn: 1" + move_cursor(2, 1) + "\x1b[2KBob: 0"
+                         + move_cursor(5, 7) + "X" + move_cursor(7, 1))
+
+        # nothing changed - only the scores are redrawn
+        stream.seek(0)
+        stream.truncate()
+        renderer.draw(game, self.p1, self.p2, {}, 2)
+        self.assertNotIn("X", stream.getvalue())
+
+    def test_viewport_shows_the_columns_around_the_focus(self) -> None:
+        game = Triangle(21)
+        renderer = BoardRenderer(io.StringIO(), viewport=True, terminal_columns=20)
+        # 4 columns of the prefix and 4 per field (two-digit columns are spaced wider) - 4 fields fit
+        self.assertEqual(renderer.visible_columns(game, focus_col=10), (7, 11))
+        self.assertEqual(renderer.visible_columns(game, focus_col=1), (0, 4))
+        self.assertEqual(renderer.visible_columns(game, focus_col=21), (17, 21))
+        frame = renderer.render_frame(game, self.p1, self.p2, {}, 1, 7, 11)
+        self.assertTrue(frame.endswith("(columns 8-11 of 21)\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
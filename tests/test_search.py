@@ -0,0 +1,114 @@
+import math
+import random
+import unittest
+
+import numpy as np
+
+from endgame import EndgameSolver
+from evaluation import ThreatEvaluator
+from game import Triangle
+from learning import EvaluationModel, LearnedEvaluator, model_features
+from search import AlphaBetaSearch, ParallelRootSearch
+from transposition import TranspositionTable
+
+
+def symmetric_positions() -> list[Triangle]:
+    """
+    Small positions that are their own mirror images - the ones where the search leaves out half of the moves.
+    """
+    positions = [Triangle(5)]
+    # width 5 with the middle column filled
+    game = Triangle(5)
+    for row in (1, 2, 3):
+        game.push_move([row, 3], 1)
+    positions.append(game)
+    # width 7 with mirrored pairs of fields filled
+    game = Triangle(7)
+    for move in ([4, 1], [4, 7], [3, 3], [3, 5], [4, 4]):
+        game.push_move(move, 1)
+    positions.append(game)
+    return positions
+
+
+class FullDepthSearchTest(unittest.TestCase):
+    """
+    A search as deep as there are free fields has to find the exact value of the position, also in symmetric
+    positions (regression: the deepening was capped at the number of searched moves, half of them there).
+    """
+
+    def test_alphabeta_matches_endgame_solver(self) -> None:
+        for game in symmetric_positions():
+            self.assertTrue(game.is_symmetric())
+            free_fields = len(game.allowed_fields)
+            _, exact_value = EndgameSolver(threshold=free_fields, time_budget=math.inf).solve(game)
+            for evaluator in (None, ThreatEvaluator()):
+                searcher = AlphaBetaSearch(time_budget=math.inf, max_depth=free_fields, table=TranspositionTable(16),
+                                           evaluator=evaluator)
+                _, evaluation = searcher.search(game, 1)
+                self.assertEqual(searcher.depth_reached, free_fields)
+                self.assertEqual(evaluation, exact_value)
+
+    def test_parallel_search_matches_endgame_solver(self) -> None:
+        game = Triangle(5)
+        _, exact_value = EndgameSolver(time_budget=math.inf).solve(game)
+        searcher = ParallelRootSearch(workers=2, time_budget=math.inf, table_memory_mb=16)
+        try:
+            _, evaluation = searcher.search(game, 1)
+        finally:
+            searcher.close()
+        self.assertEqual(searcher.depth_reached, len(game.allowed_fields))
+        self.assertEqual(evaluation, exact_value)
+
+
+def random_position(width: int, moves: int, seed: int) -> Triangle:
+    rng = random.Random(seed)
+    game = Triangle(width)
+    for move_no in range(moves):
+        game.push_move(list(rng.choice(game.allowed_fields)), move_no % 2 + 1)
+    return game
+
+
+class BatchedEvaluationTest(unittest.TestCase):
+    """
+    With a LearnedEvaluator the moves of the last ply are evaluated all at once (child_values) - the results have to be
+    the same as playing the moves one by one, also once the free fields have been shuffled by earlier moves.
+    """
+
+    def setUp(self) -> None:
+        weights = np.random.default_rng(1).normal(0, 1, len(model_features("linear")))
+        self.model = EvaluationModel("linear", weights)
+
+    def test_batched_search_matches_unbatched_search(self) -> None:
+        for seed in range(5):
+            game = random_position(9, 6, seed)
+            for depth in (1, 2, 3):
+                evaluations = []
+                for batched in (True, False):
+                    searcher = AlphaBetaSearch(time_budget=math.inf, max_depth=depth, table=TranspositionTable(16),
+                                               evaluator=LearnedEvaluator(self.model))
+                    searcher.batched_evaluation = batched
+                    evaluations.append(searcher.search(game, 1)[1])
+                self.assertEqual(evaluations[0], evaluations[1])
+
+    def test_stored_move_matches_stored_evaluation(self) -> None:
+        game = random_position(9, 6, 0)
+        table = TranspositionTable(16)
+        searcher = AlphaBetaSearch(time_budget=math.inf, max_depth=2, table=table,
+                                   evaluator=LearnedEvaluator(self.model))
+        searcher.search(game, 1)
+        evaluator = LearnedEvaluator(self.model)
+        for move in list(game.allowed_fields):
+            game.push_move(move, 1)
+            key, mirrored = game.canonical_hash()
+            depth, kind, score, stored_move = table.entries[key]
+            self.assertEqual(depth, 1)
+            # the evaluation of the stored move, played out by hand
+            points = game.push_move(game.geometry.mirror_move(stored_move) if mirrored else stored_move, 2)
+            evaluator.reset(game)
+            self.assertEqual(points - evaluator.evaluate(game), score)
+            game.pop_move()
+            game.pop_move()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import asyncio
+import unittest
+
+from server import GameServer, LineClient
+
+
+async def play_to_end(client: LineClient, game_id: str, player_no: str) -> list[str]:
+    """
+    Plays the first free field of the board on every turn of the client.
+    :return: the END line, or whatever the server closed the game with
+    """
+    while True:
+        words = await client.receive_until("TURN", "END", "ERR")
+        if not words or words[0] != "TURN":
+            return words
+        if words[1] == game_id and words[2] == player_no:
+            await client.send("BOARD " + game_id)
+            rows = (await client.receive_until("BOARD"))[5].split("/")
+            row_ind = next(row_ind for row_ind, row in enumerate(rows) if "O" in row)
+            # the rows only list the playable fields, starting at the column height - row
+            col = rows[row_ind].index("O") + len(rows) - row_ind
+            await client.send("MOVE " + game_id + " " + str(row_ind + 1) + " " + str(col))
+
+
+class GameServerTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Games played against the server over the loopback interface.
+    """
+
+    async def asyncSetUp(self) -> None:
+        self.server = GameServer(port=0, ai_workers=2, ai_time_budget=0.05, ai_endgame_time_budget=0.05)
+        await self.server.start()
+        self.clients = []
+
+    async def asyncTearDown(self) -> None:
+        for client in self.clients:
+            await client.close()
+        await self.server.close()
+
+    async def new_game(self, width: int, opponent: str) -> tuple[LineClient, str]:
+        client = await LineClient.connect(port=self.server.port)
+        self.clients.append(client)
+        await client.send("NEW " + str(width) + " " + opponent)
+        words = await client.receive_until("GAME", "ERR")
+        self.assertEqual(words[0], "GAME")
+        return client, words[1]
+
+    async def test_random_and_ai_games_are_played_to_the_end(self) -> None:
+        games = [await self.new_game(7, opponent) for opponent in ("random", "ai", "ai")]
+        for client, game_id in games:
+            words = await play_to_end(client, game_id, "1")
+            self.assertEqual(words[:2], ["END", game_id])
+            p1, p2 = int(words[2]), int(words[3])
+            self.assertEqual(words[4], "1" if p1 > p2 else "2" if p2 > p1 else "0")
+        self.assertEqual(self.server.games, {})
+
+    async def test_two_human_players(self) -> None:
+        first, game_id = await self.new_game(5, "human")
+        second = await LineClient.connect(port=self.server.port)
+        self.clients.append(second)
+        await second.send("JOIN " + game_id)
+        self.assertEqual(await second.receive_until("GAME"), ["GAME", game_id, "2", "5"])
+        # both clients have to take their turns at the same time
+        results = await asyncio.gather(play_to_end(first, game_id, "1"), play_to_end(second, game_id, "2"))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0][0], "END")
+
+    async def test_failed_ai_search_ends_the_game_with_an_error(self) -> None:
+        # an argument the AI player doesn't take makes every search fail in the worker process
+        self.server.ai_player.settings = dict(self.server.ai_player.settings, unknown_setting=1)
+        client, game_id = await self.new_game(7, "ai")
+        words = await play_to_end(client, game_id, "1")
+        self.assertEqual(words[0], "ERR")
+        words = await client.receive_until("END")
+        self.assertEqual((words[1], words[4]), (game_id, "abandoned"))
+        self.assertEqual(self.server.games, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
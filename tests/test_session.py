@@ -0,0 +1,41 @@
+import unittest
+
+from player import AIComputerPlayer, RandomComputerPlayer
+from session import GameSession
+
+
+class GameSessionTest(unittest.TestCase):
+
+    def test_on_move_is_called_after_every_move(self) -> None:
+        player1, player2 = RandomComputerPlayer(1, seed=1), RandomComputerPlayer(2, seed=2)
+        seen = []
+
+        def on_move(player, player_no: int, coordinates: list[int]) -> None:
+            self.assertIs(player, player1 if player_no == 1 else player2)
+            self.assertNotIn(coordinates, session.game.allowed_fields)
+            seen.append((player_no, coordinates))
+
+        session = GameSession(player1, player2, 9, on_move=on_move)
+        result = session.run()
+        self.assertEqual(seen, result.moves)
+        self.assertEqual((player1.points, player2.points), (result.p1, result.p2))
+
+    def test_run_shuts_the_parallel_search_down(self) -> None:
+        player = AIComputerPlayer(2, search="alphabeta", time_budget=0.05, workers=2, endgame_threshold=None)
+        session = GameSession(RandomComputerPlayer(1, seed=1), player, 7)
+        # the worker processes are started on the first searched move
+        while player.searcher.executor is None:
+            session.step()
+        session.run()
+        self.assertIsNone(player.searcher.executor)
+
+    def test_player_as_context_manager(self) -> None:
+        with AIComputerPlayer(1, search="alphabeta", time_budget=0.05, workers=2, endgame_threshold=None) as player:
+            session = GameSession(player, RandomComputerPlayer(2, seed=2), 7)
+            while player.searcher.executor is None:
+                session.step()
+        self.assertIsNone(player.searcher.executor)
+
+
+if __name__ == "__main__":
+    unittest.main()
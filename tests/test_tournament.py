@@ -0,0 +1,105 @@
+import json
+import math
+import os
+import tempfile
+import unittest
+
+from tournament import compute_ratings, load_checkpoint, make_schedule, run_tournament
+
+PLAYERS = ["random", "mcts:playouts=20,time_budget_ms=none"]
+
+
+def without_timing(results: dict) -> dict:
+    return {game_id: dict(result, seconds=None) for game_id, result in results.items()}
+
+
+def result(player1: str, player2: str, p1: int, p2: int, status: str = "ok", forfeit: int = None,
+           width: int = 7) -> dict:
+    return {'game': player1 + " vs " + player2, 'player1': player1, 'player2': player2, 'width': width, 'p1': p1,
+            'p2': p2, 'moves': 0, 'seconds': 0.0, 'status': status, 'forfeit': forfeit, 'error': None}
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.schedule = make_schedule(PLAYERS, [5, 7], games=2, seed=3)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_resumed_tournament_plays_only_the_missing_games(self) -> None:
+        full_path = os.path.join(self.directory.name, "full.jsonl")
+        expected = run_tournament(self.schedule, full_path, workers=1, report_every=None)
+        self.assertEqual(set(expected), {game.game_id for game in self.schedule})
+        with open(full_path) as checkpoint_file:
+            lines = checkpoint_file.readlines()
+
+        # an interrupted run: two games saved, one that ended with an error and a line cut off in the middle
+        path = os.path.join(self.directory.name, "resumed.jsonl")
+        failed = dict(json.loads(lines[2]), status="error", error="RuntimeError: boom")
+        with open(path, "w") as checkpoint_file:
+            checkpoint_file.write(lines[0] + lines[1] + json.dumps(failed) + "\n" + lines[3][:25])
+        loaded = load_checkpoint(path)
+        self.assertEqual(set(loaded), {json.loads(lines[0])['game'], json.loads(lines[1])['game']})
+        with open(path) as checkpoint_file:
+            self.assertTrue(checkpoint_file.read().endswith("\n"))
+
+        results = run_tournament(self.schedule, path, workers=1, report_every=None)
+        # the same seeds give the same games
+        self.assertEqual(without_timing(results), without_timing(expected))
+        with open(path) as checkpoint_file:
+            resumed_lines = checkpoint_file.readlines()
+        # the error line stays, the games after the first two are played once
+        self.assertEqual(len(resumed_lines), len(lines) + 1)
+        self.assertEqual(resumed_lines[:2], lines[:2])
+
+        # nothing left to play
+        run_tournament(self.schedule, path, workers=1, report_every=None)
+        with open(path) as checkpoint_file:
+            self.assertEqual(len(checkpoint_file.readlines()), len(resumed_lines))
+
+
+class RatingsTest(unittest.TestCase):
+    """
+    Ratings of fixed result sets, checked against the closed form for two players: the fitted expected score is the
+    actual score.
+    """
+
+    def test_two_players(self) -> None:
+        results = [result("a", "b", 5, 3), result("b", "a", 2, 6), result("a", "b", 4, 4), result("b", "a", 7, 1),
+                   # doesn't count
+                   result("a", "b", 0, 0, status="error"),
+                   # lost by player 2 on time
+                   result("a", "b", 0, 0, status="timeout", forfeit=2)]
+        first, second = compute_ratings(results, ["a", "b"], prior_draws=0)
+        self.assertEqual((first.player, first.games, first.wins, first.draws, first.losses), ("a", 5, 3, 1, 1))
+        self.assertEqual((second.wins, second.draws, second.losses), (1, 1, 3))
+        self.assertAlmostEqual(first.score, 0.7)
+
+        difference = 400 * math.log10(0.7 / 0.3)
+        self.assertAlmostEqual(first.rating, 1500 + difference / 2, places=6)
+        self.assertAlmostEqual(second.rating, 1500 - difference / 2, places=6)
+        # Fisher information of the difference is games * p * (1 - p); each rating carries half of it
+        standard_error = 400 / math.log(10) * math.sqrt(1 / (4 * 5 * 0.7 * 0.3))
+        self.assertAlmostEqual(first.margin, 1.959964 * standard_error, places=3)
+        self.assertAlmostEqual(second.margin, first.margin)
+
+    def test_prior_draws_and_width_filter(self) -> None:
+        results = [result("a", "b", 5, 3), result("a", "b", 6, 2), result("a", "b", 1, 7, width=9)]
+        # two wins plus a virtual draw: 2.5 of 3
+        first, second = compute_ratings(results, ["a", "b"], width=7)
+        self.assertAlmostEqual(first.rating - second.rating, 400 * math.log10(2.5 / 0.5), places=6)
+        self.assertEqual(first.games, 2)
+
+    def test_equal_players_and_players_without_games(self) -> None:
+        results = [result("a", "b", 4, 4), result("b", "c", 1, 0), result("c", "b", 1, 0)]
+        ratings = {rating.player: rating for rating in compute_ratings(results, ["a", "b", "c", "d"])}
+        for player in "abc":
+            self.assertAlmostEqual(ratings[player].rating, 1500.0, places=6)
+        self.assertEqual(ratings["d"].games, 0)
+        self.assertEqual(ratings["d"].margin, math.inf)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,509 @@
+import argparse
+from functools import partial
+import json
+import math
+import multiprocessing
+import os
+import random
+import signal
+from statistics import NormalDist
+import time
+import zlib
+
+# numpy is only needed for the ratings, playing the games doesn't depend on it
+import numpy as np
+
+from player import AIComputerPlayer, MCTSComputerPlayer, RandomComputerPlayer
+from session import GameSession
+
+# player kind -> class and the keyword arguments every player of the kind is built with
+PLAYER_KINDS = {
+    "random": (RandomComputerPlayer, {}),
+    "minimax": (AIComputerPlayer, {"search": "minimax"}),
+    "alphabeta": (AIComputerPlayer, {"search": "alphabeta"}),
+    "mcts": (MCTSComputerPlayer, {})
+}
+# kinds whose players take a seed for their own random number generator
+SEEDED_KINDS = ("random", "mcts")
+
+
+def parse_player_spec(spec: str) -> tuple[str, dict[str, int | float | bool | str | None]]:
+    """
+    Player specs are the kind optionally followed by keyword arguments of the player's class, e.g. "random",
+    "minimax:depth=2" or "alphabeta:time_budget=0.05,static_evaluation=false". The spec also names the player in the
+    results, so every configuration is a separate player.
+    :return: kind of the player and the keyword arguments
+    """
+    kind, _, options_str = spec.partition(":")
+    if kind not in PLAYER_KINDS:
+        raise ValueError("Unknown player kind in " + repr(spec) + ". Expected one of: " + ", ".join(PLAYER_KINDS)
+                         + ".")
+
+    options = {}
+    for option in filter(None, options_str.split(",")):
+        name, separator, value = option.partition("=")
+        if not separator or not name:
+            raise ValueError("Options of the players must be given as name=value. Got " + repr(option) + " in "
+                             + repr(spec) + ".")
+        options[name] = parse_option_value(value)
+    return kind, options
+
+
+def parse_option_value(value: str) -> int | float | bool | str | None:
+    lowered = value.lower()
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    if lowered == "none":
+        return None
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
+
+
+def make_player(spec: str, player_no: int, seed: int):
+    """
+    :param spec: player spec (see parse_player_spec)
+    :param seed: seed of the players that take one
+    :return: Player obj
+    """
+    kind, options = parse_player_spec(spec)
+    player_cls, kind_options = PLAYER_KINDS[kind]
+    kwargs = dict(kind_options, **options)
+    if kind in SEEDED_KINDS:
+        kwargs.setdefault("seed", seed)
+    try:
+        return player_cls(player_no, **kwargs)
+    except TypeError as error:
+        raise ValueError("Invalid options in the player spec " + repr(spec) + ": " + str(error)) from None
+
+
+class ScheduledGame:
+    """
+    A single game of the tournament. The id only depends on the players, the width and the number of the game within
+    the pairing, so the same tournament always has the same games - that's what the checkpoint is matched against.
+    """
+    __slots__ = ('game_id', 'player1', 'player2', 'width', 'seed', 'opening_seed')
+
+    game_id: str
+    # specs of the players, player 1 makes the first move
+    player1: str
+    player2: str
+    width: int
+    # seed of the players' random number generators
+    seed: int
+    # seed of the random opening moves - the same for both games of a colour-swapped pair
+    opening_seed: int
+
+    def __init__(self, game_id: str, player1: str, player2: str, width: int, seed: int, opening_seed: int) -> None:
+        self.game_id = game_id
+        self.player1 = player1
+        self.player2 = player2
+        self.width = width
+        self.seed = seed
+        self.opening_seed = opening_seed
+
+
+def make_schedule(players: list[str], widths: list[int], games: int, mode: str = "round-robin", seed: int = 0) \
+        -> list[ScheduledGame]:
+    """
+    :param players: player specs, each one a separate player; in the "gauntlet" mode the first one plays all the
+    others, which don't play each other
+    :param widths: board widths every pairing plays on
+    :param games: games of every pairing on every width - the players take turns making the first move, and every two
+    games start from the same opening
+    :param mode: "round-robin" or "gauntlet"
+    :param seed: seed the seeds of the single games are derived from
+    :return: the games interleaved so that every pairing and width has played about the same number of games at any
+    point - an interrupted tournament still gives balanced results
+    """
+    if mode not in ("round-robin", "gauntlet"):
+        raise ValueError("The mode must be either \"round-robin\" or \"gauntlet\". Got " + str(mode) + " instead.")
+    if len(set(players)) != len(players):
+        raise ValueError("Every player spec must be unique.")
+    if len(players) < 2:
+        raise ValueError("At least two players are needed.")
+    for spec in players:
+        parse_player_spec(spec)
+
+    if mode == "round-robin":
+        pairings = [(first, second) for first_ind, first in enumerate(players) for second in players[first_ind + 1:]]
+    else:
+        pairings = [(players[0], opponent) for opponent in players[1:]]
+
+    schedule = []
+    for game_no in range(games):
+        for width in widths:
+            for first, second in pairings:
+                game_id = first + " vs " + second + " w=" + str(width) + " #" + str(game_no)
+                pair_id = first + " vs " + second + " w=" + str(width) + " #" + str(game_no // 2)
+                # swap the colours every other game
+                player1, player2 = (first, second) if game_no % 2 == 0 else (second, first)
+                schedule.append(ScheduledGame(game_id, player1, player2, width,
+                                              zlib.crc32((str(seed) + "|" + game_id).encode()),
+                                              zlib.crc32((str(seed) + "|" + pair_id).encode())))
+    return schedule
+
+
+class GameTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame) -> None:
+    raise GameTimeout()
+
+
+def play_game(game: ScheduledGame, opening_moves: int = 0, timeout: float | None = None) \
+        -> dict[str, str | int | float | None]:
+    """
+    Plays a scheduled game. A game taking longer than the timeout is stopped - also in the middle of a move where
+    SIGALRM is available - and lost by the player who used more of the time.
+    :param opening_moves: random moves the game starts with, so that deterministic players don't play the same game
+    over and over
+    :param timeout: seconds the game may take, None for no limit
+    :return: result of the game as stored in the checkpoint
+    """
+    result = {
+        'game': game.game_id,
+        'player1': game.player1,
+        'player2': game.player2,
+        'width': game.width,
+        'p1': 0,
+        'p2': 0,
+        'moves': 0,
+        'seconds': 0.0,
+        'status': "ok",
+        # number of the player who lost by the timeout
+        'forfeit': None,
+        'error': None
+    }
+    # AIComputerPlayer picks between the corners with the random module
+    random.seed(game.seed)
+    # thinking time of each player
+    clocks = {1: 0.0, 2: 0.0}
+    use_alarm = timeout is not None and hasattr(signal, "setitimer")
+    start_time = time.perf_counter()
+    session = None
+    # start of the move being made, None between the moves
+    move_start = None
+    try:
+        if use_alarm:
+            previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        player1 = make_player(game.player1, 1, game.seed)
+        player2 = make_player(game.player2, 2, game.seed + 1)
+
+        # the same random player makes the opening moves of both sides
+        opening_player = RandomComputerPlayer(1, seed=game.opening_seed)
+        session = GameSession(opening_player, opening_player, game.width)
+        for _ in range(min(opening_moves, len(session.game.allowed_fields))):
+            session.step()
+        session.player1 = player1
+        session.player2 = player2
+
+        while not session.is_over():
+            player_no = session.player_turn
+            move_start = time.perf_counter()
+            session.step()
+            clocks[player_no] += time.perf_counter() - move_start
+            move_start = None
+            if timeout is not None and time.perf_counter() - start_time > timeout:
+                raise GameTimeout()
+        result['p1'], result['p2'] = session.game.p1, session.game.p2
+    except GameTimeout:
+        if move_start is not None:
+            # the move that was cut off counts towards the clock of the player making it
+            clocks[session.player_turn] += time.perf_counter() - move_start
+        result['status'] = "timeout"
+        result['forfeit'] = 1 if clocks[1] >= clocks[2] else 2
+    except Exception as error:
+        result['status'] = "error"
+        result['error'] = type(error).__name__ + ": " + str(error)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+        if session is not None:
+            session.close()
+
+    result['moves'] = len(session.moves) if session is not None else 0
+    result['seconds'] = round(time.perf_counter() - start_time, 4)
+    return result
+
+
+def _init_worker() -> None:
+    # Ctrl+C is handled by the main process, which stops the workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _play_games(games: list[ScheduledGame], opening_moves: int, timeout: float | None) \
+        -> list[dict[str, str | int | float | None]]:
+    return [play_game(game, opening_moves, timeout) for game in games]
+
+
+def load_checkpoint(path: str) -> dict[str, dict[str, str | int | float | None]]:
+    """
+    Reads the results written by an earlier run. A line cut off by an interruption is dropped from the file, so that
+    the results written on resuming don't end up appended to it. Games that ended with an error are left out - they
+    are played again.
+    :return: game id -> result
+    """
+    results = {}
+    if not os.path.exists(path):
+        return results
+
+    with open(path, "rb+") as checkpoint_file:
+        data = checkpoint_file.read()
+        complete_end = data.rfind(b"\n") + 1
+        if complete_end < len(data):
+            checkpoint_file.truncate(complete_end)
+    for line in data[:complete_end].splitlines():
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        if result['status'] != "error":
+            results[result['game']] = result
+    return results
+
+
+def run_tournament(schedule: list[ScheduledGame], checkpoint_path: str, workers: int = None, chunk_size: int = 16,
+                   opening_moves: int = 0, timeout: float | None = None, report_every: float = 10.0) \
+        -> dict[str, dict[str, str | int | float | None]]:
+    """
+    Plays the games of the schedule that aren't in the checkpoint yet. Every result is appended to the checkpoint as
+    a JSON line as soon as its chunk of games is finished, so an interrupted tournament can be resumed by running it
+    again with the same checkpoint.
+    :param workers: number of worker processes, all CPUs by default; 1 plays the games in this process
+    :param chunk_size: games sent to a worker at once - larger chunks cost less in communication between the
+    processes, smaller ones lose less work when interrupted
+    :param report_every: seconds between progress reports, None for no reports
+    :return: game id -> result of all the games of the schedule played so far
+    """
+    workers = workers if workers is not None else os.cpu_count()
+    results = load_checkpoint(checkpoint_path)
+    scheduled_ids = {game.game_id for game in schedule}
+    results = {game_id: result for game_id, result in results.items() if game_id in scheduled_ids}
+    pending = [game for game in schedule if game.game_id not in results]
+    chunks = [pending[chunk_start:chunk_start + chunk_size] for chunk_start in range(0, len(pending), chunk_size)]
+
+    start_time = time.perf_counter()
+    last_report = start_time
+    played = 0
+    with open(checkpoint_path, "a") as checkpoint_file:
+        def save(chunk_results: list[dict[str, str | int | float | None]]) -> None:
+            nonlocal played, last_report
+            checkpoint_file.write("".join(json.dumps(result) + "\n" for result in chunk_results))
+            checkpoint_file.flush()
+            for result in chunk_results:
+                if result['status'] != "error":
+                    results[result['game']] = result
+            played += len(chunk_results)
+
+            now = time.perf_counter()
+            if report_every is not None and now - last_report >= report_every:
+                last_report = now
+                rate = played / (now - start_time)
+                print(str(played) + "/" + str(len(pending)) + " games, " + str(round(rate, 1)) + " games/s, "
+                      + str(round((len(pending) - played) / rate)) + " s left")
+
+        if workers <= 1:
+            for chunk in chunks:
+                save(_play_games(chunk, opening_moves, timeout))
+            return results
+
+        # leaving the pool terminates the workers, so on an interruption the chunks being played are dropped at once -
+        # they are played again on resuming
+        with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+            for chunk_results in pool.imap_unordered(partial(_play_games, opening_moves=opening_moves,
+                                                             timeout=timeout), chunks):
+                save(chunk_results)
+    return results
+
+
+def game_score(result: dict[str, str | int | float | None]) -> float | None:
+    """
+    :return: points of player 1 for the ratings - 1 for a win, 0.5 for a draw, 0 for a loss; None if the game doesn't
+    count
+    """
+    if result['status'] == "timeout":
+        return 0.0 if result['forfeit'] == 1 else 1.0
+    if result['status'] != "ok":
+        return None
+    if result['p1'] > result['p2']:
+        return 1.0
+    elif result['p2'] > result['p1']:
+        return 0.0
+    return 0.5
+
+
+class PlayerRating:
+    """
+    Elo rating of a player with its confidence interval - the rating lies within rating +- margin with the confidence
+    the ratings were computed with.
+    """
+    __slots__ = ('player', 'rating', 'margin', 'games', 'wins', 'draws', 'losses')
+
+    player: str
+    rating: float
+    margin: float
+    games: int
+    wins: int
+    draws: int
+    losses: int
+
+    def __init__(self, player: str, rating: float, margin: float, games: int, wins: int, draws: int,
+                 losses: int) -> None:
+        self.player = player
+        self.rating = rating
+        self.margin = margin
+        self.games = games
+        self.wins = wins
+        self.draws = draws
+        self.losses = losses
+
+    @property
+    def score(self) -> float:
+        return (self.wins + self.draws / 2) / self.games if self.games else 0.0
+
+
+def compute_ratings(results, players: list[str], width: int = None, confidence: float = 0.95,
+                    prior_draws: float = 1.0, base_rating: float = 1500.0) -> list[PlayerRating]:
+    """
+    Maximum likelihood Elo ratings - the ratings under which the results are the most likely, if a player rated d
+    points higher scores 1 / (1 + 10^(-d / 400)) on average. Fitted with Newton's method; the confidence intervals
+    come from the curvature of the likelihood at the fit (the inverse of the Fisher information).
+
+    The ratings are relative, their average is base_rating. Ratings of players that aren't connected by the games
+    (e.g. two gauntlet opponents) can only be compared through the players they did play.
+    :param results: results of the games, as returned by run_tournament
+    :param players: player specs
+    :param width: only count the games of this width, all of them by default
+    :param confidence: confidence level of the intervals
+    :param prior_draws: virtual draws added to every pairing that played - without them a player who won (or lost)
+    every game would be rated infinitely far from the others
+    :return: rating of every player, best first
+    """
+    player_inds = {player: player_ind for player_ind, player in enumerate(players)}
+    games = np.zeros((len(players), len(players)))
+    # points scored by the player of the row against the player of the column
+    scores = np.zeros((len(players), len(players)))
+    wins, draws, losses = [0] * len(players), [0] * len(players), [0] * len(players)
+    for result in results:
+        score = game_score(result)
+        if score is None or (width is not None and result['width'] != width):
+            continue
+        first, second = player_inds[result['player1']], player_inds[result['player2']]
+        games[first, second] += 1
+        games[second, first] += 1
+        scores[first, second] += score
+        scores[second, first] += 1 - score
+        if score == 0.5:
+            draws[first] += 1
+            draws[second] += 1
+        else:
+            winner, loser = (first, second) if score == 1.0 else (second, first)
+            wins[winner] += 1
+            losses[loser] += 1
+
+    played = (games > 0).astype(float)
+    games += prior_draws * played
+    scores += prior_draws / 2 * played
+
+    # strengths in natural units, 400 / ln(10) Elo points each
+    strengths = np.zeros(len(players))
+    for _ in range(100):
+        # win probability of the player of the row against the player of the column
+        win_probs = 1 / (1 + np.exp(strengths[np.newaxis, :] - strengths[:, np.newaxis]))
+        gradient = (scores - games * win_probs).sum(axis=1)
+        weights = games * win_probs * (1 - win_probs)
+        information = np.diag(weights.sum(axis=1)) - weights
+        # the likelihood doesn't change if all the strengths are shifted, so the information matrix is singular - the
+        # pseudo-inverse takes the step (and the covariance below) with the average kept fixed
+        step = np.linalg.pinv(information) @ gradient
+        strengths += step
+        strengths -= strengths.mean()
+        if np.max(np.abs(step)) < 1e-9:
+            break
+
+    win_probs = 1 / (1 + np.exp(strengths[np.newaxis, :] - strengths[:, np.newaxis]))
+    weights = games * win_probs * (1 - win_probs)
+    covariance = np.linalg.pinv(np.diag(weights.sum(axis=1)) - weights)
+    scale = 400 / math.log(10)
+    z_score = NormalDist().inv_cdf((1 + confidence) / 2)
+
+    ratings = []
+    for player_ind, player in enumerate(players):
+        player_games = wins[player_ind] + draws[player_ind] + losses[player_ind]
+        margin = z_score * math.sqrt(max(covariance[player_ind, player_ind], 0.0)) * scale if player_games \
+            else math.inf
+        ratings.append(PlayerRating(player, base_rating + strengths[player_ind] * scale, margin, player_games,
+                                    wins[player_ind], draws[player_ind], losses[player_ind]))
+    return sorted(ratings, key=lambda rating: rating.rating, reverse=True)
+
+
+def format_ratings(ratings: list[PlayerRating]) -> str:
+    name_width = max(len("Player"), *(len(rating.player) for rating in ratings))
+    lines = ["Rank  " + "Player".ljust(name_width) + "  Rating     +-   Games  Score      W      D      L"]
+    for rank, rating in enumerate(ratings, 1):
+        lines.append(str(rank).rjust(4) + "  " + rating.player.ljust(name_width) + "  "
+                     + format(rating.rating, ".0f").rjust(6) + " " + format(rating.margin, ".0f").rjust(6) + " "
+                     + str(rating.games).rjust(7) + " " + format(rating.score * 100, ".1f").rjust(5) + "% "
+                     + str(rating.wins).rjust(6) + " " + str(rating.draws).rjust(6) + " "
+                     + str(rating.losses).rjust(6))
+    return "\n".join(lines)
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Non-interactive tournament between computer players, with Elo "
+                                                 "ratings of the players at the end.")
+    parser.add_argument("--players", nargs="+", required=True,
+                        help="player specs: random, minimax, alphabeta or mcts, optionally with keyword arguments of "
+                             "the player, e.g. minimax:depth=2 or alphabeta:time_budget=0.05,static_evaluation=false")
+    parser.add_argument("--mode", choices=("round-robin", "gauntlet"), default="round-robin",
+                        help="round-robin - everyone plays everyone, gauntlet - the first player plays all the others")
+    parser.add_argument("--widths", type=int, nargs="+", default=[7], help="board widths (odd numbers)")
+    parser.add_argument("--games", type=int, default=10, help="games of every pairing on every width")
+    parser.add_argument("--opening-moves", type=int, default=2,
+                        help="random moves every game starts with (both games of a colour-swapped pair get the same)")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="seconds a game may take - past that it's lost by the player who used more of the time")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, all CPUs by default")
+    parser.add_argument("--chunk-size", type=int, default=16, help="games sent to a worker at once")
+    parser.add_argument("--checkpoint", default="tournament.jsonl",
+                        help="file the results are appended to - running again with the same file resumes the "
+                             "tournament")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--confidence", type=float, default=0.95, help="confidence level of the rating intervals")
+    parser.add_argument("--by-width", action="store_true", help="also print the ratings on every width separately")
+    args = parser.parse_args(argv)
+
+    try:
+        schedule = make_schedule(args.players, args.widths, args.games, args.mode, args.seed)
+        # fail on a mistyped option now rather than in every game of the player
+        for spec in args.players:
+            make_player(spec, 1, args.seed)
+    except ValueError as error:
+        parser.error(str(error))
+    try:
+        results = run_tournament(schedule, args.checkpoint, args.workers, args.chunk_size, args.opening_moves,
+                                 args.timeout)
+    except KeyboardInterrupt:
+        print("Interrupted - run the same command again to resume from " + args.checkpoint + ".")
+        return 130
+
+    results = list(results.values())
+    timeouts = sum(result['status'] == "timeout" for result in results)
+    errors = len(schedule) - len(results)
+    print("Games: " + str(len(results)) + ", timeouts: " + str(timeouts) + ", failed: " + str(errors))
+    print(format_ratings(compute_ratings(results, args.players, confidence=args.confidence)))
+    if args.by_width:
+        for width in args.widths:
+            print("\nWidth " + str(width) + ":")
+            print(format_ratings(compute_ratings(results, args.players, width, args.confidence)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
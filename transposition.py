@@ -0,0 +1,98 @@
+from collections import OrderedDict
+
+# kinds of scores stored in the table - alpha-beta only knows the exact evaluation when it falls inside the window
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+class TranspositionTable:
+    """
+    Cache of search results keyed by the Zobrist hash of the position (Triangle.position_hash). The same position is
+    reached through many different move orders, so a result stored once can save searching the whole subtree again.
+
+    Each entry keeps the searched depth, the kind of the score (EXACT, LOWER_BOUND or UPPER_BOUND), the score and the
+    best move. A result for a position already in the table is replaced when it comes from at least as deep a search.
+    When the table is full the least recently stored entry is evicted, so results from earlier moves of the game are the
+    first to go when the table persists between moves.
+    """
+    # approximate memory taken by one entry - dict slot and links, key, tuple and score; the move lists are shared with
+    # the board. Measured with tracemalloc on CPython 3.11
+    ENTRY_SIZE: int = 230
+
+    max_entries: int = 0
+    entries: OrderedDict[int, tuple[int, int, int | float, list[int] | None]]
+    # lookups that found / didn't find the position, stored results, evicted entries
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    def __init__(self, memory_mb: float = 64) -> None:
+        """
+        :param memory_mb: memory cap of the table in megabytes
+        """
+        if memory_mb <= 0:
+            raise ValueError("The memory cap must be a positive number. Got " + str(memory_mb) + " instead.")
+
+        self.max_entries = max(1, int(memory_mb * 1024 * 1024 / self.ENTRY_SIZE))
+        self.entries = OrderedDict()
+        self.reset_stats()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, key: int) -> tuple[int, int, int | float, list[int] | None] | None:
+        """
+        :param key: Zobrist hash of the position
+        :return: (depth, kind of the score, score, best move) or None if the position is not in the table
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def store(self, key: int, depth: int, kind: int, score: int | float, move: list[int] | None) -> None:
+        previous_entry = self.entries.get(key)
+        if previous_entry is not None:
+            # keep the result of the deeper search
+            if previous_entry[0] > depth:
+                return
+            self.entries[key] = (depth, kind, score, move)
+            # move the position to the back of the eviction queue
+            self.entries.move_to_end(key)
+        else:
+            if len(self.entries) >= self.max_entries:
+                # evict the least recently stored entry
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self.entries[key] = (depth, kind, score, move)
+
+        self.stores += 1
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Counters for tuning the size of the table.
+        :return: dictionary with hits, misses, hit rate, stores, evictions, number of entries and the entry limit
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'max_entries': self.max_entries
+        }